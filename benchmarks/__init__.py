@@ -0,0 +1,5 @@
+"""
+性能基准测试包
+
+运行方式见 benchmarks/run.py。
+"""
@@ -0,0 +1,148 @@
+"""
+基准测试用例模块
+
+导入本模块前需先调用 harness.setup_redis 切换Redis后端。
+"""
+import asyncio
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import measure, measure_async
+from celery_app.task_registry import app as celery_app
+from celery_app.tasks.base_task import BaseTask, WorkflowTask
+from celery_app.tasks.core_tasks import DataPipelineTask, ETLWorkflowTask
+from celery_app.utils.step_cache import step_cache
+from celery_app.utils.task_utils import TaskStatus, task_state_manager
+
+SAMPLE_DATA = [{"id": i, "value": f"value{i}"} for i in range(10)]
+
+
+@contextmanager
+def no_sleep() -> Iterator[None]:
+    """去掉示例任务中模拟耗时的asyncio.sleep，只保留框架自身开销"""
+    original_sleep = asyncio.sleep
+
+    async def instant_sleep(delay: float, result: Any = None) -> Any:
+        return result
+
+    asyncio.sleep = instant_sleep
+    try:
+        yield
+    finally:
+        asyncio.sleep = original_sleep
+
+
+@contextmanager
+def step_cache_enabled(enabled: bool) -> Iterator[None]:
+    """切换工作流步骤缓存"""
+    original = step_cache.enabled
+    step_cache.enabled = enabled
+    try:
+        yield
+    finally:
+        step_cache.enabled = original
+
+
+def _new_task_ids(count: int) -> List[str]:
+    return [f"bench-{uuid.uuid4()}" for _ in range(count)]
+
+
+def bench_api_submit(iterations: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """POST /tasks/run 提交任务（含apply_async发布到内存broker）"""
+    from powercap_api.main import app
+
+    celery_app.conf.update(
+        task_always_eager=False,
+        broker_url="memory://",
+        result_backend="cache+memory://"
+    )
+    payload = {"task_type": "data_process_task", "params": {"data": SAMPLE_DATA}}
+    with TestClient(app) as client:
+        def submit(i: int) -> None:
+            response = client.post("/api/v1/tasks/run", json=payload)
+            assert response.status_code == 202, response.text
+
+        return {"api_submit": measure(submit, iterations, warmup)}
+
+
+def bench_state_manager(iterations: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """TaskStateManager 单次状态转换与状态读取"""
+    task_ids = _new_task_ids(iterations + warmup)
+    result = {"items": SAMPLE_DATA}
+    try:
+        results = {
+            "update_task_status_started": measure(
+                lambda i: task_state_manager.update_task_status(task_ids[i], TaskStatus.STARTED),
+                iterations,
+                warmup
+            ),
+            "update_task_status_success": measure(
+                lambda i: task_state_manager.update_task_status(
+                    task_ids[i], TaskStatus.SUCCESS, result=result
+                ),
+                iterations,
+                warmup
+            ),
+            "get_task_status": measure(
+                lambda i: task_state_manager.get_task_status(task_ids[i]),
+                iterations,
+                warmup
+            ),
+        }
+    finally:
+        for task_id in task_ids:
+            task_state_manager.clean_task_data(task_id)
+    return results
+
+
+class NoopTask(BaseTask):
+    """空任务（用于测量工作流调度开销）"""
+    name = "benchmark_noop_task"
+
+    async def run(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+class WideWorkflowTask(WorkflowTask):
+    """单根节点扇出到多个并行步骤的工作流"""
+    name = "benchmark_wide_workflow_task"
+
+    def __init__(self, width: int = 100):
+        super().__init__()
+        self.add_step("root", NoopTask())
+        for i in range(width):
+            self.add_step(f"step{i}", NoopTask(), depends_on=["root"])
+
+
+def _bench_task_run(factory: Callable[[], Any], kwargs: Dict[str, Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    task = factory()
+    with no_sleep():
+        return measure_async(lambda i: task.run(**kwargs), iterations, warmup)
+
+
+def bench_composite_workflow(iterations: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """CompositeTask/WorkflowTask 框架开销（示例任务的sleep已去掉）"""
+    with step_cache_enabled(False):
+        results = {
+            "composite_pipeline": _bench_task_run(DataPipelineTask, {"data": SAMPLE_DATA}, iterations, warmup),
+            "workflow_etl": _bench_task_run(ETLWorkflowTask, {"source": "benchmark"}, iterations, warmup),
+            "workflow_wide_100": _bench_task_run(WideWorkflowTask, {}, iterations, warmup),
+        }
+    # 步骤缓存命中时的开销（预热后转换与验证步骤命中，提取与加载每次执行）
+    with step_cache_enabled(True):
+        results["workflow_etl_cached"] = _bench_task_run(
+            ETLWorkflowTask, {"source": "benchmark"}, iterations, warmup
+        )
+    step_cache.clear()
+    return results
+
+
+# 基准测试组：名称 -> (测试函数, 默认迭代次数)
+BENCHMARKS = {
+    "api": (bench_api_submit, 500),
+    "state": (bench_state_manager, 2000),
+    "workflow": (bench_composite_workflow, 500),
+}
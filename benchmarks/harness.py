@@ -0,0 +1,146 @@
+"""
+基准测试工具模块
+
+提供计时统计、Redis后端切换、机器速度校准与基线比较功能。
+"""
+import asyncio
+import json
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis
+import redis.asyncio
+
+from celery_app.utils.redis_conn import AsyncRedisClient, RedisClient
+
+# 内存Redis后端标识
+MEMORY_BACKEND = "memory"
+
+
+def setup_redis(redis_url: Optional[str]) -> str:
+    """
+    将项目的Redis客户端单例切换到基准测试后端，返回后端标识
+
+    必须在导入任务状态管理器等模块之前调用（全局实例在导入时获取Redis客户端）。
+    redis_url为None时使用fakeredis内存实现（需安装fakeredis[lua]）。
+    """
+    if redis_url is None:
+        try:
+            import fakeredis
+        except ImportError as e:
+            raise RuntimeError(
+                "fakeredis[lua] is required for the in-memory backend, or pass --redis-url"
+            ) from e
+        server = fakeredis.FakeServer()
+        RedisClient._instance = fakeredis.FakeRedis(server=server, decode_responses=True)
+        RedisClient._binary_instance = fakeredis.FakeRedis(server=server)
+        AsyncRedisClient._instance = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        AsyncRedisClient._binary_instance = fakeredis.aioredis.FakeRedis(server=server)
+        AsyncRedisClient._broker_instance = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        return MEMORY_BACKEND
+
+    RedisClient._instance = redis.Redis.from_url(redis_url, decode_responses=True)
+    RedisClient._binary_instance = redis.Redis.from_url(redis_url)
+    AsyncRedisClient._instance = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+    AsyncRedisClient._binary_instance = redis.asyncio.Redis.from_url(redis_url)
+    AsyncRedisClient._broker_instance = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+    return "redis"
+
+
+def summarize(durations_ns: List[int]) -> Dict[str, Any]:
+    """汇总单次调用耗时（微秒）"""
+    durations = sorted(durations_ns)
+    count = len(durations)
+
+    def percentile(q: float) -> float:
+        return durations[min(count - 1, math.ceil(q * count) - 1)] / 1000
+
+    mean_us = sum(durations) / count / 1000
+    return {
+        "iterations": count,
+        "mean_us": round(mean_us, 3),
+        "p50_us": round(percentile(0.50), 3),
+        "p95_us": round(percentile(0.95), 3),
+        "p99_us": round(percentile(0.99), 3),
+        "ops_per_sec": round(1e6 / mean_us, 1) if mean_us else None,
+    }
+
+
+def measure(fn: Callable[[int], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    """多次调用fn(i)并统计单次耗时"""
+    for i in range(warmup):
+        fn(i)
+    durations: List[int] = []
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn(warmup + i)
+        durations.append(time.perf_counter_ns() - start)
+    return summarize(durations)
+
+
+def measure_async(fn: Callable[[int], Awaitable[Any]], iterations: int, warmup: int) -> Dict[str, Any]:
+    """在同一个事件循环中多次await fn(i)并统计单次耗时"""
+    async def run() -> Dict[str, Any]:
+        for i in range(warmup):
+            await fn(i)
+        durations: List[int] = []
+        for i in range(iterations):
+            start = time.perf_counter_ns()
+            await fn(warmup + i)
+            durations.append(time.perf_counter_ns() - start)
+        return summarize(durations)
+    return asyncio.run(run())
+
+
+def _reference_workload() -> None:
+    """校准用的固定纯Python负载（字典构造、排序与JSON编解码，与框架开销的构成相近）"""
+    records = [{"id": i, "value": f"value{i}"} for i in range(50)]
+    records.sort(key=lambda item: item["value"])
+    json.loads(json.dumps(records))
+
+
+def calibrate(iterations: int = 2000, warmup: int = 200) -> float:
+    """测量参考负载的p50（微秒），基准结果除以该值得到与机器速度无关的相对耗时"""
+    return measure(lambda i: _reference_workload(), iterations, warmup)["p50_us"]
+
+
+def add_relative(results: Dict[str, Dict[str, Any]], calibration_us: float) -> None:
+    """为每个基准项加入相对耗时relative = p50_us / 参考负载p50"""
+    for stats in results.values():
+        stats["relative"] = round(stats["p50_us"] / calibration_us, 3)
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    metric: str = "relative"
+) -> List[Dict[str, Any]]:
+    """
+    与基线比较
+
+    默认比较相对耗时（见calibrate），基线可在不同机器上复用；
+    返回每个基准项的对比结果，超过基线(1 + tolerance)倍的标记为regression。
+    """
+    comparisons = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None or not base.get(metric):
+            comparisons.append({"name": name, "status": "new", "current": stats[metric]})
+            continue
+        ratio = stats[metric] / base[metric]
+        if ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 - tolerance:
+            status = "improvement"
+        else:
+            status = "ok"
+        comparisons.append({
+            "name": name,
+            "status": status,
+            "baseline": base[metric],
+            "current": stats[metric],
+            "ratio": round(ratio, 3),
+        })
+    return comparisons
@@ -0,0 +1,254 @@
+"""
+任务API开环压测工具
+
+按固定目标速率（或泊松到达）发送 POST /tasks/run，请求的发送时刻只由到达计划决定，
+不等待前一个请求返回（开环），延迟从计划发送时刻开始计算，避免协调遗漏(coordinated omission)。
+提交成功后轮询 GET /tasks/{id} 直到任务结束，统计端到端完成延迟。
+
+用法：
+    python -m benchmarks.loadgen --url http://localhost:8000 --rate 200 --duration 60 \\
+        --mix data_process_task=3 data_validation_task=1
+
+    # 自定义任务参数：{"任务类型": {参数}}
+    python -m benchmarks.loadgen --params-file params.json --mix etl_workflow_task=1 --output report.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+# 结束状态
+TERMINAL_STATUSES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+SAMPLE_DATA = [{"id": i, "value": f"value{i}"} for i in range(10)]
+
+# 示例任务的默认参数
+DEFAULT_PARAMS: Dict[str, Dict[str, Any]] = {
+    "data_process_task": {"data": SAMPLE_DATA},
+    "data_validation_task": {"data": SAMPLE_DATA},
+    "data_pipeline_task": {"data": SAMPLE_DATA},
+    "etl_workflow_task": {"source": "loadgen"},
+}
+
+
+def parse_mix(items: List[str]) -> List[Tuple[str, float]]:
+    """解析任务类型权重（task_type=weight）"""
+    mix = []
+    for item in items:
+        task_type, _, weight = item.partition("=")
+        mix.append((task_type, float(weight or 1)))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise SystemExit("Task mix must contain at least one task type with a positive weight")
+    return mix
+
+
+def latency_summary(latencies: List[float]) -> Optional[Dict[str, Any]]:
+    """汇总延迟（秒 -> 毫秒）"""
+    if not latencies:
+        return None
+    values = sorted(latencies)
+    count = len(values)
+
+    def percentile(q: float) -> float:
+        return round(values[min(count - 1, int(q * count))] * 1000, 3)
+
+    return {
+        "count": count,
+        "mean_ms": round(sum(values) / count * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "p999_ms": percentile(0.999),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+class LoadStats:
+    """压测统计"""
+    def __init__(self):
+        self.submit_latencies: List[float] = []
+        self.completion_latencies: Dict[str, List[float]] = defaultdict(list)
+        self.submitted: Counter = Counter()
+        self.outcomes: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record_error(self, kind: str) -> None:
+        self.outcomes["error"] += 1
+        self.errors[kind] += 1
+
+    def report(self, elapsed: float, target_rate: float) -> Dict[str, Any]:
+        total = sum(self.submitted.values())
+        completion = {
+            task_type: latency_summary(latencies)
+            for task_type, latencies in sorted(self.completion_latencies.items())
+        }
+        all_completions = [value for latencies in self.completion_latencies.values() for value in latencies]
+        if all_completions:
+            completion["all"] = latency_summary(all_completions)
+        return {
+            "target_rate": target_rate,
+            "achieved_rate": round(total / elapsed, 2) if elapsed else None,
+            "duration_s": round(elapsed, 3),
+            "requests": total,
+            "submitted_by_type": dict(self.submitted),
+            "outcomes": dict(self.outcomes),
+            "error_rate": round(self.outcomes["error"] / total, 4) if total else 0.0,
+            "task_failure_rate": round(self.outcomes["FAILURE"] / total, 4) if total else 0.0,
+            "errors": dict(self.errors),
+            "submit_latency": latency_summary(self.submit_latencies),
+            "completion_latency": completion,
+        }
+
+
+class LoadGenerator:
+    """开环压测器"""
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        mix: List[Tuple[str, float]],
+        params: Dict[str, Dict[str, Any]],
+        api_prefix: str = "/api/v1",
+        poll_interval: float = 0.2,
+        completion_timeout: float = 300.0,
+        max_inflight: int = 10000,
+        follow: bool = True
+    ):
+        self.client = client
+        self.task_types = [task_type for task_type, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.params = params
+        self.api_prefix = api_prefix
+        self.poll_interval = poll_interval
+        self.completion_timeout = completion_timeout
+        self.max_inflight = max_inflight
+        self.follow = follow
+        self.stats = LoadStats()
+        self._inflight = 0
+
+    async def _follow(self, task_id: str, task_type: str, scheduled_at: float) -> None:
+        """轮询任务状态直到结束"""
+        deadline = scheduled_at + self.completion_timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                response = await self.client.get(f"{self.api_prefix}/tasks/{task_id}")
+            except httpx.HTTPError as e:
+                self.stats.errors[f"status_{type(e).__name__}"] += 1
+                continue
+            if response.status_code != 200:
+                self.stats.errors[f"status_http_{response.status_code}"] += 1
+                continue
+            status = response.json()["status"]
+            if status in TERMINAL_STATUSES:
+                self.stats.outcomes[status] += 1
+                self.stats.completion_latencies[task_type].append(time.perf_counter() - scheduled_at)
+                return
+        self.stats.record_error("completion_timeout")
+
+    async def _request(self, task_type: str, scheduled_at: float) -> None:
+        """发送一次任务提交（延迟从计划发送时刻计算）"""
+        self._inflight += 1
+        try:
+            payload = {"task_type": task_type, "params": self.params.get(task_type, {})}
+            try:
+                response = await self.client.post(f"{self.api_prefix}/tasks/run", json=payload)
+            except httpx.HTTPError as e:
+                self.stats.record_error(f"submit_{type(e).__name__}")
+                return
+            self.stats.submit_latencies.append(time.perf_counter() - scheduled_at)
+            if response.status_code != 202:
+                self.stats.record_error(f"submit_http_{response.status_code}")
+                return
+            if not self.follow:
+                self.stats.outcomes["submitted"] += 1
+                return
+            await self._follow(response.json()["task_id"], task_type, scheduled_at)
+        finally:
+            self._inflight -= 1
+
+    async def run(self, rate: float, duration: float, arrival: str = "constant") -> Dict[str, Any]:
+        """按到达计划发送请求，并等待所有任务结束"""
+        pending = set()
+        start = time.perf_counter()
+        next_at = start
+        while next_at < start + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task_type = random.choices(self.task_types, self.weights)[0]
+            self.stats.submitted[task_type] += 1
+            if self._inflight >= self.max_inflight:
+                # 客户端自身已饱和，记为丢弃而不是推迟发送
+                self.stats.record_error("dropped_max_inflight")
+            else:
+                request = asyncio.create_task(self._request(task_type, next_at))
+                pending.add(request)
+                request.add_done_callback(pending.discard)
+            interval = random.expovariate(rate) if arrival == "poisson" else 1 / rate
+            next_at += interval
+        elapsed = time.perf_counter() - start
+        if pending:
+            await asyncio.wait(pending)
+        return self.stats.report(elapsed, rate)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the task API")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--api-prefix", default="/api/v1", help="API route prefix")
+    parser.add_argument("--rate", type=float, required=True, help="Target submissions per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to generate load for")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant",
+                        help="Arrival process")
+    parser.add_argument("--mix", nargs="+", default=["data_process_task=1"],
+                        help="Task type mix as task_type=weight")
+    parser.add_argument("--params-file", type=Path, help="JSON file mapping task type to params")
+    parser.add_argument("--no-follow", action="store_true", help="Only submit, do not follow tasks")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Status poll interval (seconds)")
+    parser.add_argument("--completion-timeout", type=float, default=300.0,
+                        help="Give up following a task after this many seconds")
+    parser.add_argument("--max-inflight", type=int, default=10000,
+                        help="Drop arrivals when this many requests are outstanding")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP request timeout (seconds)")
+    parser.add_argument("--output", type=Path, help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    params = dict(DEFAULT_PARAMS)
+    if args.params_file:
+        params.update(json.loads(args.params_file.read_text()))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        generator = LoadGenerator(
+            client,
+            parse_mix(args.mix),
+            params,
+            api_prefix=args.api_prefix,
+            poll_interval=args.poll_interval,
+            completion_timeout=args.completion_timeout,
+            max_inflight=args.max_inflight,
+            follow=not args.no_follow
+        )
+        return await generator.run(args.rate, args.duration, args.arrival)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run_load(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
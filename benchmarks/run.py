@@ -0,0 +1,118 @@
+"""
+性能基准测试入口
+
+用法：
+    # 使用内存Redis（fakeredis），与仓库中的基线比较
+    python -m benchmarks.run
+
+    # 使用本地Redis（建议使用独立的DB）
+    python -m benchmarks.run --redis-url redis://localhost:6379/15
+
+    # 只运行部分基准组，并输出结果文件
+    python -m benchmarks.run --only state workflow --output results.json
+
+    # 更新基线
+    python -m benchmarks.run --update-baseline
+
+各基准项的p50除以同一进程中参考负载的p50（见harness.calibrate）得到相对耗时，基线只保存相对耗时，
+与运行基准的机器速度无关；存在超过容差的相对耗时回退时以退出码1结束，可直接用于CI。
+基线只通过 --update-baseline 生成，不手工编辑。
+"""
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.harness import add_relative, calibrate, compare, setup_redis
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run PowerCap performance benchmarks")
+    parser.add_argument("--redis-url", help="Redis URL; defaults to an in-memory fakeredis server")
+    parser.add_argument("--only", nargs="+", help="Benchmark groups to run (api, state, workflow)")
+    parser.add_argument("--iterations", type=int, help="Override iterations per benchmark")
+    parser.add_argument("--warmup", type=int, default=50, help="Warmup iterations per benchmark")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown of the calibrated p50 (relative to the reference workload)")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with these results")
+    return parser.parse_args(argv)
+
+
+def run_benchmarks(groups: List[str], iterations: Optional[int], warmup: int) -> Dict[str, Dict[str, Any]]:
+    """运行基准测试组"""
+    # 需在切换Redis后端之后导入
+    from benchmarks.cases import BENCHMARKS
+
+    unknown = set(groups) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmark groups: {', '.join(sorted(unknown))}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for group in groups:
+        bench, default_iterations = BENCHMARKS[group]
+        results.update(bench(iterations or default_iterations, warmup))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    backend = setup_redis(args.redis_url)
+
+    from benchmarks.cases import BENCHMARKS
+    groups = args.only or list(BENCHMARKS)
+    calibration_us = calibrate()
+    results = run_benchmarks(groups, args.iterations, args.warmup)
+    add_relative(results, calibration_us)
+
+    report: Dict[str, Any] = {
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": {
+            "backend": backend,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "calibration_p50_us": calibration_us,
+        },
+        "benchmarks": results,
+    }
+
+    exit_code = 0
+    if args.baseline.exists() and not args.update_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("environment", {}).get("backend") != backend:
+            print(f"warning: baseline was recorded with backend {baseline['environment'].get('backend')!r}",
+                  file=sys.stderr)
+        comparisons = compare(results, baseline.get("benchmarks", {}), args.tolerance)
+        report["comparison"] = {"tolerance": args.tolerance, "metric": "relative", "results": comparisons}
+        if any(item["status"] == "regression" for item in comparisons):
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+
+    if args.update_baseline:
+        # 只运行部分基准组时保留基线中其余基准项；基线只保存相对耗时
+        baseline_results = {}
+        if args.baseline.exists():
+            baseline_results = {
+                name: stats for name, stats in json.loads(args.baseline.read_text()).get("benchmarks", {}).items()
+                if "relative" in stats
+            }
+        baseline_results.update({name: {"relative": stats["relative"]} for name, stats in results.items()})
+        environment = {"backend": backend, "python": platform.python_version()}
+        args.baseline.write_text(json.dumps(
+            {"environment": environment, "benchmarks": baseline_results}, indent=2
+        ) + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+任务事件消费模块
+
+消费Celery事件流（task-sent/received/started/succeeded/failed），按任务名与队列记录
+排队等待、运行与端到端延迟。每个集群运行一个消费者进程即可：
+
+    python -m celery_app.event_consumer
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from celery import Celery
+
+from celery_app.utils.latency_metrics import (END_TO_END, QUEUE_WAIT, RUN_TIME,
+                                              LatencyStore, SeriesKey)
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "unknown"
+
+
+class LatencyEventConsumer:
+    """任务延迟事件消费者"""
+    # 连接断开后的重连间隔（秒）
+    reconnect_delay: float = 1.0
+
+    def __init__(self, app: Celery, store: Optional[LatencyStore] = None, max_tracked: int = 100000):
+        self.app = app
+        self.store = store or LatencyStore()
+        # 进行中的任务：任务ID -> 已收到的事件时间戳与任务名、队列
+        self.max_tracked = max_tracked
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _track(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """获取任务跟踪信息，超出上限时淘汰最早的任务"""
+        info = self._tasks.get(event["uuid"])
+        if info is None:
+            info = self._tasks[event["uuid"]] = {}
+            while len(self._tasks) > self.max_tracked:
+                self._tasks.popitem(last=False)
+        if event.get("name"):
+            info["name"] = event["name"]
+        return info
+
+    @staticmethod
+    def _published_at(info: Dict[str, Any]) -> Optional[float]:
+        """任务发布时间（未收到task-sent时以worker接收时间代替）"""
+        return info.get("sent", info.get("received"))
+
+    def _record(self, info: Dict[str, Any], observations: List[Tuple[str, float]], timestamp: float) -> None:
+        task_name = info.get("name", UNKNOWN)
+        queue = info.get("queue", UNKNOWN)
+        series: List[Tuple[SeriesKey, float]] = [
+            ((metric, task_name, queue), value) for metric, value in observations
+        ]
+        if series:
+            self.store.record(series, timestamp)
+
+    def on_task_sent(self, event: Dict[str, Any]) -> None:
+        info = self._track(event)
+        info["sent"] = event["timestamp"]
+        info["queue"] = event.get("queue") or event.get("routing_key") or UNKNOWN
+
+    def on_task_received(self, event: Dict[str, Any]) -> None:
+        self._track(event)["received"] = event["timestamp"]
+
+    def on_task_started(self, event: Dict[str, Any]) -> None:
+        info = self._track(event)
+        info["started"] = event["timestamp"]
+        published_at = self._published_at(info)
+        if published_at is not None:
+            self._record(info, [(QUEUE_WAIT, event["timestamp"] - published_at)], event["timestamp"])
+
+    def on_task_finished(self, event: Dict[str, Any]) -> None:
+        """task-succeeded/task-failed"""
+        info = self._tasks.pop(event["uuid"], None)
+        if info is None:
+            return
+        observations: List[Tuple[str, float]] = []
+        runtime = event.get("runtime")
+        if runtime is None and "started" in info:
+            runtime = event["timestamp"] - info["started"]
+        if runtime is not None:
+            observations.append((RUN_TIME, runtime))
+        published_at = self._published_at(info)
+        if published_at is not None:
+            observations.append((END_TO_END, event["timestamp"] - published_at))
+        self._record(info, observations, event["timestamp"])
+
+    def on_task_revoked(self, event: Dict[str, Any]) -> None:
+        self._tasks.pop(event["uuid"], None)
+
+    def _dispatch(self, handler: Any) -> Any:
+        """单个事件处理失败不影响事件流消费"""
+        def wrapper(event: Dict[str, Any]) -> None:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Failed to handle task event %s", event.get("type"))
+        return wrapper
+
+    def run(self) -> None:
+        """持续消费事件流"""
+        handlers = {
+            "task-sent": self.on_task_sent,
+            "task-received": self.on_task_received,
+            "task-started": self.on_task_started,
+            "task-succeeded": self.on_task_finished,
+            "task-failed": self.on_task_finished,
+            "task-revoked": self.on_task_revoked,
+        }
+        handlers = {event_type: self._dispatch(handler) for event_type, handler in handlers.items()}
+        while True:
+            try:
+                with self.app.connection() as connection:
+                    receiver = self.app.events.Receiver(connection, handlers=handlers)
+                    receiver.capture(limit=None, timeout=None, wakeup=True)
+            except (ConnectionError, OSError):
+                logger.exception("Event stream disconnected, reconnecting")
+                time.sleep(self.reconnect_delay)
+
+
+if __name__ == "__main__":
+    from celery_app.task_registry import app
+
+    logging.basicConfig(level=logging.INFO)
+    LatencyEventConsumer(app).run()
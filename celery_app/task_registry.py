@@ -5,9 +5,15 @@ from celery import Celery
 
 from celery_app.celery_config import celery_config
 from celery_app.tasks.core_tasks import (DataPipelineTask, DataProcessTask,
-                                       DataValidationTask, ETLWorkflowTask,
-                                       ExtractTask, LoadTask, TransformTask)
+                                       DataValidationTask,
+                                       DistributedDataPipelineTask,
+                                       DistributedETLWorkflowTask,
+                                       ETLWorkflowTask, ExtractTask, LoadTask,
+                                       StreamingETLWorkflowTask, TransformTask)
 from celery_app.tasks.scheduled_tasks import SCHEDULED_TASKS
+from celery_app.tasks.workflow_tasks import (WorkflowFinalizeTask,
+                                           WorkflowStepTask)
+from celery_app.utils import worker_registry  # noqa: F401 注册worker心跳信号
 
 # 创建Celery应用实例
 app = Celery("powercap")
@@ -20,10 +26,15 @@ CORE_TASKS = [
     DataProcessTask,
     DataValidationTask,
     DataPipelineTask,
+    DistributedDataPipelineTask,
     ETLWorkflowTask,
+    DistributedETLWorkflowTask,
+    StreamingETLWorkflowTask,
     ExtractTask,
     TransformTask,
-    LoadTask
+    LoadTask,
+    WorkflowStepTask,
+    WorkflowFinalizeTask
 ]
 
 # 注册所有任务
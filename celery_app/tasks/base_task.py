@@ -1,30 +1,109 @@
 """
 任务基类模块
 """
+import asyncio
+import inspect
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, List, Optional
 
-from celery import Task
+from celery import Task, chain, group
+from celery.exceptions import Ignore, Retry
+from celery.utils.time import get_exponential_backoff_interval
 
+from celery_app.utils.async_runner import async_runner
+from celery_app.utils.columnar import BatchScope
+from celery_app.utils.payload_store import payload_store
+from celery_app.utils.result_codec import encode_result
+from celery_app.utils.step_cache import MISS, step_cache
+from celery_app.utils.streaming import ChunkChannel
+from celery_app.utils.task_timing import (DESERIALIZATION, NULL_TIMINGS,
+                                          RESULT_SERIALIZATION, RUN,
+                                          STATE_WRITE, task_timer)
 from celery_app.utils.task_utils import TaskStatus, task_state_manager
+from celery_app.utils.workflow_checkpoint import workflow_checkpoints
+from config.celery import get_task_route
+
+# 当前执行的任务请求：任务协程在常驻事件循环线程中运行，读取不到调用线程本地的self.request
+current_request: ContextVar[Optional[Any]] = ContextVar("current_request", default=None)
+
+
+async def _run_with_request(coro: Awaitable[Any], request: Any) -> Any:
+    """在协程上下文中记录当前任务请求后执行协程"""
+    token = current_request.set(request)
+    try:
+        return await coro
+    finally:
+        current_request.reset(token)
 
 
 class BaseTask(Task, ABC):
     """任务基类"""
     abstract = True
+    # 自动重试的异常类型（与Celery的autoretry_for含义相同，对异步run同样生效）
+    autoretry_for: tuple = ()
+    # 接收任务数据的参数名：组合任务与工作流在首次传入时将其中的列式字典或记录列表转换为ColumnBatch，步骤之间不再转换
+    columnar_inputs: tuple = ()
     
     def __init__(self):
         self.max_retries = 3
         self.default_retry_delay = 60  # 重试延迟（秒）
     
+    @property
+    def timings(self) -> Any:
+        """当前执行的阶段耗时记录（未采样时为空实现）"""
+        return getattr(self.request, "timings", None) or NULL_TIMINGS
+    
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        """同步调用入口：异步run返回的协程提交到worker进程的常驻事件循环执行"""
+        # 外置参数在实际执行时才按引用读取（分布式任务将引用原样传给各步骤）
+        if not getattr(self, "distributed", False):
+            with self.timings.phase(DESERIALIZATION):
+                args, kwargs = payload_store.resolve_arguments(args, kwargs)
+        with self.timings.phase(RUN):
+            result = super().__call__(*args, **kwargs)
+            if inspect.isawaitable(result):
+                try:
+                    return async_runner.run(_run_with_request(result, self.request))
+                except (Ignore, Retry):
+                    raise
+                except self.autoretry_for as exc:
+                    raise self._autoretry(exc)
+            return result
+    
+    def _autoretry(self, exc: Exception) -> Exception:
+        """
+        按autoretry_for/retry_backoff配置重试
+        
+        Celery的自动重试只包装同步run，异步run中的异常在协程执行完成后才抛出，因此在这里处理。
+        """
+        if isinstance(exc, tuple(getattr(self, "dont_autoretry_for", ()))):
+            return exc
+        countdown = None
+        retry_backoff = getattr(self, "retry_backoff", False)
+        if retry_backoff:
+            countdown = get_exponential_backoff_interval(
+                factor=int(max(1.0, retry_backoff)),
+                retries=self.request.retries,
+                maximum=getattr(self, "retry_backoff_max", 600),
+                full_jitter=getattr(self, "retry_jitter", True)
+            )
+        return self.retry(exc=exc, countdown=countdown)
+    
     def on_success(self, retval: Any, task_id: str, args: tuple, kwargs: Dict[str, Any]) -> None:
         """任务成功回调"""
         super().on_success(retval, task_id, args, kwargs)
-        task_state_manager.update_task_status(
-            task_id=task_id,
-            status=TaskStatus.SUCCESS,
-            result=retval
-        )
+        timings = self.timings
+        with timings.phase(RESULT_SERIALIZATION):
+            encoded_result = encode_result(retval) if retval is not None else None
+        with timings.phase(STATE_WRITE):
+            task_state_manager.update_task_status(
+                task_id=task_id,
+                status=TaskStatus.SUCCESS,
+                encoded_result=encoded_result
+            )
     
     def on_failure(
         self,
@@ -36,11 +115,12 @@ class BaseTask(Task, ABC):
     ) -> None:
         """任务失败回调"""
         super().on_failure(exc, task_id, args, kwargs, einfo)
-        task_state_manager.update_task_status(
-            task_id=task_id,
-            status=TaskStatus.FAILURE,
-            error=str(exc)
-        )
+        with self.timings.phase(STATE_WRITE):
+            task_state_manager.update_task_status(
+                task_id=task_id,
+                status=TaskStatus.FAILURE,
+                error=str(exc)
+            )
     
     def on_retry(
         self,
@@ -52,19 +132,23 @@ class BaseTask(Task, ABC):
     ) -> None:
         """任务重试回调"""
         super().on_retry(exc, task_id, args, kwargs, einfo)
-        task_state_manager.update_task_status(
-            task_id=task_id,
-            status=TaskStatus.RETRY,
-            error=str(exc)
-        )
+        with self.timings.phase(STATE_WRITE):
+            task_state_manager.update_task_status(
+                task_id=task_id,
+                status=TaskStatus.RETRY,
+                error=str(exc)
+            )
     
     def before_start(self, task_id: str, args: tuple, kwargs: Dict[str, Any]) -> None:
         """任务开始前回调"""
         super().before_start(task_id, args, kwargs)
-        task_state_manager.update_task_status(
-            task_id=task_id,
-            status=TaskStatus.STARTED
-        )
+        # 按采样率开始记录阶段耗时（记录挂在本次执行的请求上下文中）
+        self.request.timings = task_timer.start(self.request, self.name)
+        with self.timings.phase(STATE_WRITE):
+            task_state_manager.update_task_status(
+                task_id=task_id,
+                status=TaskStatus.STARTED
+            )
     
     def after_return(
         self,
@@ -77,7 +161,8 @@ class BaseTask(Task, ABC):
     ) -> None:
         """任务完成后回调"""
         super().after_return(status, retval, task_id, args, kwargs, einfo)
-        # 可以在这里添加任务完成后的清理工作
+        task_timer.finish(self.timings)
+        self.request.timings = None
     
     @abstractmethod
     async def run(self, *args: Any, **kwargs: Any) -> Any:
@@ -85,62 +170,523 @@ class BaseTask(Task, ABC):
         pass
 
 
-class CompositeTask(BaseTask):
+def error_result(exc: BaseException) -> Dict[str, str]:
+    """失败子任务在结果中的可序列化错误信息"""
+    return {"error": type(exc).__name__, "message": str(exc)}
+
+
+def merge_step_refs(refs: Any) -> Dict[str, Any]:
+    """合并上游步骤传来的输出引用（单个步骤为字典，group为字典列表，首层步骤为None）"""
+    if refs is None:
+        return {}
+    if isinstance(refs, dict):
+        return refs
+    merged: Dict[str, Any] = {}
+    for item in refs:
+        merged.update(item)
+    return merged
+
+
+class DistributedTaskMixin(ABC):
+    """
+    分布式执行混入类
+    
+    distributed = True 的任务作为Celery任务执行时，不在当前worker中执行各步骤，而是将步骤图按拓扑层
+    编译为Celery canvas：同层步骤为group，层与层之间为chain（group后接任务即为chord），最后接
+    workflow_finalize_task。每个步骤作为独立的 workflow_step_task 发往步骤所在队列，由任意空闲worker执行；
+    步骤输出写入参数存储，步骤之间只传递引用。
+    
+    父任务发布canvas后即结束（Celery状态为IGNORED）并释放worker，TaskStateManager中的父任务状态保持STARTED，
+    由 workflow_finalize_task 写入SUCCESS与汇总结果，或由最终失败的步骤写入FAILURE。
+    分布式模式下任一步骤失败即整体失败，各步骤独立重试。
+    """
+    distributed: bool = False
+    # 分布式模式下步骤的默认队列，None表示按步骤任务类型的路由选择
+    step_queue: Optional[str] = None
+    
+    @abstractmethod
+    def _distributed_layers(self) -> List[List[str]]:
+        """步骤按拓扑层分组（同层步骤互不依赖，需要子类实现）"""
+        pass
+    
+    @abstractmethod
+    def step_task(self, step_id: str) -> BaseTask:
+        """步骤对应的任务（需要子类实现）"""
+        pass
+    
+    def _step_queue(self, step_id: str) -> Optional[str]:
+        """步骤所在队列"""
+        return self.step_queue
+    
+    def _step_options(self, step_id: str, priority: Optional[int]) -> Dict[str, Any]:
+        """
+        步骤消息的路由选项
+        
+        队列依次取步骤单独指定的队列、step_queue与步骤任务类型的路由；
+        优先级与父任务相同，步骤不会越过同类任务排队。
+        """
+        options = get_task_route(self.step_task(step_id).name)
+        queue = self._step_queue(step_id)
+        if queue:
+            options["queue"] = queue
+        if priority is not None:
+            options["priority"] = priority
+        return options
+    
+    def step_sources(self, step_id: str) -> List[str]:
+        """步骤需要读取输出的上游步骤"""
+        return []
+    
+    @abstractmethod
+    async def run_step(self, step_id: str, results: Dict[str, Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """执行单个步骤（results 中为上游步骤的输出，需要子类实现）"""
+        pass
+    
+    @abstractmethod
+    def collect_results(self, results: Dict[str, Any]) -> Any:
+        """将各步骤输出汇总为任务结果（需要子类实现）"""
+        pass
+    
+    def _is_distributed_run(self) -> bool:
+        """是否作为分布式模式的Celery任务执行（在其他任务中直接调用run时仍在进程内执行）"""
+        request = current_request.get()
+        return (
+            self.distributed
+            and getattr(request, "id", None) is not None
+            and getattr(request, "task", None) == self.name
+        )
+    
+    def build_canvas(
+        self,
+        parent_id: str,
+        args: tuple,
+        kwargs: Dict[str, Any],
+        priority: Optional[int] = None
+    ) -> Any:
+        """将步骤图编译为Celery canvas（参数中的引用原样传给各步骤）"""
+        layers = []
+        for layer in self._distributed_layers():
+            signatures = [
+                self.app.signature(
+                    "workflow_step_task",
+                    kwargs={
+                        "workflow": self.name,
+                        "step_id": step_id,
+                        "parent_id": parent_id,
+                        "step_args": list(args),
+                        "params": kwargs
+                    },
+                    **self._step_options(step_id, priority)
+                )
+                for step_id in layer
+            ]
+            layers.append(signatures[0] if len(signatures) == 1 else group(signatures))
+        finalize = self.app.signature(
+            "workflow_finalize_task",
+            kwargs={"workflow": self.name, "parent_id": parent_id},
+            priority=priority
+        )
+        return chain(*layers, finalize)
+    
+    async def _dispatch(self, args: tuple, kwargs: Dict[str, Any]) -> None:
+        """发布步骤canvas并结束当前任务（发布为阻塞IO，在线程中执行）"""
+        request = current_request.get()
+        # 步骤沿用父任务消息的优先级（提交时未指定则为路由表中的优先级）
+        priority = (request.delivery_info or {}).get("priority")
+        if priority is None:
+            priority = get_task_route(self.name).get("priority")
+        canvas = self.build_canvas(request.id, args, kwargs, priority)
+        await asyncio.to_thread(canvas.apply_async)
+        raise Ignore()
+
+
+class CompositeTask(DistributedTaskMixin, BaseTask):
     """组合任务基类"""
     abstract = True
+    # 是否并发执行子任务
+    parallel: bool = False
+    # 并发模式下同时运行的最大子任务数，None表示不限制
+    max_concurrency: Optional[int] = None
+    # True: 任一子任务失败立即抛出并取消其余子任务
+    # False: 执行全部子任务，失败子任务按位置放入错误信息 {"error": 异常类型, "message": 异常信息}
+    fail_fast: bool = True
     
     def __init__(self):
         super().__init__()
         self.subtasks: list[BaseTask] = []
+        self.subtask_queues: list[Optional[str]] = []
     
-    def add_subtask(self, task: BaseTask) -> None:
-        """添加子任务"""
+    def add_subtask(self, task: BaseTask, queue: Optional[str] = None) -> None:
+        """添加子任务（queue 为分布式模式下子任务所在队列，默认使用step_queue）"""
         self.subtasks.append(task)
+        self.subtask_queues.append(queue)
+    
+    def _distributed_layers(self) -> List[List[str]]:
+        """并发模式下所有子任务同层，否则每个子任务单独一层（步骤ID为子任务序号）"""
+        step_ids = [str(index) for index in range(len(self.subtasks))]
+        return [step_ids] if self.parallel else [[step_id] for step_id in step_ids]
+    
+    def step_task(self, step_id: str) -> BaseTask:
+        return self.subtasks[int(step_id)]
+    
+    def _step_queue(self, step_id: str) -> Optional[str]:
+        return self.subtask_queues[int(step_id)] or self.step_queue
+    
+    async def run_step(self, step_id: str, results: Dict[str, Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        return await self.subtasks[int(step_id)].run(*args, **kwargs)
+    
+    def collect_results(self, results: Dict[str, Any]) -> List[Any]:
+        return [results[str(index)] for index in range(len(self.subtasks))]
+    
+    async def _run_subtask(
+        self,
+        subtask: BaseTask,
+        semaphore: Optional[asyncio.Semaphore],
+        args: tuple,
+        kwargs: Dict[str, Any]
+    ) -> Any:
+        """在并发上限内执行单个子任务"""
+        if semaphore is None:
+            return await subtask.run(*args, **kwargs)
+        async with semaphore:
+            return await subtask.run(*args, **kwargs)
+    
+    async def _run_subtasks(self, args: tuple, kwargs: Dict[str, Any], scope: BatchScope) -> List[Any]:
+        """执行所有子任务（列式输入已在scope中转换为ColumnBatch）"""
+        if not self.parallel:
+            results = []
+            for subtask in self.subtasks:
+                try:
+                    result = await subtask.run(*args, **scope.convert_arguments(subtask.columnar_inputs, kwargs))
+                except Exception as exc:
+                    if self.fail_fast:
+                        raise
+                    result = error_result(exc)
+                results.append(result)
+            return results
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+        futures = [
+            asyncio.ensure_future(self._run_subtask(
+                subtask, semaphore, args, scope.convert_arguments(subtask.columnar_inputs, kwargs)
+            ))
+            for subtask in self.subtasks
+        ]
+        try:
+            results = await asyncio.gather(*futures, return_exceptions=not self.fail_fast)
+            return [
+                error_result(result) if isinstance(result, BaseException) else result
+                for result in results
+            ]
+        finally:
+            for future in futures:
+                future.cancel()
+            await asyncio.gather(*futures, return_exceptions=True)
     
     async def run(self, *args: Any, **kwargs: Any) -> Any:
-        """执行所有子任务"""
-        results = []
-        for subtask in self.subtasks:
-            result = await subtask.run(*args, **kwargs)
-            results.append(result)
-        return results
+        """执行所有子任务，结果按子任务添加顺序返回"""
+        if self.distributed:
+            if self._is_distributed_run():
+                await self._dispatch(args, kwargs)
+            args, kwargs = await asyncio.to_thread(payload_store.resolve_arguments, args, kwargs)
+        scope = BatchScope()
+        results = await self._run_subtasks(args, kwargs, scope)
+        return [scope.restore(result) for result in results]
 
 
-class WorkflowTask(BaseTask):
-    """工作流任务基类"""
+class WorkflowTask(DistributedTaskMixin, BaseTask):
+    """
+    工作流任务基类
+    
+    流式模式（streaming = True）下，实现了 stream 方法的步骤作为生产者，返回数据块的异步迭代器；
+    通过 inputs 引用生产者的步骤在生产者启动后即开始运行，接收对应的有界数据块通道，
+    生产者按最慢的消费者速度推进。生产者步骤的结果为数据块与记录数统计。
+    
+    步骤的列式输入（columnar_inputs）在首次传入时由列式字典或记录列表（例如提取步骤的输出）转换为
+    ColumnBatch，步骤之间直接传递，执行结束时再转换回首个转换输入的格式。
+    
+    以 cache=True 添加的步骤按步骤任务名、代码版本与输入缓存结果，输入不变时直接返回缓存结果
+    （只用于结果仅取决于输入的步骤；流式生产者与消费者不缓存）。
+    
+    作为Celery任务执行时，每个完成的步骤记录检查点（输出写入参数存储），同一任务重试或重新投递时
+    跳过已完成的步骤，从第一个未完成的步骤继续；工作流成功结束后删除检查点。
+    
+    分布式模式（distributed = True）见 DistributedTaskMixin，流式工作流不支持分布式执行。
+    """
     abstract = True
+    # 同时运行的最大步骤数，None表示不限制（流式模式下不能小于数据流生产者与消费者的总数）
+    max_concurrency: Optional[int] = None
+    # 是否启用流式模式
+    streaming: bool = False
+    # 流式模式下每条通道最多缓存的数据块数
+    stream_buffer: int = 4
     
     def __init__(self):
         super().__init__()
         self.steps: Dict[str, BaseTask] = {}
         self.dependencies: Dict[str, list[str]] = {}
+        self.inputs: Dict[str, Dict[str, str]] = {}
+        self.dependents: Dict[str, list[str]] = {}
+        self.topological_order: list[str] = []
+        self.cached_steps: set[str] = set()
+        self.step_queues: Dict[str, str] = {}
     
     def add_step(
         self,
         step_id: str,
         task: BaseTask,
-        depends_on: Optional[list[str]] = None
+        depends_on: Optional[list[str]] = None,
+        inputs: Optional[Dict[str, str]] = None,
+        cache: bool = False,
+        queue: Optional[str] = None
     ) -> None:
-        """添加工作流步骤"""
+        """
+        添加工作流步骤
+        
+        依赖的步骤必须先于当前步骤添加，因此步骤图始终无环，添加顺序即为拓扑序。
+        inputs 将上游步骤的结果作为关键字参数传入当前步骤（参数名 -> 步骤ID），
+        其中引用的步骤自动视为依赖。
+        cache 为True时缓存步骤结果。
+        queue 为分布式模式下步骤所在队列，默认使用step_queue。
+        """
+        if step_id in self.steps:
+            raise ValueError(f"Duplicate workflow step '{step_id}'")
+        
+        step_inputs = dict(inputs or {})
+        deps = list(dict.fromkeys([*(depends_on or []), *step_inputs.values()]))
+        for dep in deps:
+            if dep == step_id:
+                raise ValueError(f"Workflow step '{step_id}' cannot depend on itself")
+            if dep not in self.steps:
+                raise ValueError(
+                    f"Workflow step '{step_id}' depends on unknown step '{dep}' "
+                    f"(dependencies must be added first)"
+                )
+        
         self.steps[step_id] = task
-        if depends_on:
-            self.dependencies[step_id] = depends_on
+        if deps:
+            self.dependencies[step_id] = deps
+        if step_inputs:
+            self.inputs[step_id] = step_inputs
+        self.dependents[step_id] = []
+        for dep in deps:
+            self.dependents[dep].append(step_id)
+        self.topological_order.append(step_id)
+        if cache:
+            self.cached_steps.add(step_id)
+        if queue:
+            self.step_queues[step_id] = queue
+    
+    def _distributed_layers(self) -> List[List[str]]:
+        """按拓扑层分组：每个步骤位于其所有依赖所在层的下一层"""
+        if self.streaming:
+            raise ValueError(f"Streaming workflow '{self.name}' cannot run distributed")
+        levels: Dict[str, int] = {}
+        layers: List[List[str]] = []
+        for step_id in self.topological_order:
+            level = max((levels[dep] + 1 for dep in self.dependencies.get(step_id, [])), default=0)
+            levels[step_id] = level
+            if level == len(layers):
+                layers.append([])
+            layers[level].append(step_id)
+        return layers
+    
+    def step_task(self, step_id: str) -> BaseTask:
+        return self.steps[step_id]
+    
+    def _step_queue(self, step_id: str) -> Optional[str]:
+        return self.step_queues.get(step_id, self.step_queue)
+    
+    def step_sources(self, step_id: str) -> List[str]:
+        return list(dict.fromkeys(self.inputs.get(step_id, {}).values()))
+    
+    async def run_step(self, step_id: str, results: Dict[str, Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        return await self._run_step(step_id, results, args, kwargs, {})
+    
+    def collect_results(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        return {step_id: results[step_id] for step_id in self.topological_order}
+    
+    def _is_producer(self, step_id: str) -> bool:
+        """流式模式下步骤是否为数据块生产者"""
+        return self.streaming and hasattr(self.steps[step_id], "stream")
+    
+    def _stream_sources(self, step_id: str) -> Dict[str, str]:
+        """步骤以数据块流方式接收的输入（参数名 -> 生产者步骤ID）"""
+        return {
+            name: source
+            for name, source in self.inputs.get(step_id, {}).items()
+            if self._is_producer(source)
+        }
+    
+    def _check_streams(self) -> Dict[str, set[str]]:
+        """
+        检查数据流连接，返回各数据流消费者所消费的生产者（非流式模式下为空）
+        
+        消费数据流的步骤只能依赖其生产者，否则可能在通道写满后互相等待；
+        并发上限必须能让所有生产者与消费者同时运行，否则已启动的生产者在通道写满后阻塞，
+        占满上限的同时等待无法启动的消费者。
+        """
+        if not self.streaming:
+            return {}
+        stream_sources: Dict[str, set[str]] = {}
+        for step_id in self.topological_order:
+            sources = set(self._stream_sources(step_id).values())
+            if not sources:
+                continue
+            if set(self.dependencies.get(step_id, [])) - sources:
+                raise ValueError(
+                    f"Streaming workflow step '{step_id}' consumes a stream and cannot "
+                    f"depend on other steps"
+                )
+            stream_sources[step_id] = sources
+        stream_steps = set(stream_sources).union(*stream_sources.values())
+        if self.max_concurrency is not None and self.max_concurrency < len(stream_steps):
+            raise ValueError(
+                f"Streaming workflow '{self.name}' has {len(stream_steps)} stream steps that must "
+                f"run at once, but max_concurrency is {self.max_concurrency}"
+            )
+        return stream_sources
+    
+    def _checkpoint_id(self) -> Optional[str]:
+        """检查点ID（当前Celery任务ID + 工作流名称），不在Celery任务中执行或未启用检查点时为None"""
+        task_id = getattr(current_request.get(), "id", None)
+        if not task_id or not workflow_checkpoints.enabled:
+            return None
+        return f"{task_id}:{self.name}"
+    
+    async def _pump_stream(self, stream: Any, channels: list[ChunkChannel]) -> Dict[str, int]:
+        """将生产者的数据块依次写入各消费者通道"""
+        chunks = rows = 0
+        try:
+            async for chunk in stream:
+                chunks += 1
+                rows += len(chunk)
+                for channel in channels:
+                    await channel.put(chunk)
+        except Exception as e:
+            for channel in channels:
+                await channel.close(e)
+            raise
+        for channel in channels:
+            await channel.close()
+        return {"chunks": chunks, "rows": rows}
+    
+    async def _run_step(
+        self,
+        step_id: str,
+        results: Dict[str, Any],
+        args: tuple,
+        kwargs: Dict[str, Any],
+        channels: Dict[tuple, ChunkChannel],
+        scope: Optional[BatchScope] = None
+    ) -> Any:
+        """执行单个步骤，并注入上游步骤的结果（或数据块通道）"""
+        step_kwargs = {
+            **kwargs,
+            **{
+                name: channels[(source, step_id)] if (source, step_id) in channels else results[source]
+                for name, source in self.inputs.get(step_id, {}).items()
+            }
+        }
+        task = self.steps[step_id]
+        if scope is not None and task.columnar_inputs:
+            step_kwargs = scope.convert_arguments(task.columnar_inputs, step_kwargs)
+        if self._is_producer(step_id):
+            consumers = [channel for (source, _), channel in channels.items() if source == step_id]
+            return await self._pump_stream(task.stream(*args, **step_kwargs), consumers)
+        if step_id in self.cached_steps and step_cache.enabled and not self._stream_sources(step_id):
+            return await self._run_cached_step(task, args, step_kwargs)
+        return await task.run(*args, **step_kwargs)
+    
+    async def _run_cached_step(self, task: BaseTask, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """命中缓存时直接返回结果，否则执行步骤并写入缓存（摘要计算与Redis读写在线程中执行）"""
+        key, result = await asyncio.to_thread(step_cache.lookup, task, args, kwargs)
+        if result is not MISS:
+            return result
+        start = time.perf_counter()
+        result = await task.run(*args, **kwargs)
+        await asyncio.to_thread(step_cache.store, key, result, time.perf_counter() - start)
+        return result
     
     async def run(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
-        """执行工作流"""
+        """执行工作流（依赖已满足的步骤并发执行）"""
+        if self.distributed:
+            if self._is_distributed_run():
+                await self._dispatch(args, kwargs)
+            args, kwargs = await asyncio.to_thread(payload_store.resolve_arguments, args, kwargs)
+        # 各数据流消费者所消费的生产者（消费者只依赖其生产者，在生产者全部启动后即可启动）
+        stream_sources = self._check_streams()
+        producers = (
+            {step_id for step_id in self.topological_order if self._is_producer(step_id)}
+            if self.streaming else set()
+        )
         results: Dict[str, Any] = {}
-        executed = set()
+        channels: Dict[tuple, ChunkChannel] = {}
+        # 需等待完成的依赖数，以及数据流消费者需等待启动的生产者数
+        pending_deps = {
+            step_id: 0 if step_id in stream_sources else len(self.dependencies.get(step_id, ()))
+            for step_id in self.topological_order
+        }
+        pending_streams = {step_id: len(sources) for step_id, sources in stream_sources.items()}
+        # 同一任务重试或重新投递时，已完成的步骤直接使用检查点中的输出（流式步骤不记录检查点）
+        checkpoint_id = self._checkpoint_id()
+        checkpointed: set[str] = set()
+        if checkpoint_id:
+            checkpointed = {
+                step_id for step_id in self.topological_order
+                if step_id not in producers and step_id not in stream_sources
+            }
+            results.update(await asyncio.to_thread(workflow_checkpoints.load, checkpoint_id, checkpointed))
+            for step_id in results:
+                for dependent in self.dependents[step_id]:
+                    pending_deps[dependent] -= 1
+        ready = deque(
+            step_id for step_id in self.topological_order
+            if step_id not in results and pending_deps[step_id] == 0 and step_id not in stream_sources
+        )
+        running: Dict[asyncio.Future, str] = {}
+        limit = self.max_concurrency
+        scope = BatchScope()
         
-        while len(executed) < len(self.steps):
-            for step_id, task in self.steps.items():
-                if step_id in executed:
-                    continue
+        try:
+            while ready or running:
+                # 在并发上限内启动所有就绪步骤
+                while ready and (limit is None or len(running) < limit):
+                    step_id = ready.popleft()
+                    if step_id in producers:
+                        # 生产者启动时为各数据流消费者创建通道，消费者随即可以启动
+                        for dependent in self.dependents[step_id]:
+                            if step_id in stream_sources.get(dependent, ()):
+                                channels[(step_id, dependent)] = ChunkChannel(self.stream_buffer)
+                                pending_streams[dependent] -= 1
+                                if pending_streams[dependent] == 0:
+                                    ready.append(dependent)
+                    future = asyncio.ensure_future(
+                        self._run_step(step_id, results, args, kwargs, channels, scope)
+                    )
+                    running[future] = step_id
                 
-                # 检查依赖是否已完成
-                deps = self.dependencies.get(step_id, [])
-                if all(dep in executed for dep in deps):
-                    result = await task.run(*args, **kwargs)
-                    results[step_id] = result
-                    executed.add(step_id)
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    step_id = running.pop(future)
+                    results[step_id] = future.result()
+                    if checkpoint_id and step_id in checkpointed:
+                        await asyncio.to_thread(
+                            workflow_checkpoints.save, checkpoint_id, step_id, results[step_id]
+                        )
+                    for dependent in self.dependents[step_id]:
+                        if dependent in stream_sources:
+                            continue
+                        pending_deps[dependent] -= 1
+                        if pending_deps[dependent] == 0:
+                            ready.append(dependent)
+        finally:
+            # 任一步骤失败时取消其余仍在运行的步骤
+            for future in running:
+                future.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
         
-        return results 
\ No newline at end of file
+        if checkpoint_id:
+            await asyncio.to_thread(workflow_checkpoints.clear, checkpoint_id)
+        return {step_id: scope.restore(results[step_id]) for step_id in self.topological_order}
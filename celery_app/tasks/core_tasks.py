@@ -2,59 +2,75 @@
 核心任务示例模块
 """
 import asyncio
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List
 
 from celery_app.tasks.base_task import BaseTask, CompositeTask, WorkflowTask
+from celery_app.utils.columnar import (ColumnBatch, as_batch, from_batch,
+                                       num_rows, upper, valid_mask)
+from celery_app.utils.streaming import is_stream, iter_chunks
+
+# 任务数据：列式字典 {"columns": {...}, "num_rows": n}、ColumnBatch或记录列表（兼容格式），按列处理，
+# 输出与输入格式相同；组合任务与工作流在入口处统一转换为ColumnBatch（见BatchScope）。
+# 流式工作流中为ColumnBatch数据块的异步迭代器
+TaskData = Any
 
 
 class DataProcessTask(BaseTask):
     """数据处理任务"""
     name = "data_process_task"
+    columnar_inputs = ("data",)
     
-    async def run(self, data: List[Dict[str, Any]], **kwargs: Any) -> List[Dict[str, Any]]:
-        """处理数据列表"""
+    async def run(self, data: TaskData, **kwargs: Any) -> TaskData:
+        """处理数据（新增处理标记与时间戳）"""
         # 模拟数据处理
         await asyncio.sleep(2)
-        processed_data = []
-        for item in data:
-            processed_item = {
-                **item,
-                "processed": True,
-                "timestamp": asyncio.get_running_loop().time()
-            }
-            processed_data.append(processed_item)
-        return processed_data
+        timestamp = asyncio.get_running_loop().time()
+        batch, data_format = as_batch(data)
+        batch = batch.with_constant("processed", True).with_constant("timestamp", timestamp)
+        return from_batch(batch, data_format)
 
 
 class DataValidationTask(BaseTask):
-    """数据验证任务"""
+    """
+    数据验证任务
+    
+    必填字段缺失或为None的记录均视为无效（列式数据中缺失字段即为空值）。
+    """
     name = "data_validation_task"
+    columnar_inputs = ("data",)
+    
+    required_fields = ["id", "value"]
     
-    async def run(self, data: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+    def _validate(self, batch: ColumnBatch, summary: Dict[str, Any]) -> None:
+        """按列检查必填字段非空，只为无效行构造错误信息"""
+        mask = valid_mask(batch, self.required_fields)
+        valid_count = sum(mask)
+        summary["valid_count"] += valid_count
+        summary["invalid_count"] += batch.num_rows - valid_count
+        summary["errors"].extend(
+            f"Missing required fields in item: {batch.row(index)}"
+            for index, valid in enumerate(mask)
+            if not valid
+        )
+    
+    async def run(self, data: TaskData, **kwargs: Any) -> Dict[str, Any]:
         """验证数据"""
         # 模拟数据验证
         await asyncio.sleep(1)
-        valid_count = 0
-        invalid_count = 0
-        errors = []
-        
-        for item in data:
-            if all(key in item for key in ["id", "value"]):
-                valid_count += 1
-            else:
-                invalid_count += 1
-                errors.append(f"Missing required fields in item: {item}")
-        
-        return {
-            "valid_count": valid_count,
-            "invalid_count": invalid_count,
-            "errors": errors
-        }
+        summary: Dict[str, Any] = {"valid_count": 0, "invalid_count": 0, "errors": []}
+        if is_stream(data):
+            async for chunk in data:
+                self._validate(chunk, summary)
+        else:
+            self._validate(as_batch(data)[0], summary)
+        return summary
 
 
 class DataPipelineTask(CompositeTask):
     """数据处理管道任务"""
     name = "data_pipeline_task"
+    # 处理与验证互不依赖，并发执行
+    parallel = True
     
     def __init__(self):
         super().__init__()
@@ -63,62 +79,137 @@ class DataPipelineTask(CompositeTask):
         self.add_subtask(DataValidationTask())
 
 
+class DistributedDataPipelineTask(DataPipelineTask):
+    """分布式数据处理管道任务（处理与验证作为独立的Celery任务由任意空闲worker执行）"""
+    name = "distributed_data_pipeline_task"
+    distributed = True
+
+
 class ETLWorkflowTask(WorkflowTask):
     """ETL工作流任务"""
     name = "etl_workflow_task"
+    # 失败时重试，重试与worker异常退出后的重新投递均从检查点继续
+    autoretry_for = (Exception,)
+    retry_backoff = True
+    acks_late = True
+    reject_on_worker_lost = True
     
     def __init__(self):
         super().__init__()
-        # 定义工作流步骤
+        # 定义工作流步骤（提取与加载每次执行；转换与验证只取决于输入，提取结果不变时直接使用缓存结果）
         self.add_step("extract", ExtractTask())
-        self.add_step("transform", TransformTask(), depends_on=["extract"])
-        self.add_step("load", LoadTask(), depends_on=["transform"])
-        self.add_step("validate", DataValidationTask(), depends_on=["load"])
+        self.add_step("transform", TransformTask(), inputs={"data": "extract"}, cache=True)
+        self.add_step("load", LoadTask(), inputs={"data": "transform"})
+        self.add_step(
+            "validate",
+            DataValidationTask(),
+            depends_on=["load"],
+            inputs={"data": "transform"},
+            cache=True
+        )
+
+
+class DistributedETLWorkflowTask(ETLWorkflowTask):
+    """
+    分布式ETL工作流任务
+    
+    各步骤编译为Celery canvas，作为独立任务发往etl队列，由任意空闲worker执行，步骤之间按引用传递输出；
+    父任务发布后即释放worker，状态与汇总结果由最后一个步骤之后的汇总任务写入。
+    """
+    name = "distributed_etl_workflow_task"
+    distributed = True
+    step_queue = "etl"
+
+
+class StreamingETLWorkflowTask(WorkflowTask):
+    """
+    流式ETL工作流任务
+    
+    提取、转换、加载与验证同时运行，步骤之间按数据块传递，内存占用与数据总量无关。
+    加载与验证并行消费转换结果（流式模式下消费者不能等待其他步骤完成）。
+    """
+    name = "streaming_etl_workflow_task"
+    streaming = True
+    
+    def __init__(self):
+        super().__init__()
+        self.add_step("extract", ExtractTask())
+        self.add_step("transform", TransformTask(), inputs={"data": "extract"})
+        self.add_step("load", LoadTask(), inputs={"data": "transform"})
+        self.add_step("validate", DataValidationTask(), inputs={"data": "transform"})
 
 
 class ExtractTask(BaseTask):
     """数据提取任务"""
     name = "extract_task"
+    # 流式提取时每个数据块的记录数
+    chunk_size = 10000
+    
+    def _iter_records(self, source: str, num_records: int = 3) -> Iterator[Dict[str, Any]]:
+        """逐条读取数据源记录"""
+        for i in range(1, num_records + 1):
+            yield {"id": i, "value": f"data{i}"}
     
     async def run(self, source: str, **kwargs: Any) -> List[Dict[str, Any]]:
         """从数据源提取数据"""
         # 模拟数据提取
         await asyncio.sleep(2)
-        return [
-            {"id": 1, "value": "data1"},
-            {"id": 2, "value": "data2"},
-            {"id": 3, "value": "data3"}
-        ]
+        return list(self._iter_records(source, kwargs.get("num_records", 3)))
+    
+    async def stream(self, source: str, **kwargs: Any) -> AsyncIterator[ColumnBatch]:
+        """从数据源按数据块提取数据"""
+        # 模拟建立数据源连接
+        await asyncio.sleep(2)
+        records = self._iter_records(source, kwargs.get("num_records", 3))
+        async for chunk in iter_chunks(records, kwargs.get("chunk_size", self.chunk_size)):
+            yield chunk
 
 
 class TransformTask(BaseTask):
     """数据转换任务"""
     name = "transform_task"
+    columnar_inputs = ("data",)
+    
+    def _transform(self, batch: ColumnBatch) -> ColumnBatch:
+        """按列转换"""
+        return (
+            batch
+            .with_constant("transformed", True)
+            .with_column("value_upper", upper(batch.column("value")))
+        )
     
-    async def run(self, data: List[Dict[str, Any]], **kwargs: Any) -> List[Dict[str, Any]]:
+    async def run(self, data: TaskData, **kwargs: Any) -> TaskData:
         """转换数据格式"""
         # 模拟数据转换
         await asyncio.sleep(1.5)
-        return [
-            {
-                **item,
-                "transformed": True,
-                "value_upper": item["value"].upper()
-            }
-            for item in data
-        ]
+        batch, data_format = as_batch(data)
+        return from_batch(self._transform(batch), data_format)
+    
+    async def stream(self, data: AsyncIterator[ColumnBatch], **kwargs: Any) -> AsyncIterator[ColumnBatch]:
+        """逐块转换数据"""
+        # 模拟转换初始化
+        await asyncio.sleep(1.5)
+        async for chunk in data:
+            yield self._transform(chunk)
 
 
 class LoadTask(BaseTask):
     """数据加载任务"""
     name = "load_task"
+    columnar_inputs = ("data",)
     
-    async def run(self, data: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
-        """加载数据到目标存储"""
+    async def run(self, data: TaskData, **kwargs: Any) -> Dict[str, Any]:
+        """加载数据到目标存储（流式输入时逐块加载）"""
         # 模拟数据加载
         await asyncio.sleep(1)
+        if is_stream(data):
+            loaded_count = 0
+            async for chunk in data:
+                loaded_count += len(chunk)
+        else:
+            loaded_count = num_rows(data)
         return {
-            "loaded_count": len(data),
+            "loaded_count": loaded_count,
             "success": True,
             "target": kwargs.get("target", "default_storage")
         } 
\ No newline at end of file
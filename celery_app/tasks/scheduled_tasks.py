@@ -9,6 +9,8 @@ from celery.schedules import crontab
 
 from celery_app.tasks.base_task import BaseTask
 from celery_app.tasks.core_tasks import DataPipelineTask, ETLWorkflowTask
+from celery_app.utils.payload_store import payload_store
+from celery_app.utils.task_utils import task_state_manager
 
 
 class HealthCheckTask(BaseTask):
@@ -49,10 +51,18 @@ class DataCleanupTask(BaseTask):
     
     async def run(self, **kwargs: Any) -> Dict[str, Any]:
         """清理过期数据"""
-        # 模拟数据清理
-        await asyncio.sleep(2)
+        # 增量SCAN清理任务状态键，在线程中执行以免阻塞事件循环
+        stats = await asyncio.to_thread(
+            task_state_manager.purge_task_data,
+            scan_count=kwargs.get("scan_count"),
+            batch_pause=kwargs.get("batch_pause")
+        )
+        # 外置参数的Redis分块自动过期，本机文件需要按修改时间清理
+        payload_stats = await asyncio.to_thread(payload_store.purge_files)
         return {
-            "cleaned_records": 100,
+            "cleaned_records": stats["deleted_keys"],
+            **stats,
+            "deleted_payload_files": payload_stats["deleted_files"],
             "timestamp": datetime.utcnow().isoformat(),
             "status": "success"
         }
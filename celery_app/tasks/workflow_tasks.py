@@ -0,0 +1,91 @@
+"""
+分布式工作流任务模块
+
+distributed = True 的工作流与组合任务编译为Celery canvas后，各步骤由 workflow_step_task 执行，
+最后由 workflow_finalize_task 汇总结果并写入父任务状态（见 DistributedTaskMixin）。
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from celery_app.tasks.base_task import BaseTask, merge_step_refs
+from celery_app.utils.payload_store import payload_store
+from celery_app.utils.task_utils import TaskStatus, task_state_manager
+
+
+class WorkflowStepTask(BaseTask):
+    """分布式工作流步骤任务"""
+    name = "workflow_step_task"
+    # 步骤独立重试，worker异常退出后消息重新投递
+    autoretry_for = (Exception,)
+    retry_backoff = True
+    acks_late = True
+    reject_on_worker_lost = True
+
+    async def run(
+        self,
+        refs: Any = None,
+        *,
+        workflow: str,
+        step_id: str,
+        parent_id: str,
+        step_args: Optional[List[Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        """
+        执行父任务的单个步骤
+
+        refs 为上游步骤传来的输出引用（步骤ID -> 引用），只读取当前步骤需要的输出；
+        步骤输出写入参数存储，返回加入当前步骤输出引用后的全部引用。
+        """
+        parent = self.app.tasks[workflow]
+        refs = merge_step_refs(refs)
+        args, params = await asyncio.to_thread(
+            payload_store.resolve_arguments, tuple(step_args or ()), params or {}
+        )
+        results = {
+            source: await asyncio.to_thread(payload_store.get, refs[source])
+            for source in parent.step_sources(step_id)
+        }
+        result = await parent.run_step(step_id, results, args, params)
+        ref = await asyncio.to_thread(payload_store.put, result)
+        return {**refs, step_id: ref}
+
+    def on_failure(
+        self,
+        exc: Exception,
+        task_id: str,
+        args: tuple,
+        kwargs: Dict[str, Any],
+        einfo: Any
+    ) -> None:
+        """步骤最终失败时将父任务标记为失败"""
+        super().on_failure(exc, task_id, args, kwargs, einfo)
+        task_state_manager.update_task_status(
+            task_id=kwargs["parent_id"],
+            status=TaskStatus.FAILURE,
+            error=f"Workflow step '{kwargs['step_id']}' failed: {exc}"
+        )
+
+
+class WorkflowFinalizeTask(BaseTask):
+    """分布式工作流汇总任务"""
+    name = "workflow_finalize_task"
+
+    async def run(self, refs: Any, *, workflow: str, parent_id: str, **kwargs: Any) -> Dict[str, Any]:
+        """读取各步骤输出，汇总后写入父任务结果与SUCCESS状态，并删除步骤输出"""
+        parent = self.app.tasks[workflow]
+        refs = merge_step_refs(refs)
+        results = {
+            step_id: await asyncio.to_thread(payload_store.get, ref)
+            for step_id, ref in refs.items()
+        }
+        await asyncio.to_thread(
+            task_state_manager.update_task_status,
+            task_id=parent_id,
+            status=TaskStatus.SUCCESS,
+            result=parent.collect_results(results)
+        )
+        for ref in refs.values():
+            await asyncio.to_thread(payload_store.delete, ref)
+        return {"workflow": workflow, "parent_id": parent_id, "steps": len(refs)}
@@ -0,0 +1,101 @@
+"""
+常驻事件循环运行器模块
+
+每个worker进程维护一个长期运行的事件循环（独立线程），Celery以同步方式调用任务时，
+将任务的协程提交到该循环执行，事件循环及其上的连接池、DNS缓存等在任务之间复用。
+配合threads池时，多个任务线程共享同一个事件循环，一个进程即可同时运行多个IO密集型协程。
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Optional
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from config.settings import settings
+
+
+class AsyncLoopRunner:
+    """常驻事件循环运行器"""
+    def __init__(self, concurrency: int):
+        # 事件循环中同时运行的协程上限
+        self.concurrency = concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """事件循环线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """启动事件循环线程（已在运行时不做任何操作）"""
+        with self._lock:
+            if self.running:
+                return
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=self._run_loop,
+                args=(loop,),
+                name="celery-async-loop",
+                daemon=True
+            )
+            self._loop, self._thread, self._semaphore = loop, thread, None
+            thread.start()
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """事件循环线程入口"""
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    async def _run_limited(self, coro: Awaitable[Any]) -> Any:
+        """在并发上限内执行协程"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await coro
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """在常驻事件循环中执行协程，并阻塞等待结果"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._run_limited(coro), self._loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # 超时或软时间限制等情况下取消循环中的协程
+            future.cancel()
+            raise
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止事件循环线程"""
+        with self._lock:
+            if not self.running:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._loop.close()
+            self._loop, self._thread, self._semaphore = None, None, None
+
+    def reset(self) -> None:
+        """丢弃从父进程继承的事件循环（fork后线程不会被复制）"""
+        self._loop, self._thread, self._semaphore = None, None, None
+        self._lock = threading.Lock()
+
+
+# 全局事件循环运行器实例
+async_runner = AsyncLoopRunner(settings.CELERY_ASYNC_CONCURRENCY)
+
+
+@worker_process_init.connect
+def start_async_runner(**kwargs: Any) -> None:
+    """prefork子进程初始化时启动事件循环"""
+    async_runner.reset()
+    async_runner.start()
+
+
+@worker_process_shutdown.connect
+def stop_async_runner(**kwargs: Any) -> None:
+    """worker子进程退出时停止事件循环"""
+    async_runner.stop()
@@ -0,0 +1,137 @@
+"""
+Broker队列统计模块
+
+直接读取Redis broker中的队列列表键：Redis transport按优先级将每个队列拆分为多个列表
+（优先级0位于"队列名"，优先级p位于"队列名:p"），队列长度为各列表长度之和。
+消息从列表头部写入、尾部取出，尾部即为最早的消息；发布任务时在消息头中记录发布时间
+（见task_timing.SENT_AT_HEADER），据此计算最早消息的等待时间（不含该消息头的消息等待时间未知）。
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from celery_app.utils.latency_metrics import escape_label
+from celery_app.utils.task_timing import SENT_AT_HEADER
+from config.celery import PRIORITY_SEP, PRIORITY_STEPS, get_known_queues
+from config.settings import settings
+
+
+def queue_keys(queue: str) -> List[str]:
+    """队列按优先级拆分后的全部列表键（按优先级从高到低）"""
+    return [f"{queue}{PRIORITY_SEP}{step}" if step else queue for step in PRIORITY_STEPS]
+
+
+def _published_at(message: Optional[str]) -> Optional[float]:
+    """读取broker消息的发布时间，无法解析时为None"""
+    if message is None:
+        return None
+    try:
+        value = json.loads(message).get("headers", {}).get(SENT_AT_HEADER)
+        return float(value) if value is not None else None
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class BrokerQueueCache:
+    """
+    队列统计缓存（每个进程一份）
+
+    有效期内直接返回缓存的统计，过期后通过一个管道批量读取全部已知队列，并发的调用方等待同一次刷新，
+    每个进程每个有效期内至多访问一次broker。集群模式下管道按节点分组执行。
+    """
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.QUEUE_STATS_CACHE_TTL if ttl is None else ttl
+        self._queues: Set[str] = set(get_known_queues())
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+        self._refresh: Optional[asyncio.Future] = None
+
+    async def _fetch(self, redis: Any, queues: List[str]) -> None:
+        """读取各队列各优先级列表的长度与尾部（最早）消息"""
+        pipe = redis.pipeline(transaction=False)
+        for queue in queues:
+            keys = queue_keys(queue)
+            for key in keys:
+                pipe.llen(key)
+            for key in keys:
+                pipe.lindex(key, -1)
+        replies = await pipe.execute()
+        steps = len(PRIORITY_STEPS)
+        stats: Dict[str, Dict[str, Any]] = {}
+        for index, queue in enumerate(queues):
+            offset = index * steps * 2
+            lengths = replies[offset:offset + steps]
+            published = [
+                _published_at(message)
+                for message in replies[offset + steps:offset + steps * 2]
+            ]
+            stats[queue] = {
+                "messages": sum(lengths),
+                "messages_by_priority": {
+                    str(step): length for step, length in zip(PRIORITY_STEPS, lengths) if length
+                },
+                "oldest_published_at": min(
+                    (value for value in published if value is not None), default=None
+                ),
+            }
+        self._stats = stats
+        self._fetched_at = time.monotonic()
+
+    async def get_stats(self, redis: Any, queues: Iterable[str] = ()) -> Dict[str, Dict[str, Any]]:
+        """获取全部已知队列（及指定队列）的统计：消息数、各优先级消息数与最早消息的发布时间"""
+        self._queues.update(queues)
+        if time.monotonic() - self._fetched_at >= self.ttl or not self._queues <= self._stats.keys():
+            if self._refresh is None:
+                self._refresh = asyncio.ensure_future(self._fetch(redis, sorted(self._queues)))
+                self._refresh.add_done_callback(self._clear_refresh)
+            await asyncio.shield(self._refresh)
+        return {queue: dict(stats) for queue, stats in self._stats.items()}
+
+    async def get_depths(self, redis: Any, queues: Iterable[str] = ()) -> Dict[str, int]:
+        """获取全部已知队列（及指定队列）的消息数"""
+        stats = await self.get_stats(redis, queues)
+        return {queue: queue_stats["messages"] for queue, queue_stats in stats.items()}
+
+    def _clear_refresh(self, future: asyncio.Future) -> None:
+        self._refresh = None
+
+
+def summarize(stats: Dict[str, Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """将队列统计转换为响应格式：最早消息的发布时间换算为等待时间（秒）"""
+    now = time.time() if now is None else now
+    return {
+        queue: {
+            "messages": queue_stats["messages"],
+            "messages_by_priority": queue_stats["messages_by_priority"],
+            "oldest_message_age": (
+                round(max(0.0, now - queue_stats["oldest_published_at"]), 3)
+                if queue_stats["oldest_published_at"] is not None else None
+            ),
+        }
+        for queue, queue_stats in sorted(stats.items())
+    }
+
+
+def render_prometheus(stats: Dict[str, Dict[str, Any]], now: Optional[float] = None) -> str:
+    """将队列统计渲染为Prometheus文本格式"""
+    summary = summarize(stats, now)
+    lines = [
+        "# HELP powercap_queue_messages Messages waiting in the broker queue",
+        "# TYPE powercap_queue_messages gauge",
+    ]
+    for queue, queue_stats in summary.items():
+        lines.append(f'powercap_queue_messages{{queue="{escape_label(queue)}"}} {queue_stats["messages"]}')
+    lines.append("# HELP powercap_queue_oldest_message_age_seconds Age of the oldest waiting message")
+    lines.append("# TYPE powercap_queue_oldest_message_age_seconds gauge")
+    for queue, queue_stats in summary.items():
+        age = queue_stats["oldest_message_age"]
+        lines.append(
+            f'powercap_queue_oldest_message_age_seconds{{queue="{escape_label(queue)}"}} '
+            f'{age if age is not None else 0}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+# 全局队列统计缓存实例
+broker_queue_cache = BrokerQueueCache()
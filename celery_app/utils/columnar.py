@@ -0,0 +1,243 @@
+"""
+列式记录批次模块
+
+ColumnBatch以“列名 -> 等长列”的形式保存一批记录，新增或替换列时其余列直接共享，
+转换与校验按列整体计算，避免逐行复制字典。缺失字段与None统一视为空值（与Arrow的null相同），
+由记录列表转换时缺失字段补为None。
+
+任务之间传递时使用可序列化的字典形式 {"columns": {...}, "num_rows": n}，记录列表作为兼容格式；
+组合任务与工作流在入口处将两者转换为ColumnBatch，步骤之间直接传递ColumnBatch（见BatchScope）；
+安装pyarrow时可与Arrow RecordBatch互相转换，列为Arrow数组时使用pyarrow.compute计算。
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.compute as pyarrow_compute
+except ImportError:  # pragma: no cover - 可选依赖
+    pyarrow = None
+    pyarrow_compute = None
+
+# 任务数据格式
+FORMAT_RECORDS = "records"
+FORMAT_COLUMNS = "columns"
+FORMAT_BATCH = "batch"
+
+
+def _is_arrow(column: Any) -> bool:
+    return pyarrow is not None and isinstance(column, (pyarrow.Array, pyarrow.ChunkedArray))
+
+
+def _to_list(column: Any) -> List[Any]:
+    return column.to_pylist() if _is_arrow(column) else list(column)
+
+
+def _to_py(value: Any) -> Any:
+    return value.as_py() if pyarrow is not None and isinstance(value, pyarrow.Scalar) else value
+
+
+class ColumnBatch:
+    """列式记录批次"""
+    def __init__(self, columns: Dict[str, Sequence[Any]], num_rows: Optional[int] = None):
+        if num_rows is None:
+            num_rows = len(next(iter(columns.values()))) if columns else 0
+        for name, column in columns.items():
+            if len(column) != num_rows:
+                raise ValueError(f"Column '{name}' has {len(column)} rows, expected {num_rows}")
+        self.columns = columns
+        self.num_rows = num_rows
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.columns)
+
+    def column(self, name: str) -> Sequence[Any]:
+        """获取列，不存在时返回全空列"""
+        column = self.columns.get(name)
+        return column if column is not None else [None] * self.num_rows
+
+    def with_column(self, name: str, values: Sequence[Any]) -> "ColumnBatch":
+        """返回新增（或替换）一列后的批次，其余列不复制"""
+        return ColumnBatch({**self.columns, name: values}, self.num_rows)
+
+    def with_constant(self, name: str, value: Any) -> "ColumnBatch":
+        """返回新增常量列后的批次"""
+        return self.with_column(name, [value] * self.num_rows)
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """获取单行记录（省略空值字段）"""
+        row = {name: _to_py(column[index]) for name, column in self.columns.items()}
+        return {name: value for name, value in row.items() if value is not None}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ColumnBatch":
+        """由记录列表构造（列为各记录字段的并集，缺失字段为None）"""
+        records = records if isinstance(records, list) else list(records)
+        names: Dict[str, None] = {}
+        for record in records:
+            names.update(dict.fromkeys(record))
+        return cls({name: [record.get(name) for record in records] for name in names}, len(records))
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """转换为记录列表"""
+        names = list(self.columns)
+        if not names:
+            return [{} for _ in range(self.num_rows)]
+        columns = [_to_list(self.columns[name]) for name in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "ColumnBatch":
+        """由可序列化的字典形式构造"""
+        return cls(payload["columns"], payload.get("num_rows"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典形式"""
+        return {
+            "columns": {name: _to_list(column) for name, column in self.columns.items()},
+            "num_rows": self.num_rows,
+        }
+
+    @classmethod
+    def concat(cls, batches: Iterable["ColumnBatch"]) -> "ColumnBatch":
+        """按行拼接多个批次（列为各批次列的并集，缺失列填充None）"""
+        columns: Dict[str, List[Any]] = {}
+        total = 0
+        for batch in batches:
+            for name in batch.columns:
+                if name not in columns:
+                    columns[name] = [None] * total
+            for name, column in columns.items():
+                column.extend(_to_list(batch.column(name)))
+            total += batch.num_rows
+        return cls(columns, total)
+
+    @classmethod
+    def from_arrow(cls, batch: Any) -> "ColumnBatch":
+        """由Arrow RecordBatch/Table构造（列保持为Arrow数组）"""
+        return cls(dict(zip(batch.schema.names, batch.columns)), batch.num_rows)
+
+    def to_arrow(self) -> Any:
+        """转换为Arrow RecordBatch（需安装pyarrow）"""
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is required to convert a ColumnBatch to Arrow")
+        return pyarrow.RecordBatch.from_pydict(
+            {name: column if _is_arrow(column) else pyarrow.array(column) for name, column in self.columns.items()}
+        )
+
+
+def is_column_payload(data: Any) -> bool:
+    """是否为列式批次的字典形式"""
+    return isinstance(data, dict) and isinstance(data.get("columns"), dict)
+
+
+def format_of(data: Any) -> str:
+    """任务数据的格式"""
+    if isinstance(data, ColumnBatch):
+        return FORMAT_BATCH
+    if is_column_payload(data):
+        return FORMAT_COLUMNS
+    return FORMAT_RECORDS
+
+
+def as_batch(data: Any) -> Tuple[ColumnBatch, str]:
+    """
+    将任务输入转换为列式批次，同时返回输入格式
+
+    支持ColumnBatch、列式字典与记录列表（兼容适配）。
+    """
+    if isinstance(data, ColumnBatch):
+        return data, FORMAT_BATCH
+    if is_column_payload(data):
+        return ColumnBatch.from_dict(data), FORMAT_COLUMNS
+    return ColumnBatch.from_records(data), FORMAT_RECORDS
+
+
+def num_rows(data: Any) -> int:
+    """任务输入的记录数（无需转换格式）"""
+    if isinstance(data, ColumnBatch):
+        return data.num_rows
+    if is_column_payload(data):
+        return ColumnBatch.from_dict(data).num_rows
+    return len(data)
+
+
+def from_batch(batch: ColumnBatch, data_format: str) -> Any:
+    """将列式批次转换回输入时的格式"""
+    if data_format == FORMAT_BATCH:
+        return batch
+    if data_format == FORMAT_COLUMNS:
+        return batch.to_dict()
+    return batch.to_records()
+
+
+class BatchScope:
+    """
+    组合任务/工作流一次执行内的列式数据转换
+
+    列式字典与记录列表在首次传给步骤时转换为ColumnBatch（同一对象只转换一次，例如提取步骤输出的
+    记录列表被多个下游步骤共用时），步骤之间直接传递ColumnBatch；执行结束时再将ColumnBatch结果
+    转换回首个转换输入的格式，而不是每个步骤各转换一次。
+    """
+    def __init__(self):
+        self._batches: Dict[int, Tuple[Any, ColumnBatch]] = {}
+        self._format: Optional[str] = None
+
+    @staticmethod
+    def _convertible(data: Any) -> bool:
+        return isinstance(data, list) or is_column_payload(data)
+
+    def to_batch(self, data: Any) -> Any:
+        """列式字典与记录列表转换为ColumnBatch，其余数据原样返回"""
+        if not self._convertible(data):
+            return data
+        # 同时保存原对象，避免对象释放后id被复用
+        entry = self._batches.get(id(data))
+        if entry is None:
+            batch, data_format = as_batch(data)
+            entry = self._batches[id(data)] = (data, batch)
+            if self._format is None:
+                self._format = data_format
+        return entry[1]
+
+    def convert_arguments(self, names: Sequence[str], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """将步骤的列式参数转换为ColumnBatch"""
+        converted = {name: self.to_batch(kwargs[name]) for name in names if self._convertible(kwargs.get(name))}
+        return {**kwargs, **converted} if converted else kwargs
+
+    def restore(self, result: Any) -> Any:
+        """
+        有输入经过转换时，将ColumnBatch结果转换回首个转换输入的格式（列式字典或记录列表）
+
+        来自步骤缓存或检查点的结果已编码为列式字典，输入为记录列表时同样转换回记录列表。
+        """
+        if self._format is None:
+            return result
+        if isinstance(result, ColumnBatch):
+            return from_batch(result, self._format)
+        if self._format == FORMAT_RECORDS and is_column_payload(result):
+            return ColumnBatch.from_dict(result).to_records()
+        return result
+
+
+def upper(column: Sequence[Any]) -> Sequence[Any]:
+    """字符串列转大写（空值保持为空）"""
+    if _is_arrow(column):
+        return pyarrow_compute.utf8_upper(column)
+    return [value.upper() if value is not None else None for value in column]
+
+
+def valid_mask(batch: ColumnBatch, required: Sequence[str]) -> List[bool]:
+    """各行必填列是否均非空（缺失字段与None均视为空值）"""
+    columns = [batch.column(name) for name in required]
+    if columns and all(_is_arrow(column) for column in columns):
+        mask = pyarrow_compute.is_valid(columns[0])
+        for column in columns[1:]:
+            mask = pyarrow_compute.and_(mask, pyarrow_compute.is_valid(column))
+        return mask.to_pylist()
+    if not columns:
+        return [True] * batch.num_rows
+    return [None not in values for values in zip(*map(_to_list, columns))]
@@ -0,0 +1,266 @@
+"""
+任务延迟统计模块
+
+按任务名与队列统计排队等待、运行、端到端三类延迟。延迟以对数分桶直方图（DDSketch方式）记录：
+每个桶覆盖 (gamma^(i-1), gamma^i] 区间，分位数相对误差不超过 relative_accuracy；
+桶计数可直接相加，因此多个窗口、多个消费者的数据可以无损合并。
+
+Redis存储：
+- latency:{指标}:{任务}:{队列}           累计直方图（供Prometheus导出）
+- latency:{指标}:{任务}:{队列}:{分钟}    按分钟的直方图（带过期时间，合并后得到滑动窗口分位数）
+- latency:series                         已记录的序列索引
+"""
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from redis.asyncio import Redis as AsyncRedis
+
+from celery_app.utils.redis_conn import RedisClient
+from config.settings import settings
+
+# 延迟指标
+QUEUE_WAIT = "queue_wait"
+RUN_TIME = "run_time"
+END_TO_END = "end_to_end"
+LATENCY_METRICS = (QUEUE_WAIT, RUN_TIME, END_TO_END)
+# 任务阶段耗时序列的指标名前缀（见task_timing模块）
+PHASE_METRIC_PREFIX = "phase:"
+
+# 序列标识：(指标, 任务名, 队列)
+SeriesKey = Tuple[str, str, str]
+
+
+class LatencySketch:
+    """可合并的对数分桶延迟直方图（单位：秒）"""
+    relative_accuracy = 0.02
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    # 小于该值的延迟计入零桶
+    min_value = 1e-6
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    @classmethod
+    def bucket_index(cls, value: float) -> Optional[int]:
+        """计算延迟所属的桶，零桶返回None"""
+        if value < cls.min_value:
+            return None
+        return math.ceil(math.log(value) / math.log(cls.gamma))
+
+    @classmethod
+    def bucket_upper_bound(cls, index: int) -> float:
+        """桶的上界"""
+        return cls.gamma ** index
+
+    @classmethod
+    def bucket_value(cls, index: int) -> float:
+        """桶的代表值（使相对误差最小）"""
+        return 2 * cls.gamma ** index / (cls.gamma + 1)
+
+    @classmethod
+    def from_redis_hash(cls, data: Dict[str, str]) -> "LatencySketch":
+        """从Redis哈希构造直方图"""
+        sketch = cls()
+        for field, value in data.items():
+            if field.startswith("b:"):
+                sketch.buckets[int(field[2:])] = int(value)
+        sketch.zero_count = int(data.get("zero", 0))
+        sketch.count = int(data.get("count", 0))
+        sketch.sum = float(data.get("sum", 0.0))
+        return sketch
+
+    def merge(self, other: "LatencySketch") -> None:
+        """合并另一个直方图"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估算分位数"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.buckets))
+
+    def cumulative_count(self, upper_bound: float) -> int:
+        """上界不超过upper_bound的观测数（用于Prometheus累计桶）"""
+        return self.zero_count + sum(
+            count for index, count in self.buckets.items()
+            if self.bucket_upper_bound(index) <= upper_bound * (1 + 1e-9)
+        )
+
+
+class BaseLatencyStore:
+    """延迟存储基类（键命名与解析，供同步/异步实现共用）"""
+    key_prefix = "latency:"
+    series_key = "latency:series"
+
+    def _get_series_key(self, series: SeriesKey) -> str:
+        """获取累计直方图Redis键"""
+        return f"{self.key_prefix}{':'.join(series)}"
+
+    def _get_window_key(self, series: SeriesKey, minute: int) -> str:
+        """获取分钟直方图Redis键"""
+        return f"{self._get_series_key(series)}:{minute}"
+
+    @staticmethod
+    def _encode_series(series: SeriesKey) -> str:
+        return "|".join(series)
+
+    @staticmethod
+    def _decode_series(member: str) -> SeriesKey:
+        metric, task_name, queue = member.split("|", 2)
+        return metric, task_name, queue
+
+
+class LatencyStore(BaseLatencyStore):
+    """延迟存储（事件消费者、任务阶段耗时输出端写入）"""
+    def __init__(self):
+        self.redis = RedisClient.get_instance()
+        self.window_ttl = settings.LATENCY_WINDOW_RETENTION_MINUTES * 60
+
+    def record(self, observations: Iterable[Tuple[SeriesKey, float]], timestamp: float) -> None:
+        """记录一组延迟观测（单次管道往返）"""
+        minute = int(timestamp // 60)
+        pipe = self.redis.pipeline(transaction=False)
+        for series, value in observations:
+            value = max(value, 0.0)
+            index = LatencySketch.bucket_index(value)
+            field = "zero" if index is None else f"b:{index}"
+            for key in (self._get_series_key(series), self._get_window_key(series, minute)):
+                pipe.hincrby(key, field, 1)
+                pipe.hincrby(key, "count", 1)
+                pipe.hincrbyfloat(key, "sum", value)
+            pipe.expire(self._get_window_key(series, minute), self.window_ttl)
+            pipe.sadd(self.series_key, self._encode_series(series))
+        pipe.execute()
+
+
+class AsyncLatencyStore(BaseLatencyStore):
+    """异步延迟存储（供API读取）"""
+    def __init__(self, redis: AsyncRedis):
+        self.redis = redis
+
+    async def load(self, window_minutes: Optional[int] = None) -> Dict[SeriesKey, LatencySketch]:
+        """
+        读取全部序列的直方图
+
+        window_minutes为None时返回累计直方图，否则合并最近window_minutes分钟的直方图。
+        """
+        members = sorted(await self.redis.smembers(self.series_key))
+        if not members:
+            return {}
+        series_list = [self._decode_series(member) for member in members]
+
+        if window_minutes is None:
+            keys_per_series = [[self._get_series_key(series)] for series in series_list]
+        else:
+            current = int(time.time() // 60)
+            minutes = range(current - window_minutes + 1, current + 1)
+            keys_per_series = [
+                [self._get_window_key(series, minute) for minute in minutes]
+                for series in series_list
+            ]
+
+        pipe = self.redis.pipeline(transaction=False)
+        for keys in keys_per_series:
+            for key in keys:
+                pipe.hgetall(key)
+        replies = iter(await pipe.execute())
+
+        sketches: Dict[SeriesKey, LatencySketch] = {}
+        for series, keys in zip(series_list, keys_per_series):
+            sketch = LatencySketch()
+            for _ in keys:
+                sketch.merge(LatencySketch.from_redis_hash(next(replies)))
+            if sketch.count:
+                sketches[series] = sketch
+        return sketches
+
+
+# Prometheus直方图导出的桶上界（秒）
+PROMETHEUS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0
+)
+
+PROMETHEUS_METRIC_NAMES = {
+    QUEUE_WAIT: ("powercap_task_queue_wait_seconds", "Time between task publish and task start"),
+    RUN_TIME: ("powercap_task_run_seconds", "Task run time"),
+    END_TO_END: ("powercap_task_end_to_end_seconds", "Time between task publish and task completion"),
+}
+PROMETHEUS_PHASE_METRIC = ("powercap_task_phase_seconds", "Sampled per-task phase timings")
+
+
+def escape_label(value: str) -> str:
+    """转义Prometheus标签值"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _render_histogram(lines: List[str], name: str, labels: str, sketch: LatencySketch) -> None:
+    """渲染单个序列的Prometheus直方图样本"""
+    for upper_bound in PROMETHEUS_BUCKETS:
+        lines.append(f'{name}_bucket{{{labels},le="{upper_bound}"}} {sketch.cumulative_count(upper_bound)}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {sketch.count}')
+    lines.append(f"{name}_sum{{{labels}}} {sketch.sum}")
+    lines.append(f"{name}_count{{{labels}}} {sketch.count}")
+
+
+def render_prometheus(sketches: Dict[SeriesKey, LatencySketch]) -> str:
+    """
+    将累计直方图渲染为Prometheus文本格式
+
+    任务阶段耗时序列（指标名以phase:开头）统一导出为powercap_task_phase_seconds，以phase标签区分。
+    """
+    lines: List[str] = []
+    for metric in LATENCY_METRICS:
+        name, help_text = PROMETHEUS_METRIC_NAMES[metric]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (series_metric, task_name, queue), sketch in sorted(sketches.items()):
+            if series_metric == metric:
+                labels = f'task="{escape_label(task_name)}",queue="{escape_label(queue)}"'
+                _render_histogram(lines, name, labels, sketch)
+
+    name, help_text = PROMETHEUS_PHASE_METRIC
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (series_metric, task_name, queue), sketch in sorted(sketches.items()):
+        if series_metric.startswith(PHASE_METRIC_PREFIX):
+            phase = series_metric[len(PHASE_METRIC_PREFIX):]
+            labels = (
+                f'task="{escape_label(task_name)}",queue="{escape_label(queue)}",'
+                f'phase="{escape_label(phase)}"'
+            )
+            _render_histogram(lines, name, labels, sketch)
+    return "\n".join(lines) + "\n"
+
+
+def summarize(sketches: Dict[SeriesKey, LatencySketch]) -> List[Dict[str, Any]]:
+    """汇总各序列的分位数"""
+    return [
+        {
+            "metric": metric,
+            "task": task_name,
+            "queue": queue,
+            "count": sketch.count,
+            "mean": sketch.sum / sketch.count,
+            "p50": sketch.quantile(0.5),
+            "p95": sketch.quantile(0.95),
+            "p99": sketch.quantile(0.99),
+        }
+        for (metric, task_name, queue), sketch in sorted(sketches.items())
+    ]
@@ -0,0 +1,419 @@
+"""
+任务参数外置存储模块（claim-check）
+
+编码后超过阈值的任务参数与步骤输出只写入一次参数存储，broker消息中只传递引用
+{"__payload__": {...}}，任务在worker中实际执行时才按引用读取，大数据不进入broker队列，
+也不在API与worker两端重复做JSON序列化。
+
+存储位置：
+- Redis二进制列表 payload:{id}，按PAYLOAD_TTL过期，任意主机上的worker均可读取
+- Redis键 payload_ref:{id} 保存写入时生成的引用信息，API收到客户端提交的引用时以此为准，
+  只接受本部署写入且未过期的参数，不信任客户端提供的编码、分块数等字段
+- 配置PAYLOAD_FILE_STORE_DIR时同时写入本机文件（建议位于/dev/shm），同一主机上的worker
+  以内存映射方式读取，直接在映射的页面上解码，不经过Redis也不复制原始字节；文件路径只由参数ID
+  （uuid4十六进制串）在该目录下生成，引用中不包含路径与主机名
+
+编码：
+- msgpack / msgpack+zstd: 单个对象，与任务结果的编码相同，Redis中按RESULT_CHUNK_SIZE分块
+- msgpack-chunks / msgpack+zstd-chunks: 列式数据块序列（NDJSON上传），Redis中每个元素为一个独立编码的
+  数据块，文件中每个数据块前有4字节长度前缀；读取时逐块解码，可按数据流逐块消费
+"""
+import asyncio
+import mmap
+import os
+import struct
+import time
+import uuid
+from typing import (Any, AsyncIterator, Dict, Iterable, Iterator, List,
+                    Optional, Tuple)
+
+import msgpack
+from redis.asyncio import Redis as AsyncRedis
+
+from celery_app.utils.columnar import ColumnBatch
+from celery_app.utils.redis_conn import RedisClient
+from celery_app.utils.result_codec import (ENCODING_MSGPACK_ZSTD,
+                                          compress_result, pack_result,
+                                          split_chunks)
+from config.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+# 引用字典的键
+PAYLOAD_REF_KEY = "__payload__"
+
+# 数据块序列编码标识
+ENCODING_CHUNKS = "msgpack-chunks"
+ENCODING_CHUNKS_ZSTD = "msgpack+zstd-chunks"
+
+# 文件中数据块的长度前缀
+_FRAME_HEADER = struct.Struct(">I")
+
+
+class InvalidPayloadRef(ValueError):
+    """参数引用无效（ID格式错误或不是本部署写入的参数）"""
+
+
+def is_payload_ref(value: Any) -> bool:
+    """是否为参数存储引用"""
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(PAYLOAD_REF_KEY), dict)
+
+
+def _is_payload_id(payload_id: Any) -> bool:
+    """是否为合法的参数ID（uuid4().hex）"""
+    try:
+        parsed = uuid.UUID(hex=payload_id)
+    except (AttributeError, TypeError, ValueError):
+        return False
+    return parsed.version == 4 and parsed.hex == payload_id
+
+
+def _is_compressed(encoding: str) -> bool:
+    return encoding in (ENCODING_MSGPACK_ZSTD, ENCODING_CHUNKS_ZSTD)
+
+
+def _decompressor() -> Any:
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to decode compressed payloads")
+    return zstandard.ZstdDecompressor()
+
+
+def _decode_buffer(buffer: Any, encoding: str) -> Any:
+    """解码单个连续缓冲区（bytes或内存映射的memoryview，不复制原始字节）"""
+    if _is_compressed(encoding):
+        buffer = _decompressor().decompress(buffer)
+    return msgpack.unpackb(buffer, raw=False)
+
+
+def _decode_object(chunks: List[bytes], encoding: str) -> Any:
+    """解码分块存储的单个对象，分块依次送入解码器，不拼接为完整字节串"""
+    if len(chunks) == 1:
+        return _decode_buffer(chunks[0], encoding)
+    decompressor = _decompressor().decompressobj() if _is_compressed(encoding) else None
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=0)
+    for chunk in chunks:
+        unpacker.feed(decompressor.decompress(chunk) if decompressor is not None else chunk)
+    return unpacker.unpack()
+
+
+def _decode_batch(buffer: Any, encoding: str) -> ColumnBatch:
+    return ColumnBatch.from_dict(_decode_buffer(buffer, encoding))
+
+
+def _iter_file_batches(path: str, encoding: str) -> Iterator[ColumnBatch]:
+    """以内存映射方式逐块解码数据块序列文件"""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        offset = 0
+        while offset < len(buffer):
+            (length,) = _FRAME_HEADER.unpack_from(buffer, offset)
+            offset += _FRAME_HEADER.size
+            with memoryview(buffer)[offset:offset + length] as frame:
+                batch = _decode_batch(frame, encoding)
+            offset += length
+            yield batch
+
+
+def _read_file_object(path: str, encoding: str) -> Any:
+    """以内存映射方式解码单个对象文件"""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        with memoryview(buffer) as view:
+            return _decode_buffer(view, encoding)
+
+
+def _write_file(path: str, data: Iterable[bytes]) -> None:
+    """写入临时文件后原子替换，读取方不会看到写了一半的文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        for part in data:
+            file.write(part)
+    os.replace(tmp_path, path)
+
+
+class BasePayloadStore:
+    """参数存储基类（键命名、引用构造与编码，供同步/异步实现共用）"""
+    payload_key_prefix = "payload:"
+    ref_key_prefix = "payload_ref:"
+    # 从Redis逐块读取数据块序列时每次往返读取的数据块数
+    read_window_chunks = 8
+
+    def __init__(self, file_dir: Optional[str] = None):
+        self.file_dir = file_dir if file_dir is not None else settings.PAYLOAD_FILE_STORE_DIR
+        self.ttl = settings.PAYLOAD_TTL
+        self.offload_min_bytes = settings.PAYLOAD_OFFLOAD_MIN_BYTES
+        self.upload_chunk_rows = settings.PAYLOAD_UPLOAD_CHUNK_ROWS
+        self.upload_max_line_bytes = settings.PAYLOAD_UPLOAD_MAX_LINE_BYTES
+        self.chunk_encoding = ENCODING_CHUNKS_ZSTD if zstandard is not None else ENCODING_CHUNKS
+        if self.file_dir:
+            os.makedirs(self.file_dir, exist_ok=True)
+
+    def _get_payload_key(self, payload_id: str) -> str:
+        """获取参数Redis键（二进制分块列表）"""
+        return f"{self.payload_key_prefix}{payload_id}"
+
+    def _get_ref_key(self, payload_id: str) -> str:
+        """获取引用信息Redis键（写入时生成的引用）"""
+        return f"{self.ref_key_prefix}{payload_id}"
+
+    def _payload_id(self, info: Dict[str, Any]) -> str:
+        """返回经过校验的参数ID，格式不合法时抛出InvalidPayloadRef"""
+        payload_id = info.get("id")
+        if not _is_payload_id(payload_id):
+            raise InvalidPayloadRef(f"Invalid payload id: {payload_id!r}")
+        return payload_id
+
+    def _get_file_path(self, payload_id: str) -> Optional[str]:
+        """获取本机参数文件路径，未启用文件存储时返回None"""
+        return os.path.join(self.file_dir, f"{payload_id}.bin") if self.file_dir else None
+
+    def _build_ref(
+        self,
+        payload_id: str,
+        encoding: str,
+        size: int,
+        chunks: int,
+        rows: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """构造参数引用"""
+        info: Dict[str, Any] = {
+            "id": payload_id,
+            "encoding": encoding,
+            "size": size,
+            "chunks": chunks
+        }
+        if rows is not None:
+            info["rows"] = rows
+        return {PAYLOAD_REF_KEY: info}
+
+    def _local_path(self, info: Dict[str, Any]) -> Optional[str]:
+        """本机参数文件存在时返回文件路径（路径由校验后的参数ID生成，忽略引用中的其他字段）"""
+        path = self._get_file_path(self._payload_id(info))
+        if path and os.path.exists(path):
+            return path
+        return None
+
+    def _encode_batch(self, batch: ColumnBatch) -> bytes:
+        """编码单个数据块"""
+        data = pack_result(batch.to_dict())
+        if self.chunk_encoding == ENCODING_CHUNKS_ZSTD:
+            data = zstandard.ZstdCompressor(level=settings.RESULT_COMPRESSION_LEVEL).compress(data)
+        return data
+
+    def _prepare(self, value: Any) -> Tuple[str, bytes, str, List[bytes]]:
+        """编码单个对象，返回参数ID、编码后的字节、编码标识与Redis分块"""
+        data, encoding = compress_result(pack_result(value))
+        return uuid.uuid4().hex, data, encoding, split_chunks(data, settings.RESULT_CHUNK_SIZE)
+
+    def _check_chunks(self, info: Dict[str, Any], chunks: List[bytes]) -> None:
+        if len(chunks) != info["chunks"]:
+            raise LookupError(f"Payload '{info['id']}' has expired or is incomplete")
+
+
+class PayloadStore(BasePayloadStore):
+    """参数存储（worker侧：解析引用、写入步骤输出、清理本机文件）"""
+    def __init__(self, file_dir: Optional[str] = None):
+        super().__init__(file_dir)
+        self.redis = RedisClient.get_binary_instance()
+
+    def put(self, value: Any) -> Dict[str, Any]:
+        """写入单个对象并返回引用"""
+        payload_id, data, encoding, chunks = self._prepare(value)
+        ref = self._build_ref(payload_id, encoding, len(data), len(chunks))
+        key = self._get_payload_key(payload_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(key, *chunks)
+        pipe.expire(key, self.ttl)
+        pipe.set(self._get_ref_key(payload_id), pack_result(ref[PAYLOAD_REF_KEY]), ex=self.ttl)
+        pipe.execute()
+        path = self._get_file_path(payload_id)
+        if path:
+            _write_file(path, [data])
+        return ref
+
+    def get(self, ref: Dict[str, Any]) -> Any:
+        """
+        按引用读取参数
+
+        数据块序列拼接为一个ColumnBatch返回；只需逐块处理时使用iter_batches。
+        """
+        info = ref[PAYLOAD_REF_KEY]
+        if info["encoding"] in (ENCODING_CHUNKS, ENCODING_CHUNKS_ZSTD):
+            return ColumnBatch.concat(self.iter_batches(ref))
+        path = self._local_path(info)
+        if path:
+            return _read_file_object(path, info["encoding"])
+        chunks = self.redis.lrange(self._get_payload_key(self._payload_id(info)), 0, -1)
+        self._check_chunks(info, chunks)
+        return _decode_object(chunks, info["encoding"])
+
+    def iter_batches(self, ref: Dict[str, Any]) -> Iterator[ColumnBatch]:
+        """逐块读取数据块序列（从Redis读取时每次往返按LRANGE窗口读取read_window_chunks个数据块）"""
+        info = ref[PAYLOAD_REF_KEY]
+        path = self._local_path(info)
+        if path:
+            yield from _iter_file_batches(path, info["encoding"])
+            return
+        key = self._get_payload_key(self._payload_id(info))
+        for start in range(0, info["chunks"], self.read_window_chunks):
+            stop = min(start + self.read_window_chunks, info["chunks"])
+            window = self.redis.lrange(key, start, stop - 1)
+            if len(window) != stop - start:
+                raise LookupError(f"Payload '{info['id']}' has expired or is incomplete")
+            for chunk in window:
+                yield _decode_batch(chunk, info["encoding"])
+
+    def resolve(self, value: Any) -> Any:
+        """值为引用时读取参数，否则原样返回"""
+        return self.get(value) if is_payload_ref(value) else value
+
+    def resolve_arguments(self, args: tuple, kwargs: Dict[str, Any]) -> Tuple[tuple, Dict[str, Any]]:
+        """解析任务位置参数与关键字参数中的顶层引用（无引用时不复制参数）"""
+        if any(map(is_payload_ref, args)):
+            args = tuple(map(self.resolve, args))
+        if any(map(is_payload_ref, kwargs.values())):
+            kwargs = {name: self.resolve(value) for name, value in kwargs.items()}
+        return args, kwargs
+
+    def delete(self, ref: Dict[str, Any]) -> None:
+        """删除参数（Redis分块与本机文件）"""
+        info = ref[PAYLOAD_REF_KEY]
+        payload_id = self._payload_id(info)
+        self.redis.delete(self._get_payload_key(payload_id), self._get_ref_key(payload_id))
+        path = self._local_path(info)
+        if path:
+            os.remove(path)
+
+    def purge_files(self, max_age: Optional[int] = None) -> Dict[str, int]:
+        """删除本机超过保留时间的参数文件（Redis中的分块由过期时间自动回收）"""
+        stats = {"scanned_files": 0, "deleted_files": 0, "reclaimed_bytes": 0}
+        if not self.file_dir or not os.path.isdir(self.file_dir):
+            return stats
+        deadline = time.time() - (self.ttl if max_age is None else max_age)
+        with os.scandir(self.file_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stats["scanned_files"] += 1
+                try:
+                    stat = entry.stat()
+                    if stat.st_mtime < deadline:
+                        os.remove(entry.path)
+                        stats["deleted_files"] += 1
+                        stats["reclaimed_bytes"] += stat.st_size
+                except FileNotFoundError:
+                    continue
+        return stats
+
+
+class AsyncPayloadStore(BasePayloadStore):
+    """异步参数存储（供FastAPI使用：卸载大参数、接收NDJSON上传）"""
+    def __init__(self, redis: AsyncRedis, file_dir: Optional[str] = None):
+        super().__init__(file_dir)
+        self.redis = redis
+
+    async def put(self, value: Any) -> Dict[str, Any]:
+        """写入单个对象并返回引用"""
+        payload_id, data, encoding, chunks = self._prepare(value)
+        return await self._store(payload_id, data, encoding, chunks)
+
+    async def _store(self, payload_id: str, data: bytes, encoding: str, chunks: List[bytes]) -> Dict[str, Any]:
+        ref = self._build_ref(payload_id, encoding, len(data), len(chunks))
+        key = self._get_payload_key(payload_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(key, *chunks)
+        pipe.expire(key, self.ttl)
+        pipe.set(self._get_ref_key(payload_id), pack_result(ref[PAYLOAD_REF_KEY]), ex=self.ttl)
+        await pipe.execute()
+        path = self._get_file_path(payload_id)
+        if path:
+            await asyncio.to_thread(_write_file, path, [data])
+        return ref
+
+    async def verify_ref(self, ref: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        校验客户端提交的引用，返回写入时生成的引用
+
+        ID不是uuid4十六进制串、参数不是本部署写入或已过期时抛出InvalidPayloadRef。
+        """
+        payload_id = self._payload_id(ref[PAYLOAD_REF_KEY])
+        data = await self.redis.get(self._get_ref_key(payload_id))
+        if data is None:
+            raise InvalidPayloadRef(f"Payload '{payload_id}' not found or expired")
+        return {PAYLOAD_REF_KEY: msgpack.unpackb(data, raw=False)}
+
+    async def offload_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将编码后不小于PAYLOAD_OFFLOAD_MIN_BYTES的顶层参数写入参数存储并替换为引用
+
+        客户端提交的引用替换为写入时生成的引用（见verify_ref），无效时抛出InvalidPayloadRef；
+        无需卸载且不含引用时返回原参数字典。
+        """
+        offloaded: Optional[Dict[str, Any]] = None
+        for name, value in params.items():
+            if value is None or isinstance(value, (bool, int, float)):
+                continue
+            if is_payload_ref(value):
+                if offloaded is None:
+                    offloaded = dict(params)
+                offloaded[name] = await self.verify_ref(value)
+                continue
+            packed = pack_result(value)
+            if len(packed) < self.offload_min_bytes:
+                continue
+            data, encoding = compress_result(packed)
+            payload_id = uuid.uuid4().hex
+            if offloaded is None:
+                offloaded = dict(params)
+            offloaded[name] = await self._store(
+                payload_id, data, encoding, split_chunks(data, settings.RESULT_CHUNK_SIZE)
+            )
+        return params if offloaded is None else offloaded
+
+    async def put_batches(self, batches: AsyncIterator[ColumnBatch]) -> Dict[str, Any]:
+        """
+        逐块写入数据块序列并返回引用
+
+        每个数据块写入后即释放，内存占用与数据总量无关；写入失败（包括数据块迭代器抛出异常）时
+        删除已写入的部分并重新抛出异常。
+        """
+        payload_id = uuid.uuid4().hex
+        key = self._get_payload_key(payload_id)
+        path = self._get_file_path(payload_id)
+        file = await asyncio.to_thread(open, f"{path}.tmp", "wb") if path else None
+        size = chunks = rows = 0
+        try:
+            async for batch in batches:
+                if not batch.num_rows:
+                    continue
+                data = self._encode_batch(batch)
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.rpush(key, data)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+                if file is not None:
+                    await asyncio.to_thread(file.writelines, [_FRAME_HEADER.pack(len(data)), data])
+                size += len(data)
+                chunks += 1
+                rows += batch.num_rows
+            if file is not None:
+                await asyncio.to_thread(file.close)
+                if chunks:
+                    os.replace(f"{path}.tmp", path)
+                else:
+                    # 空文件无法内存映射，没有数据块时不保留文件
+                    os.remove(f"{path}.tmp")
+        except BaseException:
+            await self.redis.delete(key)
+            if file is not None:
+                file.close()
+                os.remove(f"{path}.tmp")
+            raise
+        ref = self._build_ref(payload_id, self.chunk_encoding, size, chunks, rows=rows)
+        await self.redis.set(self._get_ref_key(payload_id), pack_result(ref[PAYLOAD_REF_KEY]), ex=self.ttl)
+        return ref
+
+
+# 全局参数存储实例
+payload_store = PayloadStore()
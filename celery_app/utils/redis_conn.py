@@ -1,11 +1,16 @@
 """
 Redis连接工具模块
 """
-from typing import Optional
+from typing import Any, Optional
+from urllib.parse import urlparse
 
 import redis
+import redis.asyncio
 from pydantic import Field
 from pydantic_settings import BaseSettings
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+
+from config.celery import get_broker_url
 
 
 class RedisSettings(BaseSettings):
@@ -14,6 +19,7 @@ class RedisSettings(BaseSettings):
     port: int = Field(default=6379, env="REDIS_PORT")
     db: int = Field(default=0, env="REDIS_DB")
     password: Optional[str] = Field(default=None, env="REDIS_PASSWORD")
+    max_connections: int = Field(default=100, env="REDIS_MAX_CONNECTIONS")
 
     class Config:
         env_file = ".env"
@@ -22,6 +28,7 @@ class RedisSettings(BaseSettings):
 class RedisClient:
     """Redis客户端单例类"""
     _instance: Optional[redis.Redis] = None
+    _binary_instance: Optional[redis.Redis] = None
     _settings: RedisSettings = RedisSettings()
 
     @classmethod
@@ -37,9 +44,98 @@ class RedisClient:
             )
         return cls._instance
 
+    @classmethod
+    def get_binary_instance(cls) -> redis.Redis:
+        """获取不解码响应的Redis客户端实例（用于读写二进制数据）"""
+        if cls._binary_instance is None:
+            cls._binary_instance = redis.Redis(
+                host=cls._settings.host,
+                port=cls._settings.port,
+                db=cls._settings.db,
+                password=cls._settings.password,
+                decode_responses=False
+            )
+        return cls._binary_instance
+
     @classmethod
     def close(cls) -> None:
         """关闭Redis连接"""
         if cls._instance is not None:
             cls._instance.close()
-            cls._instance = None 
\ No newline at end of file
+            cls._instance = None
+        if cls._binary_instance is not None:
+            cls._binary_instance.close()
+            cls._binary_instance = None
+
+
+class AsyncRedisClient:
+    """异步Redis客户端单例类（供FastAPI等asyncio环境使用，共享连接池）"""
+    _instance: Optional[redis.asyncio.Redis] = None
+    _binary_instance: Optional[redis.asyncio.Redis] = None
+    _broker_instance: Optional[Any] = None
+    _settings: RedisSettings = RedisSettings()
+
+    @classmethod
+    def _create(cls, decode_responses: bool) -> redis.asyncio.Redis:
+        """基于独立连接池创建异步Redis客户端"""
+        pool = redis.asyncio.ConnectionPool(
+            host=cls._settings.host,
+            port=cls._settings.port,
+            db=cls._settings.db,
+            password=cls._settings.password,
+            max_connections=cls._settings.max_connections,
+            decode_responses=decode_responses
+        )
+        return redis.asyncio.Redis(connection_pool=pool)
+
+    @classmethod
+    def get_instance(cls) -> redis.asyncio.Redis:
+        """获取异步Redis客户端实例"""
+        if cls._instance is None:
+            cls._instance = cls._create(decode_responses=True)
+        return cls._instance
+
+    @classmethod
+    def get_binary_instance(cls) -> redis.asyncio.Redis:
+        """获取不解码响应的异步Redis客户端实例（用于读取二进制数据）"""
+        if cls._binary_instance is None:
+            cls._binary_instance = cls._create(decode_responses=False)
+        return cls._binary_instance
+
+    @classmethod
+    def get_broker_instance(cls) -> Any:
+        """
+        获取Celery broker的异步Redis客户端实例（用于直接读取队列键）
+        
+        redis-cluster://redis://:密码@主机:端口/0;redis://... 形式的URL创建集群客户端，否则按URL创建单机客户端。
+        """
+        if cls._broker_instance is None:
+            url = get_broker_url()
+            if url.startswith("redis-cluster://"):
+                nodes = [urlparse(node) for node in url[len("redis-cluster://"):].split(";")]
+                cls._broker_instance = RedisCluster(
+                    startup_nodes=[ClusterNode(node.hostname, node.port) for node in nodes],
+                    password=nodes[0].password or None,
+                    max_connections=cls._settings.max_connections,
+                    decode_responses=True
+                )
+            else:
+                cls._broker_instance = redis.asyncio.Redis.from_url(
+                    url,
+                    max_connections=cls._settings.max_connections,
+                    decode_responses=True
+                )
+        return cls._broker_instance
+
+    @classmethod
+    async def close(cls) -> None:
+        """关闭异步Redis连接池"""
+        if cls._instance is not None:
+            await cls._instance.aclose(close_connection_pool=True)
+            cls._instance = None
+        if cls._binary_instance is not None:
+            await cls._binary_instance.aclose(close_connection_pool=True)
+            cls._binary_instance = None
+        if cls._broker_instance is not None:
+            await cls._broker_instance.aclose()
+            cls._broker_instance = None
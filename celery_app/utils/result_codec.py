@@ -0,0 +1,65 @@
+"""
+任务结果编解码模块
+
+任务结果以msgpack二进制格式存储，体积较大时可选使用zstd压缩（需安装zstandard）。
+编码后的字节按固定大小切分为分块，便于分段写入与流式读取。
+"""
+from datetime import date, datetime
+from typing import Any, List, Tuple
+
+import msgpack
+
+from celery_app.utils.columnar import ColumnBatch
+from config.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+# 结果编码标识
+ENCODING_MSGPACK = "msgpack"
+ENCODING_MSGPACK_ZSTD = "msgpack+zstd"
+
+
+def _default(obj: Any) -> Any:
+    """msgpack无法直接序列化的类型转换"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, ColumnBatch):
+        return obj.to_dict()
+    return str(obj)
+
+
+def pack_result(result: Any) -> bytes:
+    """将任务结果序列化为msgpack字节（不压缩）"""
+    return msgpack.packb(result, default=_default, use_bin_type=True)
+
+
+def compress_result(data: bytes) -> Tuple[bytes, str]:
+    """按大小阈值压缩msgpack字节，返回压缩后的字节与编码标识"""
+    if zstandard is not None and len(data) >= settings.RESULT_COMPRESS_MIN_BYTES:
+        compressor = zstandard.ZstdCompressor(level=settings.RESULT_COMPRESSION_LEVEL)
+        return compressor.compress(data), ENCODING_MSGPACK_ZSTD
+    return data, ENCODING_MSGPACK
+
+
+def encode_result(result: Any) -> Tuple[bytes, str]:
+    """编码任务结果，返回编码后的字节与编码标识"""
+    return compress_result(pack_result(result))
+
+
+def decode_result(data: bytes, encoding: str) -> Any:
+    """解码任务结果"""
+    if encoding == ENCODING_MSGPACK_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to decode compressed task results")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return msgpack.unpackb(data, raw=False)
+
+
+def split_chunks(data: bytes, chunk_size: int) -> List[bytes]:
+    """将编码后的字节切分为固定大小的分块"""
+    return [data[offset:offset + chunk_size] for offset in range(0, len(data), chunk_size)] or [b""]
@@ -0,0 +1,264 @@
+"""
+工作流步骤结果缓存模块
+
+以“步骤任务名 + 代码版本 + 输入”的摘要为键缓存步骤结果（内容寻址）：上游输出不变时下游步骤直接返回缓存结果，
+未变化的子图整体跳过。缓存项带TTL（每次命中时刷新），总字节数超过上限时按最近最少使用淘汰，
+写入、命中与淘汰均在Redis脚本中原子完成。
+
+所有键使用同一个hash tag，Redis集群模式下位于同一槽位，可在一个脚本中操作。
+命中结果为msgpack解码后的值（ColumnBatch为列式字典，元组为列表）。
+"""
+import hashlib
+import inspect
+import logging
+from typing import Any, Dict, List, Tuple
+
+import redis
+from redis.asyncio import Redis as AsyncRedis
+
+from celery_app.utils.latency_metrics import escape_label
+from celery_app.utils.redis_conn import RedisClient
+from celery_app.utils.result_codec import decode_result, encode_result, pack_result
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 读取脚本
+# KEYS: 缓存项键, LRU有序集合键, 统计哈希键
+# ARGV: TTL(秒), 步骤任务名
+# 命中时刷新访问时间与过期时间，并累计命中次数与节省的执行时间
+GET_SCRIPT = """
+local entry = redis.call('HMGET', KEYS[1], 'data', 'encoding', 'runtime')
+if not entry[1] then
+    redis.call('HINCRBY', KEYS[3], 'misses', 1)
+    redis.call('HINCRBY', KEYS[3], 'misses:' .. ARGV[2], 1)
+    return nil
+end
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[2], now[1] .. '.' .. string.format('%06d', tonumber(now[2])), KEYS[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]))
+redis.call('HINCRBY', KEYS[3], 'hits', 1)
+redis.call('HINCRBY', KEYS[3], 'hits:' .. ARGV[2], 1)
+redis.call('HINCRBYFLOAT', KEYS[3], 'saved_seconds', entry[3])
+redis.call('HINCRBYFLOAT', KEYS[3], 'saved_seconds:' .. ARGV[2], entry[3])
+return entry
+"""
+
+# 写入脚本
+# KEYS: 缓存项键, LRU有序集合键, 缓存项大小哈希键, 统计哈希键
+# ARGV: 编码后的结果, 编码标识, 执行时间(秒), TTL(秒), 总字节数上限
+# 先回收已过期缓存项的记账，再写入新项，最后按最近最少使用淘汰直到总字节数不超过上限
+SET_SCRIPT = """
+local function evict(key)
+    local size = tonumber(redis.call('HGET', KEYS[3], key) or '0')
+    redis.call('HDEL', KEYS[3], key)
+    redis.call('ZREM', KEYS[2], key)
+    redis.call('DEL', key)
+    redis.call('HINCRBY', KEYS[4], 'bytes', -size)
+end
+
+local now = redis.call('TIME')
+local now_ts = now[1] .. '.' .. string.format('%06d', tonumber(now[2]))
+local ttl = tonumber(ARGV[4])
+
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. (tonumber(now[1]) - ttl), 'LIMIT', 0, 100)
+for _, key in ipairs(expired) do
+    evict(key)
+end
+
+local size = string.len(ARGV[1])
+local old_size = tonumber(redis.call('HGET', KEYS[3], KEYS[1]) or '0')
+redis.call('HSET', KEYS[1], 'data', ARGV[1], 'encoding', ARGV[2], 'runtime', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('ZADD', KEYS[2], now_ts, KEYS[1])
+redis.call('HSET', KEYS[3], KEYS[1], size)
+redis.call('HINCRBY', KEYS[4], 'bytes', size - old_size)
+redis.call('HINCRBY', KEYS[4], 'stores', 1)
+
+local max_bytes = tonumber(ARGV[5])
+while tonumber(redis.call('HGET', KEYS[4], 'bytes')) > max_bytes do
+    local oldest = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+    if not oldest or oldest == KEYS[1] then
+        break
+    end
+    evict(oldest)
+    redis.call('HINCRBY', KEYS[4], 'evictions', 1)
+end
+return 1
+"""
+
+# 未命中标记
+MISS = object()
+
+# 各任务类的代码版本
+_code_versions: Dict[type, str] = {}
+
+
+def code_version(task: Any) -> str:
+    """
+    步骤任务的代码版本
+
+    优先使用任务类的cache_version属性，否则为任务类源码的摘要（修改类代码后缓存自动失效；
+    任务依赖的外部函数变化时需手动修改cache_version）。
+    """
+    version = getattr(task, "cache_version", None)
+    if version is not None:
+        return str(version)
+    task_cls = type(task)
+    if task_cls not in _code_versions:
+        try:
+            source = inspect.getsource(task_cls)
+        except (OSError, TypeError):
+            source = f"{task_cls.__module__}.{task_cls.__qualname__}"
+        _code_versions[task_cls] = hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+    return _code_versions[task_cls]
+
+
+class BaseStepCache:
+    """步骤缓存基类（键命名与统计解析，供同步/异步实现共用）"""
+    key_prefix = "{step_cache}:"
+
+    def _get_entry_key(self, digest: str) -> str:
+        """获取缓存项键"""
+        return f"{self.key_prefix}entry:{digest}"
+
+    def _get_lru_key(self) -> str:
+        """获取按访问时间排序的缓存项有序集合键"""
+        return f"{self.key_prefix}lru"
+
+    def _get_sizes_key(self) -> str:
+        """获取缓存项字节数哈希键"""
+        return f"{self.key_prefix}sizes"
+
+    def _get_stats_key(self) -> str:
+        """获取统计哈希键"""
+        return f"{self.key_prefix}stats"
+
+    def _parse_stats(self, raw: Dict[Any, Any], entries: int) -> Dict[str, Any]:
+        """解析统计哈希（总计与按步骤任务名的命中、未命中与节省时间）"""
+        raw = {
+            (key.decode() if isinstance(key, bytes) else key): float(value)
+            for key, value in raw.items()
+        }
+        steps: Dict[str, Dict[str, float]] = {}
+        for field, value in raw.items():
+            name, _, step = field.partition(":")
+            if step:
+                steps.setdefault(step, {"hits": 0, "misses": 0, "saved_seconds": 0.0})[name] = value
+        for step in steps.values():
+            step["hits"] = int(step["hits"])
+            step["misses"] = int(step["misses"])
+        hits, misses = int(raw.get("hits", 0)), int(raw.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+            "saved_seconds": raw.get("saved_seconds", 0.0),
+            "stores": int(raw.get("stores", 0)),
+            "evictions": int(raw.get("evictions", 0)),
+            "bytes": int(raw.get("bytes", 0)),
+            "entries": entries,
+            "steps": dict(sorted(steps.items())),
+        }
+
+
+class StepCache(BaseStepCache):
+    """步骤缓存（worker侧）"""
+    def __init__(self):
+        self.redis = RedisClient.get_binary_instance()
+        self._get_script = self.redis.register_script(GET_SCRIPT)
+        self._set_script = self.redis.register_script(SET_SCRIPT)
+        self.enabled = settings.STEP_CACHE_ENABLED
+        self.ttl = settings.STEP_CACHE_TTL
+        self.max_bytes = settings.STEP_CACHE_MAX_BYTES
+        self.max_entry_bytes = settings.STEP_CACHE_MAX_ENTRY_BYTES
+
+    def make_key(self, task: Any, args: tuple, kwargs: Dict[str, Any]) -> str:
+        """按步骤任务名、代码版本与输入计算缓存项键"""
+        content = pack_result([task.name, code_version(task), list(args), sorted(kwargs.items())])
+        return self._get_entry_key(hashlib.blake2b(content, digest_size=20).hexdigest())
+
+    def lookup(self, task: Any, args: tuple, kwargs: Dict[str, Any]) -> Tuple[str, Any]:
+        """计算缓存项键并读取缓存，未命中（或Redis不可用）时结果为MISS"""
+        key = self.make_key(task, args, kwargs)
+        try:
+            entry = self._get_script(
+                keys=[key, self._get_lru_key(), self._get_stats_key()],
+                args=[self.ttl, task.name]
+            )
+        except redis.RedisError:
+            logger.exception("Failed to read step cache")
+            return key, MISS
+        if entry is None:
+            return key, MISS
+        data, encoding, _ = entry
+        return key, decode_result(data, encoding.decode())
+
+    def store(self, key: str, result: Any, runtime: float) -> bool:
+        """写入步骤结果，结果过大或写入失败时返回False"""
+        data, encoding = encode_result(result)
+        if len(data) > self.max_entry_bytes:
+            return False
+        try:
+            self._set_script(
+                keys=[key, self._get_lru_key(), self._get_sizes_key(), self._get_stats_key()],
+                args=[data, encoding, f"{runtime:.6f}", self.ttl, self.max_bytes]
+            )
+        except redis.RedisError:
+            logger.exception("Failed to write step cache")
+            return False
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self._get_stats_key())
+        pipe.zcard(self._get_lru_key())
+        raw, entries = pipe.execute()
+        return self._parse_stats(raw, entries)
+
+    def clear(self) -> None:
+        """清空缓存项与统计"""
+        keys: List[Any] = [self._get_lru_key(), self._get_sizes_key(), self._get_stats_key()]
+        keys.extend(self.redis.zrange(self._get_lru_key(), 0, -1))
+        self.redis.delete(*keys)
+
+
+class AsyncStepCache(BaseStepCache):
+    """异步步骤缓存统计读取（供FastAPI使用）"""
+    def __init__(self, redis: AsyncRedis):
+        self.redis = redis
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计（单次管道往返）"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self._get_stats_key())
+        pipe.zcard(self._get_lru_key())
+        raw, entries = await pipe.execute()
+        return self._parse_stats(raw, entries)
+
+
+def render_prometheus(stats: Dict[str, Any]) -> str:
+    """将缓存统计渲染为Prometheus文本格式"""
+    counters = [
+        ("powercap_step_cache_hits_total", "Workflow step cache hits", "hits"),
+        ("powercap_step_cache_misses_total", "Workflow step cache misses", "misses"),
+        ("powercap_step_cache_saved_seconds_total", "Step run time saved by cache hits", "saved_seconds"),
+    ]
+    lines: List[str] = []
+    for name, help_text, field in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for step, values in stats["steps"].items():
+            lines.append(f'{name}{{step="{escape_label(step)}"}} {values[field]}')
+    lines.append("# HELP powercap_step_cache_bytes Encoded bytes held by the step cache")
+    lines.append("# TYPE powercap_step_cache_bytes gauge")
+    lines.append(f"powercap_step_cache_bytes {stats['bytes']}")
+    lines.append("# HELP powercap_step_cache_evictions_total Step cache entries evicted by the size limit")
+    lines.append("# TYPE powercap_step_cache_evictions_total counter")
+    lines.append(f"powercap_step_cache_evictions_total {stats['evictions']}")
+    return "\n".join(lines) + "\n"
+
+
+# 全局步骤缓存实例
+step_cache = StepCache()
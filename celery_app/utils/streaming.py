@@ -0,0 +1,120 @@
+"""
+流式分块传输模块
+
+工作流流式模式下，步骤之间通过有界通道传递固定大小的数据块：通道满时生产者等待（背压），
+上下游步骤同时运行，内存占用只与块大小和通道容量有关，与数据总量无关。
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from celery_app.utils.columnar import ColumnBatch
+
+
+class LineTooLong(ValueError):
+    """NDJSON单行超过长度上限"""
+
+
+class _EndOfStream:
+    """流结束标记"""
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+class ChunkChannel:
+    """有界分块通道（单生产者、单消费者）"""
+    def __init__(self, maxsize: int):
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize)
+        # 消费者提前退出后，生产者写入的数据块直接丢弃，避免阻塞
+        self._detached = False
+
+    async def put(self, chunk: Any) -> None:
+        """写入数据块，通道满时等待消费者读取"""
+        if not self._detached:
+            await self._queue.put(chunk)
+
+    async def close(self, error: Optional[BaseException] = None) -> None:
+        """结束通道，error不为空时消费者读取到结尾会抛出该异常"""
+        if not self._detached:
+            await self._queue.put(_EndOfStream(error))
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        try:
+            while True:
+                chunk = await self._queue.get()
+                if isinstance(chunk, _EndOfStream):
+                    if chunk.error is not None:
+                        raise chunk.error
+                    return
+                yield chunk
+        finally:
+            self._detached = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+
+def is_stream(data: Any) -> bool:
+    """是否为异步数据块流"""
+    return hasattr(data, "__aiter__")
+
+
+async def iter_chunks(records: Iterable[Any], chunk_size: int) -> AsyncIterator[ColumnBatch]:
+    """将记录迭代器按固定大小切分为列式数据块"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield ColumnBatch.from_records(chunk)
+            chunk = []
+            # 让出事件循环，使下游步骤可以处理已产生的数据块
+            await asyncio.sleep(0)
+    if chunk:
+        yield ColumnBatch.from_records(chunk)
+
+
+async def iter_ndjson_chunks(
+    data: AsyncIterator[bytes],
+    chunk_size: int,
+    max_line_bytes: Optional[int] = None
+) -> AsyncIterator[ColumnBatch]:
+    """
+    将NDJSON字节流（每行一个JSON对象）按固定记录数切分为列式数据块
+
+    字节流可在任意位置分段，空行忽略；某行不是JSON对象时抛出ValueError。
+    指定max_line_bytes时，单行（包括尚未收到换行符的部分）超过该字节数即抛出LineTooLong，
+    缓冲区不会随单行无限增长。
+    """
+    buffer = b""
+    records: List[Dict[str, Any]] = []
+    line_number = 0
+
+    def check_length(line: bytes, number: int) -> None:
+        if max_line_bytes is not None and len(line) > max_line_bytes:
+            raise LineTooLong(f"Line {number} exceeds {max_line_bytes} bytes")
+
+    def parse(line: bytes) -> None:
+        nonlocal line_number
+        line_number += 1
+        check_length(line, line_number)
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {line_number} is not a JSON object")
+        records.append(record)
+
+    async for piece in data:
+        buffer += piece
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+            if len(records) >= chunk_size:
+                yield ColumnBatch.from_records(records)
+                records = []
+        check_length(buffer, line_number + 1)
+    parse(buffer)
+    if records:
+        yield ColumnBatch.from_records(records)
@@ -0,0 +1,204 @@
+"""
+任务阶段耗时统计模块
+
+按采样率记录单次任务执行中各阶段的耗时（进程内阶段使用单调时钟）：
+- deserialization        任务参数反序列化（在BaseTask.__call__中解析参数、按引用读取外置参数）
+- queue_wait             发布（或eta到期）到开始执行的等待时间（跨进程，使用墙上时钟）
+- run                    任务run方法执行时间
+- state_write            写入任务状态的耗时
+- result_serialization   任务结果编码耗时
+
+耗时记录完成后交给配置的输出端（日志、Redis、进程内计数器）。
+"""
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from celery.signals import before_task_publish
+
+from celery_app.utils.latency_metrics import PHASE_METRIC_PREFIX, LatencyStore
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 阶段名称
+DESERIALIZATION = "deserialization"
+QUEUE_WAIT = "queue_wait"
+RUN = "run"
+STATE_WRITE = "state_write"
+RESULT_SERIALIZATION = "result_serialization"
+TASK_PHASES = (DESERIALIZATION, QUEUE_WAIT, RUN, STATE_WRITE, RESULT_SERIALIZATION)
+
+# 发布时间消息头
+SENT_AT_HEADER = "sent_at"
+
+
+class TaskTimings:
+    """单次任务执行的阶段耗时（秒）"""
+    def __init__(self, task_name: str, task_id: str, queue: str):
+        self.task_name = task_name
+        self.task_id = task_id
+        self.queue = queue
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        """累加阶段耗时（同一阶段可能多次出现，如多次状态写入）"""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+
+class NullTaskTimings:
+    """未被采样的任务使用的空实现"""
+    def add(self, phase: str, seconds: float) -> None:
+        pass
+
+    def phase(self, phase: str) -> ContextManager[None]:
+        return nullcontext()
+
+
+NULL_TIMINGS = NullTaskTimings()
+
+
+class TimingSink(ABC):
+    """阶段耗时输出端基类"""
+    @abstractmethod
+    def emit(self, timings: TaskTimings) -> None:
+        """输出单次任务执行的阶段耗时（需要子类实现）"""
+        pass
+
+
+class LogTimingSink(TimingSink):
+    """输出到日志"""
+    def emit(self, timings: TaskTimings) -> None:
+        logger.info(
+            "Task %s[%s] timings: %s",
+            timings.task_name,
+            timings.task_id,
+            ", ".join(f"{phase}={seconds * 1000:.3f}ms" for phase, seconds in timings.phases.items())
+        )
+
+
+class RedisTimingSink(TimingSink):
+    """写入Redis延迟直方图（与事件流延迟统计共用存储，可通过/metrics与/stats/latency查询）"""
+    def __init__(self):
+        self.store = LatencyStore()
+
+    def emit(self, timings: TaskTimings) -> None:
+        self.store.record(
+            [
+                ((f"{PHASE_METRIC_PREFIX}{phase}", timings.task_name, timings.queue), seconds)
+                for phase, seconds in timings.phases.items()
+            ],
+            time.time()
+        )
+
+
+class CounterTimingSink(TimingSink):
+    """进程内计数器（次数、总耗时、最大耗时）"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], List[float]] = {}
+
+    def emit(self, timings: TaskTimings) -> None:
+        with self._lock:
+            for phase, seconds in timings.phases.items():
+                counter = self._counters.setdefault((timings.task_name, phase), [0, 0.0, 0.0])
+                counter[0] += 1
+                counter[1] += seconds
+                counter[2] = max(counter[2], seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """获取计数器快照：任务名 -> 阶段 -> 统计值"""
+        with self._lock:
+            snapshot: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for (task_name, phase), (count, total, maximum) in self._counters.items():
+                snapshot.setdefault(task_name, {})[phase] = {
+                    "count": count,
+                    "total": total,
+                    "mean": total / count,
+                    "max": maximum,
+                }
+            return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+TIMING_SINKS = {
+    "log": LogTimingSink,
+    "redis": RedisTimingSink,
+    "counters": CounterTimingSink,
+}
+
+
+class TaskTimer:
+    """任务阶段耗时采样器"""
+    def __init__(self, sample_rate: float, sinks: List[TimingSink]):
+        self.sample_rate = sample_rate
+        self.sinks = sinks
+
+    def start(self, request: Any, task_name: str) -> Any:
+        """按采样率为任务创建耗时记录，未采样时返回空实现"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return NULL_TIMINGS
+        delivery_info = getattr(request, "delivery_info", None) or {}
+        timings = TaskTimings(task_name, request.id, delivery_info.get("routing_key") or "unknown")
+        queue_wait = _queue_wait(request)
+        if queue_wait is not None:
+            timings.add(QUEUE_WAIT, queue_wait)
+        return timings
+
+    def finish(self, timings: Any) -> None:
+        """将耗时交给各输出端"""
+        if not isinstance(timings, TaskTimings):
+            return
+        for sink in self.sinks:
+            try:
+                sink.emit(timings)
+            except Exception:
+                logger.exception("Failed to emit task timings to %s", type(sink).__name__)
+
+    def get_sink(self, sink_type: type) -> Optional[TimingSink]:
+        """获取指定类型的输出端"""
+        return next((sink for sink in self.sinks if isinstance(sink, sink_type)), None)
+
+
+def _queue_wait(request: Any) -> Optional[float]:
+    """发布（或eta到期）到开始执行的等待时间"""
+    sent_at = getattr(request, SENT_AT_HEADER, None)
+    if sent_at is None:
+        return None
+    ready_at = float(sent_at)
+    eta = getattr(request, "eta", None)
+    if eta:
+        eta_time = eta if isinstance(eta, datetime) else datetime.fromisoformat(eta)
+        ready_at = max(ready_at, eta_time.timestamp())
+    return max(time.time() - ready_at, 0.0)
+
+
+# 全局任务耗时采样器实例
+task_timer = TaskTimer(
+    settings.TASK_TIMING_SAMPLE_RATE,
+    [TIMING_SINKS[name]() for name in settings.TASK_TIMING_SINKS]
+)
+
+
+@before_task_publish.connect
+def add_sent_at_header(headers: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+    """发布任务时记录发布时间，用于计算排队等待时间与队列中最早消息的等待时间（不论是否采样）"""
+    if headers is not None:
+        headers.setdefault(SENT_AT_HEADER, time.time())
@@ -1,14 +1,21 @@
 """
 任务状态管理工具模块
 """
+import json
+import time
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import (Any, AsyncIterator, Dict, Iterator, List, Optional,
+                    Tuple)
 
 from celery import states
 from pydantic import BaseModel
+from redis.asyncio import Redis as AsyncRedis
 
 from celery_app.utils.redis_conn import RedisClient
+from celery_app.utils.result_codec import (decode_result, encode_result,
+                                          split_chunks)
+from config.settings import settings
 
 
 class TaskStatus(str, Enum):
@@ -25,93 +32,477 @@ class TaskResult(BaseModel):
     """任务结果模型"""
     task_id: str
     status: TaskStatus
-    result: Optional[Any] = None
+    result_size: Optional[int] = None
+    result_encoding: Optional[str] = None
     error: Optional[str] = None
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     runtime: Optional[float] = None
 
 
-class TaskStateManager:
-    """任务状态管理器"""
-    def __init__(self):
-        self.redis = RedisClient.get_instance()
-        self.task_key_prefix = "task:"
-        self.task_meta_key_prefix = "task_meta:"
+# 状态转换脚本
+# KEYS: 任务键, 任务元数据键, 任务结果键, 任务结果暂存键
+# ARGV: 状态, 更新时间, 是否开始, 是否结束, 结果编码(空表示无结果), 结果字节数, 是否有错误, 错误信息,
+#       任务ID, 事件频道, 保留时间(秒，0表示不过期), 内联结果, 结果分块数(0表示内联)
+# 开始时记录服务端时间戳start_ts，结束时据此计算runtime，避免读后写的竞争与多次往返；
+# 小结果内联写入元数据的result字段；大结果已由调用方分批写入暂存键，此处重命名为结果键，
+# 读取方不会看到写了一半的分块列表；
+# 终态按保留时间设置过期，每次状态转换同时发布到任务事件频道
+# 各键以任务ID为hash tag，Redis集群模式下位于同一slot，可在一个脚本中操作
+UPDATE_TASK_STATUS_SCRIPT = """
+local now = redis.call('TIME')
+local now_ts = now[1] .. '.' .. string.format('%06d', tonumber(now[2]))
+local event = {task_id = ARGV[9], status = ARGV[1], update_time = ARGV[2]}
+
+redis.call('HSET', KEYS[1], 'status', ARGV[1])
+redis.call('HSET', KEYS[2], 'status', ARGV[1], 'update_time', ARGV[2])
+
+if ARGV[3] == '1' then
+    redis.call('HSET', KEYS[2], 'start_time', ARGV[2], 'start_ts', now_ts)
+end
+
+if ARGV[4] == '1' then
+    redis.call('HSET', KEYS[2], 'end_time', ARGV[2])
+    local start_ts = redis.call('HGET', KEYS[2], 'start_ts')
+    if start_ts then
+        local runtime = tonumber(now_ts) - tonumber(start_ts)
+        redis.call('HSET', KEYS[2], 'runtime', tostring(runtime))
+        event['runtime'] = runtime
+    end
+end
+
+if ARGV[5] ~= '' then
+    if ARGV[13] == '0' then
+        redis.call('DEL', KEYS[3])
+        redis.call('HSET', KEYS[2], 'result', ARGV[12])
+    else
+        redis.call('RENAME', KEYS[4], KEYS[3])
+        redis.call('HDEL', KEYS[2], 'result')
+    end
+    redis.call('HSET', KEYS[2], 'result_encoding', ARGV[5], 'result_size', ARGV[6],
+        'result_chunks', ARGV[13])
+    event['result_size'] = tonumber(ARGV[6])
+end
+
+if ARGV[7] == '1' then
+    redis.call('HSET', KEYS[2], 'error', ARGV[8])
+    event['error'] = ARGV[8]
+end
+
+local ttl = tonumber(ARGV[11])
+for _, key in ipairs({KEYS[1], KEYS[2], KEYS[3]}) do
+    if ttl > 0 then
+        redis.call('EXPIRE', key, ttl)
+    else
+        redis.call('PERSIST', key)
+    end
+end
+
+redis.call('PUBLISH', ARGV[10], cjson.encode(event))
+return 1
+"""
+
+
+class BaseTaskStateManager:
+    """任务状态管理器基类（键命名与结果解析，供同步/异步实现共用）"""
+    task_key_prefix = "task:"
+    task_meta_key_prefix = "task_meta:"
+    task_result_key_prefix = "task_result:"
+    task_event_channel_prefix = "task_events:"
+    # 新键中不存在的任务是否回退读取未使用hash tag的旧键（TASK_LEGACY_KEY_FALLBACK）
+    legacy_key_fallback = False
+    # 状态查询读取的元数据字段（不读取内联结果）
+    task_meta_fields = ("result_size", "result_encoding", "error", "start_time", "end_time", "runtime")
+    # 分块结果每次往返写入/读取的分块数
+    result_batch_chunks = 16
     
     def _get_task_key(self, task_id: str) -> str:
         """获取任务Redis键"""
-        return f"{self.task_key_prefix}{task_id}"
+        return f"{self.task_key_prefix}{{{task_id}}}"
     
     def _get_task_meta_key(self, task_id: str) -> str:
         """获取任务元数据Redis键"""
-        return f"{self.task_meta_key_prefix}{task_id}"
+        return f"{self.task_meta_key_prefix}{{{task_id}}}"
+    
+    def _get_task_result_key(self, task_id: str) -> str:
+        """获取任务结果Redis键（二进制分块列表）"""
+        return f"{self.task_result_key_prefix}{{{task_id}}}"
+    
+    def _get_task_result_staging_key(self, task_id: str) -> str:
+        """获取任务结果暂存键（分块结果写完后由状态转换脚本重命名为结果键）"""
+        return f"{self._get_task_result_key(task_id)}:staging"
+    
+    def _get_task_keys(self, task_id: str) -> List[str]:
+        """获取任务的全部Redis键（以任务ID为hash tag，集群模式下位于同一slot）"""
+        return [
+            self._get_task_key(task_id),
+            self._get_task_meta_key(task_id),
+            self._get_task_result_key(task_id)
+        ]
+    
+    def _get_legacy_task_keys(self, task_id: str) -> List[str]:
+        """获取hash tag上线前写入的旧键（task:<id>等，只用于读取回退与清理）"""
+        return [
+            f"{prefix}{task_id}"
+            for prefix in (self.task_key_prefix, self.task_meta_key_prefix, self.task_result_key_prefix)
+        ]
+    
+    def _get_key_groups(self, task_id: str) -> List[List[str]]:
+        """按读取顺序获取任务的键组（启用旧键回退时包括旧键）"""
+        if self.legacy_key_fallback:
+            return [self._get_task_keys(task_id), self._get_legacy_task_keys(task_id)]
+        return [self._get_task_keys(task_id)]
+    
+    def _get_sibling_keys(self, task_key: str) -> List[str]:
+        """由扫描到的任务键得到同一任务的全部Redis键（兼容未使用hash tag的旧键）"""
+        suffix = task_key[len(self.task_key_prefix):]
+        return [
+            f"{prefix}{suffix}"
+            for prefix in (self.task_key_prefix, self.task_meta_key_prefix, self.task_result_key_prefix)
+        ]
+    
+    def _get_task_event_channel(self, task_id: str) -> str:
+        """获取任务事件发布频道"""
+        return f"{self.task_event_channel_prefix}{task_id}"
+    
+    def _build_task_result(
+        self,
+        task_id: str,
+        task_data: Dict[str, str],
+        task_meta: Dict[str, str]
+    ) -> TaskResult:
+        """根据任务哈希与元数据哈希构造任务结果"""
+        return TaskResult(
+            task_id=task_id,
+            status=TaskStatus(task_data.get("status", TaskStatus.PENDING)),
+            result_size=int(task_meta["result_size"]) if "result_size" in task_meta else None,
+            result_encoding=task_meta.get("result_encoding"),
+            error=task_meta.get("error"),
+            start_time=datetime.fromisoformat(task_meta["start_time"]) if "start_time" in task_meta else None,
+            end_time=datetime.fromisoformat(task_meta["end_time"]) if "end_time" in task_meta else None,
+            runtime=float(task_meta["runtime"]) if "runtime" in task_meta else None
+        )
+    
+    def _queue_status_reads(self, pipe: Any, task_ids: List[str], legacy: bool = False) -> None:
+        """向管道中加入批量读取任务状态的命令（legacy为True时读取旧键）"""
+        for task_id in task_ids:
+            task_key, meta_key, _ = (
+                self._get_legacy_task_keys(task_id) if legacy else self._get_task_keys(task_id)
+            )
+            pipe.hgetall(task_key)
+            pipe.hmget(meta_key, self.task_meta_fields)
+    
+    def _parse_status_replies(
+        self,
+        task_ids: List[str],
+        replies: List[Any]
+    ) -> Dict[str, Optional[TaskResult]]:
+        """解析批量读取的管道返回值，不存在的任务对应值为None"""
+        statuses: Dict[str, Optional[TaskResult]] = {}
+        for index, task_id in enumerate(task_ids):
+            task_data = replies[2 * index]
+            task_meta = {
+                field: value
+                for field, value in zip(self.task_meta_fields, replies[2 * index + 1])
+                if value is not None
+            }
+            statuses[task_id] = (
+                self._build_task_result(task_id, task_data, task_meta) if task_data else None
+            )
+        return statuses
+    
+    def _legacy_candidates(self, statuses: Dict[str, Optional[TaskResult]]) -> List[str]:
+        """需要回退读取旧键的任务ID（新键中不存在的任务）"""
+        if not self.legacy_key_fallback:
+            return []
+        return [task_id for task_id, status in statuses.items() if status is None]
+
+
+class TaskStateManager(BaseTaskStateManager):
+    """任务状态管理器"""
+    def __init__(self):
+        self.legacy_key_fallback = settings.TASK_LEGACY_KEY_FALLBACK
+        self.redis = RedisClient.get_instance()
+        self.binary_redis = RedisClient.get_binary_instance()
+        self._update_status_script = self.redis.register_script(UPDATE_TASK_STATUS_SCRIPT)
+        # 各终态的保留时间（秒），0表示永久保留
+        self.retention_ttls: Dict[TaskStatus, int] = {
+            TaskStatus.SUCCESS: settings.TASK_RETENTION_SUCCESS,
+            TaskStatus.FAILURE: settings.TASK_RETENTION_FAILURE,
+            TaskStatus.REVOKED: settings.TASK_RETENTION_REVOKED,
+        }
+        self.stale_ttl = settings.TASK_RETENTION_STALE
+        self.inline_max_bytes = settings.RESULT_INLINE_MAX_BYTES
+    
+    def get_retention_ttl(self, status: TaskStatus) -> int:
+        """获取状态对应的保留时间，未结束的状态返回0（不过期）"""
+        return self.retention_ttls.get(TaskStatus(status), 0)
     
     def update_task_status(
         self,
         task_id: str,
         status: TaskStatus,
         result: Optional[Any] = None,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        encoded_result: Optional[Tuple[bytes, str]] = None
     ) -> None:
-        """更新任务状态"""
-        task_key = self._get_task_key(task_id)
-        task_meta_key = self._get_task_meta_key(task_id)
+        """
+        更新任务状态（原子操作，运行时间由Redis服务端计算）
         
-        # 更新任务状态
-        self.redis.hset(task_key, "status", status.value)
+        结果以二进制编码，编码后不超过RESULT_INLINE_MAX_BYTES时内联写入元数据，与状态转换在同一次
+        往返内完成；更大的结果先按result_batch_chunks个分块一批通过管道写入暂存键，
+        再由状态转换脚本原子地替换结果键。
+        已由调用方编码的结果通过encoded_result传入（编码后的字节, 编码标识）
+        """
+        status = TaskStatus(status)
+        result_encoding, result_size, inline_data, result_chunks = "", 0, b"", 0
+        if encoded_result is None and result is not None:
+            encoded_result = encode_result(result)
+        if encoded_result is not None:
+            data, result_encoding = encoded_result
+            result_size = len(data)
+            if result_size <= self.inline_max_bytes:
+                inline_data = data
+            else:
+                result_chunks = self._write_result_chunks(
+                    task_id, split_chunks(data, settings.RESULT_CHUNK_SIZE)
+                )
         
-        # 更新任务元数据
-        meta: Dict[str, Any] = {
-            "status": status.value,
-            "update_time": datetime.utcnow().isoformat()
-        }
+        self._update_status_script(
+            keys=[*self._get_task_keys(task_id), self._get_task_result_staging_key(task_id)],
+            args=[
+                status.value,
+                datetime.utcnow().isoformat(),
+                int(status == TaskStatus.STARTED),
+                int(status in (TaskStatus.SUCCESS, TaskStatus.FAILURE)),
+                result_encoding,
+                result_size,
+                int(error is not None),
+                error if error is not None else "",
+                task_id,
+                self._get_task_event_channel(task_id),
+                self.get_retention_ttl(status),
+                inline_data,
+                result_chunks
+            ]
+        )
+    
+    def _write_result_chunks(self, task_id: str, chunks: List[bytes]) -> int:
+        """分批写入结果分块到暂存键（每批一次管道往返），返回分块数"""
+        key = self._get_task_result_staging_key(task_id)
+        self.binary_redis.delete(key)
+        for start in range(0, len(chunks), self.result_batch_chunks):
+            pipe = self.binary_redis.pipeline(transaction=False)
+            pipe.rpush(key, *chunks[start:start + self.result_batch_chunks])
+            # 写入方异常退出时暂存键按未结束任务的最长保留时间回收
+            pipe.expire(key, self.stale_ttl)
+            pipe.execute()
+        return len(chunks)
+    
+    def get_task_status(self, task_id: str) -> Optional[TaskResult]:
+        """获取任务状态"""
+        return self.get_task_statuses([task_id])[task_id]
+    
+    def get_task_statuses(self, task_ids: List[str]) -> Dict[str, Optional[TaskResult]]:
+        """
+        批量获取任务状态
         
-        if status == TaskStatus.STARTED:
-            meta["start_time"] = datetime.utcnow().isoformat()
+        所有读取通过一个管道在一次往返内完成，不存在的任务对应值为None。
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        if not task_ids:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_status_reads(pipe, task_ids)
+        statuses = self._parse_status_replies(task_ids, pipe.execute())
+        # 新键中不存在的任务回退读取旧键（hash tag上线前仍在执行或保留期内的任务）
+        missing = self._legacy_candidates(statuses)
+        if missing:
+            pipe = self.redis.pipeline(transaction=False)
+            self._queue_status_reads(pipe, missing, legacy=True)
+            statuses.update(self._parse_status_replies(missing, pipe.execute()))
+        return statuses
+    
+    def get_task_result(self, task_id: str) -> Optional[Any]:
+        """读取并解码任务结果，无结果时返回None"""
+        for _, meta_key, result_key in self._get_key_groups(task_id):
+            encoding, data = self.binary_redis.hmget(meta_key, "result_encoding", "result")
+            if encoding is None:
+                continue
+            if data is None:
+                data = b"".join(self.binary_redis.lrange(result_key, 0, -1))
+            return decode_result(data, encoding.decode())
+        return None
+    
+    def clean_task_data(self, task_id: str) -> None:
+        """清理任务数据（包括旧键）"""
+        for key in [*self._get_task_keys(task_id), *self._get_legacy_task_keys(task_id)]:
+            self.redis.delete(key)
+    
+    def purge_task_data(
+        self,
+        scan_count: Optional[int] = None,
+        batch_pause: Optional[float] = None
+    ) -> Dict[str, int]:
+        """
+        增量清理任务状态数据
         
-        if status in (TaskStatus.SUCCESS, TaskStatus.FAILURE):
-            meta["end_time"] = datetime.utcnow().isoformat()
-            if "start_time" in self.redis.hgetall(task_meta_key):
-                start_time = datetime.fromisoformat(self.redis.hget(task_meta_key, "start_time"))
-                meta["runtime"] = (datetime.utcnow() - start_time).total_seconds()
+        使用SCAN分批遍历任务键（集群模式下逐个主节点遍历），每批通过一个管道读取状态与过期时间：
+        - 已设置过期时间的键交由Redis自动过期
+        - 超过保留时间的终态任务、超过最长保留时间的未结束任务以UNLINK回收
+        - 其余未设置过期时间的键（如保留策略上线前写入的键）补设剩余保留时间
         
-        if result is not None:
-            meta["result"] = str(result)
+        匹配模式task:*同时覆盖task:{id}与hash tag上线前的旧键task:<id>，旧键的元数据与结果键
+        按其自身的键名处理（见_get_sibling_keys）。
         
-        if error is not None:
-            meta["error"] = error
+        返回扫描、回收、补设过期的键数以及回收的字节数（依赖MEMORY USAGE，不可用时计为0）。
+        """
+        scan_count = scan_count or settings.TASK_CLEANUP_SCAN_COUNT
+        batch_pause = settings.TASK_CLEANUP_BATCH_PAUSE if batch_pause is None else batch_pause
+        stats = {"scanned_keys": 0, "deleted_keys": 0, "expired_keys": 0, "reclaimed_bytes": 0}
         
-        self.redis.hmset(task_meta_key, meta)
-    
-    def get_task_status(self, task_id: str) -> Optional[TaskResult]:
-        """获取任务状态"""
-        task_key = self._get_task_key(task_id)
-        task_meta_key = self._get_task_meta_key(task_id)
+        batch: List[str] = []
+        for task_key in self._scan_task_keys(scan_count):
+            batch.append(task_key)
+            if len(batch) >= scan_count:
+                self._purge_batch(batch, stats)
+                batch = []
+                time.sleep(batch_pause)
+        if batch:
+            self._purge_batch(batch, stats)
         
-        if not self.redis.exists(task_key):
-            return None
+        return stats
+    
+    def _scan_task_keys(self, scan_count: int) -> Iterator[str]:
+        """
+        遍历任务键
         
-        task_data = self.redis.hgetall(task_key)
-        task_meta = self.redis.hgetall(task_meta_key)
+        集群客户端（提供get_primaries）的SCAN游标只属于单个节点，因此逐个主节点完整遍历，
+        不扫描副本，每个键只返回一次。
+        """
+        match = f"{self.task_key_prefix}*"
+        if hasattr(self.redis, "get_primaries"):
+            for node in self.redis.get_primaries():
+                yield from self.redis.scan_iter(match=match, count=scan_count, target_nodes=node)
+        else:
+            yield from self.redis.scan_iter(match=match, count=scan_count)
+    
+    def _purge_batch(self, task_keys: List[str], stats: Dict[str, int]) -> None:
+        """处理一批任务键"""
+        key_groups = [self._get_sibling_keys(task_key) for task_key in task_keys]
+        pipe = self.redis.pipeline(transaction=False)
+        for task_key, meta_key, result_key in key_groups:
+            pipe.hget(task_key, "status")
+            pipe.ttl(task_key)
+            pipe.hget(meta_key, "update_time")
+            for key in (task_key, meta_key, result_key):
+                pipe.memory_usage(key)
+        replies = pipe.execute(raise_on_error=False)
         
-        result = TaskResult(
-            task_id=task_id,
-            status=TaskStatus(task_data.get("status", TaskStatus.PENDING)),
-            result=task_meta.get("result"),
-            error=task_meta.get("error"),
-            start_time=datetime.fromisoformat(task_meta["start_time"]) if "start_time" in task_meta else None,
-            end_time=datetime.fromisoformat(task_meta["end_time"]) if "end_time" in task_meta else None,
-            runtime=float(task_meta["runtime"]) if "runtime" in task_meta else None
-        )
+        now = datetime.utcnow()
+        pipe = self.redis.pipeline(transaction=False)
+        for index, keys in enumerate(key_groups):
+            status, ttl, update_time, *key_sizes = replies[6 * index:6 * index + 6]
+            stats["scanned_keys"] += 1
+            # ttl为-2表示键已不存在，>=0表示已设置过期时间
+            if not isinstance(ttl, int) or ttl != -1:
+                continue
+            
+            try:
+                retention = self.get_retention_ttl(TaskStatus(status))
+            except ValueError:
+                retention = 0
+            if retention == 0:
+                if status in states.READY_STATES:
+                    continue
+                retention = self.stale_ttl
+            
+            try:
+                age = (now - datetime.fromisoformat(update_time)).total_seconds()
+            except (TypeError, ValueError):
+                age = 0
+            
+            if age >= retention:
+                for key in keys:
+                    pipe.unlink(key)
+                stats["deleted_keys"] += len(keys)
+                stats["reclaimed_bytes"] += sum(
+                    size for size in key_sizes if isinstance(size, int)
+                )
+            else:
+                for key in keys:
+                    pipe.expire(key, int(retention - age))
+                stats["expired_keys"] += len(keys)
+        pipe.execute()
+
+
+class AsyncTaskStateManager(BaseTaskStateManager):
+    """异步任务状态管理器（供FastAPI使用，不阻塞事件循环）"""
+    def __init__(self, redis: AsyncRedis, binary_redis: Optional[AsyncRedis] = None):
+        self.legacy_key_fallback = settings.TASK_LEGACY_KEY_FALLBACK
+        self.redis = redis
+        self.binary_redis = binary_redis
+    
+    async def iter_result_chunks(self, task_id: str) -> AsyncIterator[bytes]:
+        """
+        逐块读取任务结果的编码字节
         
-        return result
+        内联结果为单个分块；分块结果每次往返按LRANGE窗口读取result_batch_chunks个分块。
+        结果不存在、或读取过程中结果键过期导致分块不完整时抛出LookupError。
+        """
+        for _, meta_key, key in self._get_key_groups(task_id):
+            data, chunks = await self.binary_redis.hmget(meta_key, "result", "result_chunks")
+            if data is not None or chunks is not None:
+                break
+        else:
+            raise LookupError(f"Result of task '{task_id}' not found")
+        if data is not None:
+            yield data
+            return
+        total = int(chunks)
+        for start in range(0, total, self.result_batch_chunks):
+            stop = min(start + self.result_batch_chunks, total)
+            window = await self.binary_redis.lrange(key, start, stop - 1)
+            if len(window) != stop - start:
+                raise LookupError(f"Result of task '{task_id}' has expired or is incomplete")
+            for chunk in window:
+                yield chunk
     
-    def clean_task_data(self, task_id: str) -> None:
-        """清理任务数据"""
-        self.redis.delete(self._get_task_key(task_id))
-        self.redis.delete(self._get_task_meta_key(task_id))
+    async def get_task_status(self, task_id: str) -> Optional[TaskResult]:
+        """获取任务状态"""
+        return (await self.get_task_statuses([task_id]))[task_id]
+    
+    async def get_task_statuses(self, task_ids: List[str]) -> Dict[str, Optional[TaskResult]]:
+        """批量获取任务状态（单次管道往返）"""
+        task_ids = list(dict.fromkeys(task_ids))
+        if not task_ids:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_status_reads(pipe, task_ids)
+        statuses = self._parse_status_replies(task_ids, await pipe.execute())
+        missing = self._legacy_candidates(statuses)
+        if missing:
+            pipe = self.redis.pipeline(transaction=False)
+            self._queue_status_reads(pipe, missing, legacy=True)
+            statuses.update(self._parse_status_replies(missing, await pipe.execute()))
+        return statuses
+    
+    async def publish_task_event(self, task_id: str, status: TaskStatus) -> None:
+        """发布任务状态事件（用于未经过任务钩子的状态变化，如取消）"""
+        event = {
+            "task_id": task_id,
+            "status": TaskStatus(status).value,
+            "update_time": datetime.utcnow().isoformat()
+        }
+        await self.redis.publish(self._get_task_event_channel(task_id), json.dumps(event))
+    
+    async def clean_task_data(self, task_id: str) -> None:
+        """清理任务数据（包括旧键）"""
+        pipe = self.redis.pipeline(transaction=False)
+        for key in [*self._get_task_keys(task_id), *self._get_legacy_task_keys(task_id)]:
+            pipe.delete(key)
+        await pipe.execute()
 
 
 # 全局任务状态管理器实例
-task_state_manager = TaskStateManager() 
\ No newline at end of file
+task_state_manager = TaskStateManager()
@@ -0,0 +1,143 @@
+"""
+Worker注册表模块
+
+worker主进程定期将自身状态写入Redis（带过期时间的心跳），API通过读取注册表获取worker数量
+与活跃任务数，无需广播inspect命令并等待回复超时。
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from celery.signals import worker_ready, worker_shutdown
+from celery.worker import state as worker_state
+from redis.asyncio import Redis as AsyncRedis
+
+from celery_app.utils.redis_conn import RedisClient
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BaseWorkerRegistry:
+    """Worker注册表基类（键命名与结果解析，供同步/异步实现共用）"""
+    worker_key_prefix = "worker:"
+    # 有序集合：worker主机名 -> 最近心跳时间戳，用于列举存活worker
+    workers_index_key = "workers"
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl or settings.WORKER_HEARTBEAT_TTL
+
+    def _get_worker_key(self, hostname: str) -> str:
+        """获取worker心跳Redis键"""
+        return f"{self.worker_key_prefix}{hostname}"
+
+    def _parse_worker(self, info: Dict[str, str]) -> Dict[str, Any]:
+        """解析worker心跳信息"""
+        return {
+            **info,
+            "active": int(info.get("active", 0)),
+            "reserved": int(info.get("reserved", 0)),
+            "processed": int(info.get("processed", 0)),
+            "concurrency": int(info.get("concurrency", 0)),
+            "queues": [queue for queue in info.get("queues", "").split(",") if queue],
+        }
+
+
+class WorkerRegistry(BaseWorkerRegistry):
+    """Worker注册表（worker端写入心跳）"""
+    def __init__(self, ttl: Optional[int] = None):
+        super().__init__(ttl)
+        self.redis = RedisClient.get_instance()
+
+    def heartbeat(self, hostname: str, info: Dict[str, Any]) -> None:
+        """写入一次心跳（单次管道往返）"""
+        key = self._get_worker_key(hostname)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, mapping={key_: str(value) for key_, value in info.items()})
+        pipe.expire(key, self.ttl)
+        pipe.zadd(self.workers_index_key, {hostname: time.time()})
+        pipe.execute()
+
+    def remove(self, hostname: str) -> None:
+        """移除worker（正常退出时调用）"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self._get_worker_key(hostname))
+        pipe.zrem(self.workers_index_key, hostname)
+        pipe.execute()
+
+
+class AsyncWorkerRegistry(BaseWorkerRegistry):
+    """异步Worker注册表（供API读取）"""
+    def __init__(self, redis: AsyncRedis, ttl: Optional[int] = None):
+        super().__init__(ttl)
+        self.redis = redis
+
+    async def count_workers(self) -> int:
+        """统计心跳未过期的worker数量"""
+        return await self.redis.zcount(self.workers_index_key, time.time() - self.ttl, "+inf")
+
+    async def get_workers(self) -> List[Dict[str, Any]]:
+        """获取心跳未过期的worker及其状态，并清理过期的索引项"""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(self.workers_index_key, "-inf", now - self.ttl)
+        pipe.zrange(self.workers_index_key, 0, -1)
+        _, hostnames = await pipe.execute()
+        if not hostnames:
+            return []
+
+        pipe = self.redis.pipeline(transaction=False)
+        for hostname in hostnames:
+            pipe.hgetall(self._get_worker_key(hostname))
+        return [self._parse_worker(info) for info in await pipe.execute() if info]
+
+
+def _collect_worker_info(consumer: Any) -> Dict[str, Any]:
+    """采集worker主进程当前状态"""
+    pool = getattr(consumer, "pool", None)
+    queues = getattr(getattr(consumer.app.amqp, "queues", None), "consume_from", None) or {}
+    return {
+        "hostname": consumer.hostname,
+        "active": len(worker_state.active_requests),
+        "reserved": len(worker_state.reserved_requests),
+        "processed": sum(worker_state.total_count.values()),
+        "concurrency": getattr(pool, "num_processes", None) or consumer.app.conf.worker_concurrency or 0,
+        "queues": ",".join(queues),
+        "last_heartbeat": datetime.utcnow().isoformat(),
+    }
+
+
+_heartbeat_stop = threading.Event()
+_heartbeat_hostname: Optional[str] = None
+
+
+@worker_ready.connect
+def start_worker_heartbeat(sender: Any = None, **kwargs: Any) -> None:
+    """worker就绪后在主进程中启动心跳线程"""
+    global _heartbeat_hostname
+    registry = WorkerRegistry()
+    _heartbeat_hostname = sender.hostname
+    _heartbeat_stop.clear()
+
+    def beat() -> None:
+        while not _heartbeat_stop.is_set():
+            try:
+                registry.heartbeat(sender.hostname, _collect_worker_info(sender))
+            except Exception:
+                logger.exception("Failed to send worker heartbeat")
+            _heartbeat_stop.wait(settings.WORKER_HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=beat, name="worker-heartbeat", daemon=True).start()
+
+
+@worker_shutdown.connect
+def stop_worker_heartbeat(**kwargs: Any) -> None:
+    """worker退出时停止心跳并从注册表移除"""
+    _heartbeat_stop.set()
+    if _heartbeat_hostname is not None:
+        try:
+            WorkerRegistry().remove(_heartbeat_hostname)
+        except Exception:
+            logger.exception("Failed to remove worker from registry")
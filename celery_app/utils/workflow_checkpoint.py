@@ -0,0 +1,81 @@
+"""
+工作流检查点模块
+
+工作流每完成一个步骤，将步骤输出写入参数存储，并在工作流任务ID对应的哈希中记录步骤状态与输出引用。
+同一任务ID重试或重新投递时读取检查点，已完成的步骤直接使用记录的输出，从第一个未完成的步骤继续执行。
+工作流成功结束后删除检查点及其引用的输出。
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable
+
+import redis
+
+from celery_app.utils.payload_store import PayloadStore, payload_store
+from celery_app.utils.redis_conn import RedisClient
+from celery_app.utils.task_utils import TaskStatus
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowCheckpointStore:
+    """工作流检查点存储"""
+    key_prefix = "workflow_checkpoint:"
+
+    def __init__(self, store: PayloadStore = payload_store):
+        self.redis = RedisClient.get_instance()
+        self.payload_store = store
+        self.enabled = settings.WORKFLOW_CHECKPOINT_ENABLED
+        self.ttl = settings.WORKFLOW_CHECKPOINT_TTL
+
+    def _get_checkpoint_key(self, checkpoint_id: str) -> str:
+        """获取检查点Redis键（步骤ID -> 步骤状态与输出引用）"""
+        return f"{self.key_prefix}{checkpoint_id}"
+
+    def save(self, checkpoint_id: str, step_id: str, result: Any) -> None:
+        """记录已完成的步骤（写入失败时只记录日志，不影响工作流执行）"""
+        try:
+            entry = {
+                "status": TaskStatus.SUCCESS.value,
+                "payload": self.payload_store.put(result),
+                "completed_at": datetime.utcnow().isoformat()
+            }
+            key = self._get_checkpoint_key(checkpoint_id)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, step_id, json.dumps(entry))
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Failed to save checkpoint of workflow step %s", step_id)
+
+    def load(self, checkpoint_id: str, step_ids: Iterable[str]) -> Dict[str, Any]:
+        """读取已完成步骤的输出（步骤ID -> 输出），输出已过期的步骤视为未完成"""
+        step_ids = set(step_ids)
+        entries = self.redis.hgetall(self._get_checkpoint_key(checkpoint_id))
+        results: Dict[str, Any] = {}
+        for step_id, raw in entries.items():
+            entry = json.loads(raw)
+            if step_id not in step_ids or entry["status"] != TaskStatus.SUCCESS.value:
+                continue
+            try:
+                results[step_id] = self.payload_store.get(entry["payload"])
+            except LookupError:
+                logger.warning("Output of workflow step %s has expired, running it again", step_id)
+        return results
+
+    def get_steps(self, checkpoint_id: str) -> Dict[str, Dict[str, Any]]:
+        """获取各步骤的检查点记录（不读取输出）"""
+        entries = self.redis.hgetall(self._get_checkpoint_key(checkpoint_id))
+        return {step_id: json.loads(raw) for step_id, raw in entries.items()}
+
+    def clear(self, checkpoint_id: str) -> None:
+        """删除检查点及其引用的步骤输出"""
+        for entry in self.get_steps(checkpoint_id).values():
+            self.payload_store.delete(entry["payload"])
+        self.redis.delete(self._get_checkpoint_key(checkpoint_id))
+
+
+# 全局工作流检查点存储实例
+workflow_checkpoints = WorkflowCheckpointStore()
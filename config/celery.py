@@ -1,8 +1,78 @@
 from config.settings import settings
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-def get_celery_config() -> Dict[str, Any]:
-    # 自动适配broker/backend
+from kombu import Queue
+
+# 任务优先级（Redis transport：0最高，9最低）
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 3
+PRIORITY_LOW = 6
+PRIORITY_BULK = 9
+# Redis transport的优先级分级与队列名分隔符：优先级p(p>0)的消息位于列表"队列名:p"，优先级0位于列表"队列名"
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ":"
+
+# 路由表：任务类型 -> 队列与默认优先级（提交时显式指定的queue/priority优先）
+# 交互式任务与批量ETL使用不同队列，由不同的worker消费，交互式任务不会排在批量任务之后
+TASK_ROUTES: Dict[str, Dict[str, Any]] = {
+    # 交互式任务
+    "data_process_task": {"queue": "interactive", "priority": PRIORITY_HIGH},
+    "data_validation_task": {"queue": "interactive", "priority": PRIORITY_HIGH},
+    "data_pipeline_task": {"queue": "interactive", "priority": PRIORITY_HIGH},
+    "distributed_data_pipeline_task": {"queue": "interactive", "priority": PRIORITY_HIGH},
+    # 批量ETL任务
+    "etl_workflow_task": {"queue": "etl", "priority": PRIORITY_LOW},
+    "distributed_etl_workflow_task": {"queue": "etl", "priority": PRIORITY_LOW},
+    "streaming_etl_workflow_task": {"queue": "etl", "priority": PRIORITY_LOW},
+    "extract_task": {"queue": "etl", "priority": PRIORITY_LOW},
+    "transform_task": {"queue": "etl", "priority": PRIORITY_LOW},
+    "load_task": {"queue": "etl", "priority": PRIORITY_LOW},
+    "daily_etl_task": {"queue": "etl", "priority": PRIORITY_BULK},
+    # 周期任务
+    "health_check_task": {"queue": "monitoring", "priority": PRIORITY_HIGH},
+    "data_cleanup_task": {"queue": "maintenance", "priority": PRIORITY_BULK},
+    "weekly_report_task": {"queue": "reporting", "priority": PRIORITY_BULK},
+}
+
+# 各队列专用worker的配置（worker通过CELERY_WORKER_QUEUES指定消费的队列，按第一个队列的配置启动）
+# 交互式任务以IO为主，threads池下多个任务共享进程内事件循环；批量任务使用prefork池并定期回收子进程
+QUEUE_WORKER_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "interactive": {"worker_pool": "threads", "worker_concurrency": 16, "worker_prefetch_multiplier": 1},
+    "etl": {
+        "worker_pool": "prefork",
+        "worker_concurrency": 2,
+        "worker_prefetch_multiplier": 1,
+        "worker_max_tasks_per_child": 50,
+    },
+    "maintenance": {"worker_pool": "prefork", "worker_concurrency": 1, "worker_prefetch_multiplier": 1},
+}
+
+
+def get_task_route(task_type: str) -> Dict[str, Any]:
+    """获取任务类型的路由（队列与默认优先级），未在路由表中的任务使用默认队列"""
+    return dict(TASK_ROUTES.get(task_type, {"queue": settings.CELERY_DEFAULT_QUEUE}))
+
+
+def get_known_queues() -> list[str]:
+    """默认队列与路由表中的全部队列"""
+    queues = [settings.CELERY_DEFAULT_QUEUE, *(route["queue"] for route in TASK_ROUTES.values())]
+    return list(dict.fromkeys(queues))
+
+
+def get_worker_settings(queues: Optional[list[str]] = None) -> Dict[str, Any]:
+    """获取消费指定队列的worker配置（池类型、并发数、预取数等）"""
+    worker_settings: Dict[str, Any] = {
+        "worker_pool": settings.CELERY_WORKER_POOL,
+        "worker_concurrency": settings.CELERY_CONCURRENCY,
+        "worker_prefetch_multiplier": settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+    }
+    if queues:
+        worker_settings.update(QUEUE_WORKER_SETTINGS.get(queues[0], {}))
+    return worker_settings
+
+
+def get_broker_url() -> str:
+    """获取broker URL（生产环境自动拼接redis-cluster URL）"""
     if settings.CELERY_BROKER_URL:
         broker_url = settings.CELERY_BROKER_URL
     elif settings.ENVIRONMENT == "prod":
@@ -15,12 +85,21 @@ def get_celery_config() -> Dict[str, Any]:
         broker_url = f"redis-cluster://{nodes_str}"
     else:
         broker_url = f"redis://{settings.TEST_REDIS_HOST}:{settings.TEST_REDIS_PORT}/{settings.TEST_REDIS_DB}"
+    return broker_url
+
+
+def get_celery_config() -> Dict[str, Any]:
+    # 自动适配broker/backend
+    broker_url = get_broker_url()
 
     if settings.CELERY_RESULT_BACKEND:
         result_backend = settings.CELERY_RESULT_BACKEND
     else:
         result_backend = broker_url
 
+    # worker只声明（即消费）CELERY_WORKER_QUEUES中的队列，为空时消费全部队列
+    queues = settings.CELERY_WORKER_QUEUES or get_known_queues()
+
     return {
         "broker_url": broker_url,
         "result_backend": result_backend,
@@ -31,5 +110,19 @@ def get_celery_config() -> Dict[str, Any]:
         "enable_utc": settings.CELERY_ENABLE_UTC,
         "task_soft_time_limit": settings.CELERY_TASK_SOFT_TIME_LIMIT,
         "task_time_limit": settings.CELERY_TASK_TIME_LIMIT,
+        "worker_send_task_events": settings.CELERY_SEND_TASK_EVENTS,
+        "task_send_sent_event": settings.CELERY_SEND_TASK_EVENTS,
+        # 路由与优先级
+        "task_routes": TASK_ROUTES,
+        "task_queues": [Queue(name, routing_key=name) for name in queues],
+        "task_default_queue": settings.CELERY_DEFAULT_QUEUE,
+        "task_default_priority": settings.CELERY_DEFAULT_PRIORITY,
+        # Redis transport按优先级拆分队列（队列名:优先级），消费时优先取高优先级
+        "broker_transport_options": {
+            "priority_steps": PRIORITY_STEPS,
+            "sep": PRIORITY_SEP,
+            "queue_order_strategy": "priority",
+        },
+        **get_worker_settings(settings.CELERY_WORKER_QUEUES),
         # 其他可扩展配置
-    } 
\ No newline at end of file
+    }
@@ -29,9 +29,76 @@ class BaseSettings(PydanticBaseSettings):
     CELERY_TIMEZONE: str = Field("Asia/Shanghai", description="Celery时区")
     CELERY_ENABLE_UTC: bool = Field(True, description="Celery是否启用UTC")
     CELERY_CONCURRENCY: int = Field(2, description="Celery并发数")
+    CELERY_WORKER_POOL: str = Field("prefork", description="Celery worker池类型(prefork/threads/solo)，threads池下多个任务共享进程内事件循环")
+    CELERY_ASYNC_CONCURRENCY: int = Field(100, description="每个worker进程事件循环中同时运行的异步任务上限")
+    CELERY_WORKER_PREFETCH_MULTIPLIER: int = Field(1, description="worker每个并发槽预取的消息数，为1时高优先级消息不会被已预取的低优先级消息阻塞")
+    CELERY_WORKER_QUEUES: List[str] = Field([], description="当前worker消费的队列，为空时消费全部队列；非空时按第一个队列的专用配置覆盖池类型与并发数")
+    CELERY_DEFAULT_QUEUE: str = Field("default", description="未在路由表中的任务的默认队列")
+    CELERY_DEFAULT_PRIORITY: int = Field(3, ge=0, le=9, description="未在路由表中指定优先级的任务的默认优先级(Redis transport: 0最高, 9最低)")
+    WORKER_HEARTBEAT_INTERVAL: float = Field(10.0, description="worker向注册表发送心跳的间隔(秒)")
+    WORKER_HEARTBEAT_TTL: int = Field(30, description="worker心跳过期时间(秒)，超过未更新视为下线")
+    CELERY_SEND_TASK_EVENTS: bool = Field(True, description="是否发送任务事件(task-sent/received/started/succeeded等)，延迟统计依赖该事件流")
+    LATENCY_WINDOW_RETENTION_MINUTES: int = Field(60, description="按分钟延迟直方图的保留时间(分钟)，决定延迟分位数可查询的最大窗口")
+    TASK_TIMING_SAMPLE_RATE: float = Field(0.01, ge=0, le=1, description="任务阶段耗时统计采样率(0~1)，0表示关闭")
+    TASK_TIMING_SINKS: List[str] = Field(["counters"], description="任务阶段耗时输出端(log/redis/counters)")
     CELERY_TASK_SOFT_TIME_LIMIT: int = Field(3600, description="Celery软超时时间(秒)")
     CELERY_TASK_TIME_LIMIT: int = Field(7200, description="Celery硬超时时间(秒)")
 
+    # ========== 任务状态保留配置 ==========
+    TASK_RETENTION_SUCCESS: int = Field(86400, description="成功任务状态保留时间(秒)，0表示永久保留")
+    TASK_RETENTION_FAILURE: int = Field(604800, description="失败任务状态保留时间(秒)，0表示永久保留")
+    TASK_RETENTION_REVOKED: int = Field(86400, description="已取消任务状态保留时间(秒)，0表示永久保留")
+    TASK_RETENTION_STALE: int = Field(604800, description="未结束任务状态最长保留时间(秒)，超过后由清理任务回收")
+    TASK_LEGACY_KEY_FALLBACK: bool = Field(True, description="新键中不存在的任务是否回退读取未使用hash tag的旧键(task:<id>)，旧键全部过期后可关闭")
+    TASK_CLEANUP_SCAN_COUNT: int = Field(500, description="清理任务每批SCAN的键数")
+    TASK_CLEANUP_BATCH_PAUSE: float = Field(0.05, description="清理任务批次间隔(秒)，避免持续占用Redis")
+
+    # ========== 任务结果存储配置 ==========
+    RESULT_CHUNK_SIZE: int = Field(262144, description="任务结果分块大小(字节)，超过RESULT_INLINE_MAX_BYTES的结果按该大小分块存储")
+    RESULT_INLINE_MAX_BYTES: int = Field(65536, description="任务结果编码后不超过该字节数时内联保存在任务元数据中，更大的结果分块存储")
+    RESULT_COMPRESS_MIN_BYTES: int = Field(4096, description="任务结果启用zstd压缩的最小字节数")
+    RESULT_COMPRESSION_LEVEL: int = Field(3, description="任务结果zstd压缩级别")
+
+    # ========== 任务参数外置存储配置 ==========
+    PAYLOAD_OFFLOAD_MIN_BYTES: int = Field(65536, description="任务参数编码后超过该字节数时写入参数存储，消息中只传递引用")
+    PAYLOAD_TTL: int = Field(86400, description="外置参数保留时间(秒)")
+    PAYLOAD_FILE_STORE_DIR: Optional[str] = Field(None, description="本机参数文件目录(建议位于/dev/shm)，同主机worker通过内存映射读取，为空表示不启用")
+    PAYLOAD_UPLOAD_CHUNK_ROWS: int = Field(10000, description="NDJSON上传时每个数据块的记录数")
+    PAYLOAD_UPLOAD_MAX_LINE_BYTES: int = Field(1048576, description="NDJSON上传时单行的最大字节数，超过时返回413")
+
+    # ========== 工作流步骤结果缓存配置 ==========
+    STEP_CACHE_ENABLED: bool = Field(True, description="是否启用工作流步骤结果缓存（仅对声明cache的步骤生效）")
+    STEP_CACHE_TTL: int = Field(604800, description="步骤缓存项的保留时间(秒)，每次命中时刷新")
+    STEP_CACHE_MAX_BYTES: int = Field(268435456, description="步骤缓存总字节数上限，超过时按最近最少使用淘汰")
+    STEP_CACHE_MAX_ENTRY_BYTES: int = Field(16777216, description="单个步骤结果编码后超过该字节数时不缓存")
+
+    # ========== 工作流检查点配置 ==========
+    WORKFLOW_CHECKPOINT_ENABLED: bool = Field(True, description="是否记录工作流步骤检查点（重试或重新投递时跳过已完成的步骤）")
+    WORKFLOW_CHECKPOINT_TTL: int = Field(86400, description="工作流检查点保留时间(秒)，不应超过PAYLOAD_TTL")
+
+    # ========== 任务提交准入控制配置 ==========
+    RATE_LIMIT_ENABLED: bool = Field(True, description="是否按任务类型与客户端对任务提交限流（令牌桶，每个任务消耗一个令牌）")
+    RATE_LIMIT_TASK_TYPE_RATE: float = Field(500.0, gt=0, description="每种任务类型每秒补充的令牌数")
+    RATE_LIMIT_TASK_TYPE_BURST: int = Field(10000, gt=0, description="每种任务类型的令牌桶容量（允许的突发提交数）")
+    RATE_LIMIT_TASK_TYPE_OVERRIDES: Dict[str, List[float]] = Field({}, description="按任务类型覆盖限流参数：任务类型 -> [每秒令牌数, 桶容量]")
+    RATE_LIMIT_CLIENT_RATE: float = Field(100.0, gt=0, description="每个客户端每秒补充的令牌数")
+    RATE_LIMIT_CLIENT_BURST: int = Field(10000, gt=0, description="每个客户端的令牌桶容量")
+    RATE_LIMIT_CLIENT_HEADER: str = Field("X-Client-ID", description="标识客户端的请求头，缺失时使用客户端IP")
+    RATE_LIMIT_LEASE_SIZE: int = Field(50, ge=0, description="访问Redis时每个令牌桶额外预取的令牌数（在进程内消耗，不超过桶容量的10%），0表示每次提交都访问Redis")
+    RATE_LIMIT_LEASE_TTL: float = Field(1.0, gt=0, description="预取令牌的有效期(秒)，过期未用的令牌作废")
+    QUEUE_BACKLOG_LIMIT: int = Field(100000, description="队列积压超过该消息数时拒绝提交(429)，0表示不限制")
+    QUEUE_BACKLOG_LIMITS: Dict[str, int] = Field({}, description="按队列覆盖积压阈值：队列 -> 消息数")
+    QUEUE_BACKLOG_RETRY_AFTER: int = Field(5, description="因队列积压拒绝时建议的重试间隔(秒)")
+    QUEUE_STATS_CACHE_TTL: float = Field(1.0, description="队列长度缓存有效期(秒)，每个API进程每个有效期至多读取一次broker")
+    IDEMPOTENCY_HEADER: str = Field("Idempotency-Key", description="任务提交的幂等键请求头，相同客户端的相同幂等键只发布一次任务")
+    IDEMPOTENCY_KEY_TTL: int = Field(86400, gt=0, description="幂等键有效期(秒)")
+    IDEMPOTENCY_CONTENT_HASH_TASK_TYPES: List[str] = Field(
+        [],
+        description="未提供幂等键时按 task_type + params 内容摘要去重的任务类型（可选，默认不按内容去重）"
+    )
+    IDEMPOTENCY_CONTENT_HASH_TTL: int = Field(600, gt=0, description="内容摘要去重的有效期(秒)")
+    IDEMPOTENCY_CLAIM_TTL: int = Field(60, gt=0, description="发布中的去重键有效期(秒)，任务发布后延长为完整有效期")
+
     @validator("ALLOWED_HOSTS", pre=True)
     def parse_hosts(cls, v):
         """将字符串类型的主机列表转换为list"""
@@ -39,9 +106,15 @@ class BaseSettings(PydanticBaseSettings):
             return json.loads(v)
         return v
 
-    @validator("CELERY_ACCEPT_CONTENT", pre=True)
+    @validator(
+        "CELERY_ACCEPT_CONTENT",
+        "TASK_TIMING_SINKS",
+        "CELERY_WORKER_QUEUES",
+        "IDEMPOTENCY_CONTENT_HASH_TASK_TYPES",
+        pre=True
+    )
     def parse_accept_content(cls, v):
-        """将字符串类型的内容类型转换为list"""
+        """将字符串类型的内容类型、输出端、队列、任务类型转换为list"""
         if isinstance(v, str):
             return json.loads(v)
         return v
@@ -1,33 +1,47 @@
 """
 状态查询API路由模块
 """
-from typing import Dict
+from typing import Any, Dict
 
-from fastapi import APIRouter, Depends
-from redis import Redis
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
 
 from celery_app.task_registry import app as celery_app
-from powercap_api.core.dependencies import get_redis_client
+from celery_app.utils.broker_queues import broker_queue_cache
+from celery_app.utils.broker_queues import \
+    render_prometheus as render_queue_prometheus
+from celery_app.utils.broker_queues import summarize as summarize_queues
+from celery_app.utils.latency_metrics import (AsyncLatencyStore,
+                                              render_prometheus, summarize)
+from celery_app.utils.step_cache import AsyncStepCache
+from celery_app.utils.step_cache import \
+    render_prometheus as render_step_cache_prometheus
+from celery_app.utils.worker_registry import AsyncWorkerRegistry
+from config.settings import settings
+from powercap_api.core.dependencies import (get_async_broker_redis_client,
+                                            get_async_redis_client)
 
 router = APIRouter()
 
 
 @router.get("/health")
-async def health_check(redis: Redis = Depends(get_redis_client)) -> Dict[str, str]:
+async def health_check(redis: AsyncRedis = Depends(get_async_redis_client)) -> Dict[str, str]:
     """
     系统健康检查
     """
     # 检查Redis连接
     try:
-        redis.ping()
+        await redis.ping()
         redis_status = "ok"
     except Exception:
         redis_status = "error"
     
-    # 检查Celery Worker状态
+    # 检查Celery Worker状态（读取心跳注册表，无需广播inspect）
     try:
-        workers = celery_app.control.inspect().active()
-        celery_status = "ok" if workers else "no_workers"
+        worker_count = await AsyncWorkerRegistry(redis).count_workers()
+        celery_status = "ok" if worker_count else "no_workers"
     except Exception:
         celery_status = "error"
     
@@ -39,18 +53,15 @@ async def health_check(redis: Redis = Depends(get_redis_client)) -> Dict[str, st
 
 
 @router.get("/stats")
-async def get_stats(redis: Redis = Depends(get_redis_client)) -> Dict[str, int]:
+async def get_stats(redis: AsyncRedis = Depends(get_async_redis_client)) -> Dict[str, int]:
     """
     获取系统统计信息
     """
     try:
-        # 获取Celery统计信息
-        stats = celery_app.control.inspect().stats() or {}
-        total_workers = len(stats)
-        
-        # 获取活跃任务数
-        active = celery_app.control.inspect().active() or {}
-        total_active_tasks = sum(len(tasks) for tasks in active.values())
+        # 从心跳注册表获取worker与活跃任务数
+        workers = await AsyncWorkerRegistry(redis).get_workers()
+        total_workers = len(workers)
+        total_active_tasks = sum(worker["active"] for worker in workers)
         
         # 获取已注册任务数
         registered_tasks = len(celery_app.tasks)
@@ -70,4 +81,63 @@ async def get_stats(redis: Redis = Depends(get_redis_client)) -> Dict[str, int]:
             "active_tasks": 0,
             "registered_tasks": 0,
             "scheduled_tasks": 0
-        } 
\ No newline at end of file
+        }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(
+    redis: AsyncRedis = Depends(get_async_redis_client),
+    broker_redis: Any = Depends(get_async_broker_redis_client)
+) -> PlainTextResponse:
+    """
+    Prometheus格式的任务延迟直方图（按任务名与队列）、工作流步骤缓存计数与队列积压
+    （broker不可用时省略队列积压，其余指标照常返回）
+    """
+    sketches = await AsyncLatencyStore(redis).load()
+    step_cache_stats = await AsyncStepCache(redis).get_stats()
+    try:
+        queue_metrics = render_queue_prometheus(await broker_queue_cache.get_stats(broker_redis))
+    except RedisError:
+        queue_metrics = ""
+    return PlainTextResponse(
+        render_prometheus(sketches)
+        + render_step_cache_prometheus(step_cache_stats)
+        + queue_metrics,
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+@router.get("/queues")
+async def get_queues(broker_redis: Any = Depends(get_async_broker_redis_client)) -> Dict[str, Any]:
+    """
+    各队列积压：消息数、各优先级消息数与最早消息的等待时间（秒）
+
+    直接读取broker中的队列键（单次管道往返，集群模式下按节点分组），每个API进程缓存QUEUE_STATS_CACHE_TTL秒。
+    """
+    try:
+        stats = await broker_queue_cache.get_stats(broker_redis)
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Failed to read broker queues: {str(e)}")
+    return {"queues": summarize_queues(stats)}
+
+
+@router.get("/stats/latency")
+async def get_latency_stats(
+    window: int = Query(
+        15, ge=1, le=settings.LATENCY_WINDOW_RETENTION_MINUTES, description="统计窗口(分钟)"
+    ),
+    redis: AsyncRedis = Depends(get_async_redis_client)
+) -> Dict[str, Any]:
+    """
+    最近window分钟内各任务的延迟分位数（p50/p95/p99，单位秒）
+    """
+    sketches = await AsyncLatencyStore(redis).load(window)
+    return {"window_minutes": window, "series": summarize(sketches)}
+
+
+@router.get("/stats/step-cache")
+async def get_step_cache_stats(redis: AsyncRedis = Depends(get_async_redis_client)) -> Dict[str, Any]:
+    """
+    工作流步骤结果缓存统计（命中、未命中、节省的执行时间与占用字节数，按步骤任务名细分）
+    """
+    return await AsyncStepCache(redis).get_stats()
@@ -1,92 +1,521 @@
 """
 任务管理API路由模块
 """
-from typing import List
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from celery import states
+from fastapi import (APIRouter, Depends, HTTPException, Query, Request,
+                     WebSocket, WebSocketDisconnect)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from redis.asyncio import Redis as AsyncRedis
 
 from celery_app.task_registry import app as celery_app
 from celery_app.tasks.scheduled_tasks import SCHEDULED_TASKS
-from celery_app.utils.task_utils import TaskStateManager
-from powercap_api.core.dependencies import get_task_manager
-from powercap_api.models.task_schemas import (ScheduledTaskInfo,
-                                            ScheduledTaskList, TaskCreate,
-                                            TaskResponse, TaskStatusResponse)
+from celery_app.utils.payload_store import (PAYLOAD_REF_KEY,
+                                           AsyncPayloadStore,
+                                           InvalidPayloadRef)
+from celery_app.utils.result_codec import ENCODING_MSGPACK_ZSTD, decode_result
+from celery_app.utils.streaming import LineTooLong, iter_ndjson_chunks
+from celery_app.utils.task_utils import (AsyncTaskStateManager, TaskResult,
+                                        TaskStateManager, TaskStatus)
+from config.celery import get_task_route
+from powercap_api.core.admission import AdmissionRejected, admission_controller
+from powercap_api.core.config import settings
+from powercap_api.core.dependencies import (get_async_broker_redis_client,
+                                           get_async_payload_store,
+                                           get_async_redis_client,
+                                           get_async_task_manager,
+                                           get_task_manager)
+from powercap_api.core.idempotency import (IdempotencyConflict,
+                                           idempotency_store)
+from powercap_api.core.task_events import task_event_hub
+from powercap_api.models.task_schemas import (PayloadResponse,
+                                            ScheduledTaskInfo,
+                                            ScheduledTaskList, TaskBatchCreate,
+                                            TaskBatchResponse, TaskCreate,
+                                            TaskResponse,
+                                            TaskStatusBatchRequest,
+                                            TaskStatusBatchResponse,
+                                            TaskStatusResponse)
 
 router = APIRouter()
 
+# SSE保活注释的发送间隔（秒）
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+
+def _task_result_event(task_result: TaskResult) -> Dict[str, Any]:
+    """将当前任务状态转换为与推送事件相同格式的字典"""
+    event: Dict[str, Any] = {
+        "task_id": task_result.task_id,
+        "status": task_result.status.value
+    }
+    if task_result.runtime is not None:
+        event["runtime"] = task_result.runtime
+    if task_result.error is not None:
+        event["error"] = task_result.error
+    return event
+
+
+def _get_client_id(request: Request) -> str:
+    """请求的客户端标识（限流按该标识计数）：优先使用客户端标识请求头，否则为客户端IP"""
+    client_id = request.headers.get(admission_controller.client_header)
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
+
+
+async def _admit_tasks(
+    request: Request,
+    tasks: List[TaskCreate],
+    redis: AsyncRedis,
+    broker_redis: Any
+) -> None:
+    """准入控制：目标队列积压或超过限流时返回429（含Retry-After）"""
+    task_types: Dict[str, int] = {}
+    for task in tasks:
+        task_types[task.task_type] = task_types.get(task.task_type, 0) + 1
+    queues = [task.queue or get_task_route(task.task_type)["queue"] for task in tasks]
+    try:
+        await admission_controller.admit(redis, broker_redis, _get_client_id(request), task_types, queues)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.detail, headers=e.headers)
+
+
+async def _claim_submission(
+    request: Request,
+    task: TaskCreate,
+    redis: AsyncRedis
+) -> Tuple[Optional[str], int, Optional[Dict[str, Any]], bool]:
+    """幂等去重：返回 (去重键, 有效期, 记录, 是否首次提交)，不去重时去重键与记录为None"""
+    try:
+        claim_key = idempotency_store.get_key(
+            _get_client_id(request),
+            request.headers.get(idempotency_store.header),
+            task.task_type,
+            task.params
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if claim_key is None:
+        return None, 0, None, True
+    key, ttl, fingerprint = claim_key
+    try:
+        created, record = await idempotency_store.claim(redis, key, fingerprint)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=e.detail)
+    return key, ttl, record, created
+
+
+def _replay_response(task: TaskCreate, record: Dict[str, Any]) -> TaskResponse:
+    """重复提交的响应：首次提交的响应，首次提交仍在发布时为其任务ID的PENDING响应"""
+    if "response" in record:
+        return TaskResponse.model_validate(record["response"])
+    return TaskResponse(
+        task_id=record["task_id"],
+        task_type=task.task_type,
+        params=task.params,
+        status=TaskStatus.PENDING
+    )
+
+
+def _to_status_response(task_result: TaskResult) -> TaskStatusResponse:
+    """将任务状态转换为状态响应（仅包含元数据与结果大小）"""
+    return TaskStatusResponse(
+        task_id=task_result.task_id,
+        status=task_result.status,
+        result_size=task_result.result_size,
+        error=task_result.error
+    )
+
 
 @router.post("/tasks/run", response_model=TaskResponse, status_code=202)
 async def run_task(
     task: TaskCreate,
-    task_manager: TaskStateManager = Depends(get_task_manager)
+    request: Request,
+    response: Response,
+    task_manager: TaskStateManager = Depends(get_task_manager),
+    payload_store: AsyncPayloadStore = Depends(get_async_payload_store),
+    redis: AsyncRedis = Depends(get_async_redis_client),
+    broker_redis: Any = Depends(get_async_broker_redis_client)
 ) -> TaskResponse:
     """
     触发异步任务
     
     - **task_type**: 任务类型
-    - **params**: 任务参数
-    - **queue**: 可选的任务队列
+    - **params**: 任务参数，编码后超过阈值的参数写入参数存储，消息中只传递引用；
+      参数值为引用时只接受本部署写入且未过期的参数，否则返回400
+    - **queue**: 可选的任务队列，默认按路由表选择
+    - **priority**: 可选的任务优先级（0最高，9最低），默认按路由表选择
     - **countdown**: 可选的延迟执行时间（秒）
     - **eta**: 可选的计划执行时间
+    
+    目标队列积压超过阈值或超过任务类型/客户端限流时返回429，Retry-After为建议的重试间隔（秒）。
+    
+    相同客户端以相同的Idempotency-Key请求头（或在有效期内以相同的内容提交配置为按内容去重的任务类型）
+    重复提交时不再发布任务，返回首次提交的响应，并带有 Idempotent-Replayed: true 响应头；
+    同一幂等键用于内容不同的请求时返回422。
     """
+    # 获取任务类
+    celery_task = celery_app.tasks.get(task.task_type)
+    if not celery_task:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Task type '{task.task_type}' not found"
+        )
+    
+    key, ttl, record, created = await _claim_submission(request, task, redis)
+    if not created:
+        response.headers["Idempotent-Replayed"] = "true"
+        return _replay_response(task, record)
     try:
-        # 获取任务类
-        celery_task = celery_app.tasks.get(task.task_type)
-        if not celery_task:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Task type '{task.task_type}' not found"
-            )
-        
-        # 发送任务
-        task_result = celery_task.apply_async(
-            kwargs=task.params,
-            queue=task.queue,
-            countdown=task.countdown,
-            eta=task.eta
+        await _admit_tasks(request, [task], redis, broker_redis)
+    except HTTPException:
+        if key:
+            await idempotency_store.release(redis, key)
+        raise
+    
+    try:
+        # 发送任务（大参数替换为引用，去重时使用占用去重键时生成的任务ID）
+        params = await payload_store.offload_params(task.params)
+        # 发布为阻塞IO，放入线程池执行
+        task_id, status = await run_in_threadpool(
+            _publish_task, celery_task, task, params, record["task_id"] if record else None
         )
         
-        return TaskResponse(
-            task_id=task_result.id,
+        task_response = TaskResponse(
+            task_id=task_id,
             task_type=task.task_type,
-            params=task.params,
-            status=task_result.status
+            params=params,
+            status=status
         )
     
+    except InvalidPayloadRef as e:
+        if key:
+            await idempotency_store.release(redis, key)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid payload reference: {str(e)}"
+        )
     except Exception as e:
+        if key:
+            await idempotency_store.release(redis, key)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to start task: {str(e)}"
         )
+    
+    if key:
+        await idempotency_store.complete(redis, key, ttl, record, task_response.model_dump(mode="json"))
+    return task_response
+
+
+def _publish_task(
+    celery_task: Any,
+    task: TaskCreate,
+    params: Dict[str, Any],
+    task_id: Optional[str]
+) -> Tuple[str, str]:
+    """发布单个任务，返回任务ID与状态"""
+    task_result = celery_task.apply_async(
+        kwargs=params,
+        queue=task.queue,
+        priority=task.priority,
+        countdown=task.countdown,
+        eta=task.eta,
+        task_id=task_id
+    )
+    return task_result.id, task_result.status
+
+
+def _publish_tasks(tasks: List[TaskCreate]) -> List[str]:
+    """通过同一个producer连接依次发布任务，避免每条消息重新获取连接"""
+    with celery_app.producer_or_acquire() as producer:
+        return [
+            celery_app.tasks[task.task_type].apply_async(
+                kwargs=task.params,
+                queue=task.queue,
+                priority=task.priority,
+                countdown=task.countdown,
+                eta=task.eta,
+                producer=producer
+            ).id
+            for task in tasks
+        ]
+
+
+@router.post("/tasks/run:batch", response_model=TaskBatchResponse, status_code=202)
+async def run_tasks_batch(
+    batch: TaskBatchCreate,
+    request: Request,
+    payload_store: AsyncPayloadStore = Depends(get_async_payload_store),
+    redis: AsyncRedis = Depends(get_async_redis_client),
+    broker_redis: Any = Depends(get_async_broker_redis_client)
+) -> TaskBatchResponse:
+    """
+    批量触发异步任务
+    
+    - **tasks**: 任务列表（每项与 /tasks/run 的请求体相同）
+    - **task_type** + **params_list**: 同一任务类型的多组参数，共享 queue/priority/countdown/eta
+    
+    准入控制与 /tasks/run 相同，整批通过或整批拒绝（429）。
+    """
+    tasks = batch.expand()
+    if len(tasks) > settings.task_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch size {len(tasks)} exceeds limit {settings.task_batch_max_size}"
+        )
+    
+    unknown_types = sorted({task.task_type for task in tasks} - set(celery_app.tasks.keys()))
+    if unknown_types:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Task types not found: {', '.join(unknown_types)}"
+        )
+    
+    # 整批准入：按任务类型扣减各自的任务数，客户端扣减任务总数
+    await _admit_tasks(request, tasks, redis, broker_redis)
+    
+    try:
+        for task in tasks:
+            task.params = await payload_store.offload_params(task.params)
+    except InvalidPayloadRef as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid payload reference: {str(e)}"
+        )
+    
+    try:
+        # 发布为阻塞IO，放入线程池执行
+        task_ids = await run_in_threadpool(_publish_tasks, tasks)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to start tasks: {str(e)}"
+        )
+    
+    return TaskBatchResponse(task_ids=task_ids, count=len(task_ids))
+
+
+@router.post("/payloads", response_model=PayloadResponse, status_code=201)
+async def upload_payload(
+    request: Request,
+    payload_store: AsyncPayloadStore = Depends(get_async_payload_store)
+) -> PayloadResponse:
+    """
+    以NDJSON流上传任务数据
+    
+    请求体每行一个JSON对象（记录），边接收边按固定记录数切分为列式数据块写入参数存储，
+    不在内存中缓存整个请求体。返回的引用可直接作为任务参数使用：
+    {"task_type": "...", "params": {"data": <payload>}}
+    
+    单行超过PAYLOAD_UPLOAD_MAX_LINE_BYTES时返回413，某行不是JSON对象时返回400。
+    """
+    try:
+        ref = await payload_store.put_batches(
+            iter_ndjson_chunks(
+                request.stream(), payload_store.upload_chunk_rows, payload_store.upload_max_line_bytes
+            )
+        )
+    except LineTooLong as e:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Invalid NDJSON payload: {str(e)}"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid NDJSON payload: {str(e)}"
+        )
+    
+    info = ref[PAYLOAD_REF_KEY]
+    return PayloadResponse(payload=ref, rows=info["rows"], size=info["size"])
+
+
+@router.post("/tasks/status:batch", response_model=TaskStatusBatchResponse)
+async def get_task_statuses(
+    request: TaskStatusBatchRequest,
+    task_manager: AsyncTaskStateManager = Depends(get_async_task_manager)
+) -> TaskStatusBatchResponse:
+    """
+    批量获取任务状态
+    
+    - **task_ids**: 任务ID列表，所有任务在一次Redis往返内读取
+    """
+    statuses = await task_manager.get_task_statuses(request.task_ids)
+    
+    tasks: List[TaskStatusResponse] = []
+    not_found: List[str] = []
+    for task_id, task_result in statuses.items():
+        if task_result is None:
+            not_found.append(task_id)
+            continue
+        tasks.append(_to_status_response(task_result))
+    
+    return TaskStatusBatchResponse(tasks=tasks, not_found=not_found)
 
 
 @router.get("/tasks/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(
     task_id: str,
-    task_manager: TaskStateManager = Depends(get_task_manager)
+    task_manager: AsyncTaskStateManager = Depends(get_async_task_manager)
 ) -> TaskStatusResponse:
     """
     获取任务状态
     
     - **task_id**: 任务ID
     """
-    task_result = task_manager.get_task_status(task_id)
+    task_result = await task_manager.get_task_status(task_id)
     if not task_result:
         raise HTTPException(
             status_code=404,
             detail=f"Task '{task_id}' not found"
         )
     
-    return TaskStatusResponse(
-        task_id=task_result.task_id,
-        status=task_result.status,
-        result=task_result.result,
-        error=task_result.error
+    return _to_status_response(task_result)
+
+
+@router.get("/tasks/{task_id}/result")
+async def get_task_result(
+    task_id: str,
+    format: str = Query(default="raw", pattern="^(raw|json)$"),
+    task_manager: AsyncTaskStateManager = Depends(get_async_task_manager)
+) -> Response:
+    """
+    获取任务结果
+    
+    - **task_id**: 任务ID
+    - **format**: raw（默认）按存储分块流式返回msgpack字节，压缩结果附带 Content-Encoding: zstd；
+      json 在服务端解码后以JSON返回
+    
+    发送响应头前先读取第一个分块，结果不存在或已过期时返回404；分块结果以分块传输编码流式返回，
+    不预先声明Content-Length，传输过程中结果过期时中断连接，客户端不会收到被截断但长度"正确"的响应。
+    """
+    task_result = await task_manager.get_task_status(task_id)
+    if not task_result or task_result.result_encoding is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Result of task '{task_id}' not found"
+        )
+    
+    chunks = task_manager.iter_result_chunks(task_id)
+    try:
+        first = await anext(chunks)
+        if format == "json":
+            data = b"".join([first, *[chunk async for chunk in chunks]])
+    except (LookupError, StopAsyncIteration):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Result of task '{task_id}' not found"
+        )
+    
+    if format == "json":
+        return JSONResponse(content=jsonable_encoder(decode_result(data, task_result.result_encoding)))
+    
+    headers: Dict[str, str] = {}
+    if task_result.result_encoding == ENCODING_MSGPACK_ZSTD:
+        headers["Content-Encoding"] = "zstd"
+    if len(first) == task_result.result_size:
+        # 内联结果（或只有一个分块）已完整读取
+        return Response(content=first, media_type="application/vnd.msgpack", headers=headers)
+    
+    async def stream() -> AsyncIterator[bytes]:
+        yield first
+        async for chunk in chunks:
+            yield chunk
+    
+    return StreamingResponse(stream(), media_type="application/vnd.msgpack", headers=headers)
+
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    redis: AsyncRedis = Depends(get_async_redis_client),
+    task_manager: AsyncTaskStateManager = Depends(get_async_task_manager)
+) -> StreamingResponse:
+    """
+    以Server-Sent Events推送任务状态变化
+    
+    - **task_id**: 任务ID
+    
+    连接建立后先推送任务当前状态，任务进入终态（SUCCESS/FAILURE/REVOKED）后关闭事件流
+    """
+    async def event_stream() -> AsyncIterator[str]:
+        async with task_event_hub.subscribe(redis, [task_id]) as subscription:
+            task_result = await task_manager.get_task_status(task_id)
+            if task_result is not None:
+                yield f"data: {json.dumps(_task_result_event(task_result))}\n\n"
+                if task_result.status.value in states.READY_STATES:
+                    return
+            
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+                if event["status"] in states.READY_STATES:
+                    return
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+@router.websocket("/tasks/events/ws")
+async def task_events_websocket(
+    websocket: WebSocket,
+    redis: AsyncRedis = Depends(get_async_redis_client),
+    task_manager: AsyncTaskStateManager = Depends(get_async_task_manager)
+) -> None:
+    """
+    通过WebSocket订阅多个任务的状态变化
+    
+    客户端发送 {"subscribe": [任务ID...]} 或 {"unsubscribe": [任务ID...]}，
+    新订阅的任务会先推送一次当前状态，此后推送每次状态转换
+    """
+    await websocket.accept()
+    async with task_event_hub.subscribe(redis) as subscription:
+        async def receive_commands() -> None:
+            while True:
+                command = await websocket.receive_json()
+                subscribe_ids = [str(task_id) for task_id in command.get("subscribe", [])]
+                subscription.remove(str(task_id) for task_id in command.get("unsubscribe", []))
+                subscription.add(subscribe_ids)
+                # 订阅生效后再读取当前状态，保证不会遗漏中间的状态转换
+                statuses = await task_manager.get_task_statuses(subscribe_ids)
+                for task_result in statuses.values():
+                    if task_result is not None:
+                        subscription.queue.put_nowait(_task_result_event(task_result))
+        
+        receiver = asyncio.ensure_future(receive_commands())
+        try:
+            while True:
+                getter = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {receiver, getter},
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if receiver in done:
+                    getter.cancel()
+                    # 客户端断开时抛出WebSocketDisconnect
+                    receiver.result()
+                    break
+                await websocket.send_json(getter.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+
+
 @router.get("/scheduled-tasks", response_model=ScheduledTaskList)
 async def list_scheduled_tasks() -> ScheduledTaskList:
     """
@@ -113,7 +542,7 @@ async def list_scheduled_tasks() -> ScheduledTaskList:
 @router.delete("/tasks/{task_id}")
 async def cancel_task(
     task_id: str,
-    task_manager: TaskStateManager = Depends(get_task_manager)
+    task_manager: AsyncTaskStateManager = Depends(get_async_task_manager)
 ) -> JSONResponse:
     """
     取消任务
@@ -121,8 +550,10 @@ async def cancel_task(
     - **task_id**: 任务ID
     """
     try:
-        celery_app.control.revoke(task_id, terminate=True)
-        task_manager.clean_task_data(task_id)
+        # revoke会同步发布广播消息，放入线程池避免阻塞事件循环
+        await run_in_threadpool(celery_app.control.revoke, task_id, terminate=True)
+        await task_manager.clean_task_data(task_id)
+        await task_manager.publish_task_event(task_id, TaskStatus.REVOKED)
         return JSONResponse(
             content={"message": f"Task '{task_id}' has been cancelled"},
             status_code=200
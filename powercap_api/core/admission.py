@@ -0,0 +1,215 @@
+"""
+任务提交准入控制模块
+
+提交任务前依次检查：
+1. 队列积压：目标队列的长度超过阈值时拒绝（长度为进程内短时缓存，每个有效期至多读取一次broker）；
+2. 令牌桶限流：按任务类型与客户端各一个令牌桶，每个任务消耗一个令牌，
+   所有桶的检查与扣减在一个Redis脚本中原子完成（单次往返），任一桶不足时都不扣减。
+   访问Redis时每个桶额外预取少量令牌，之后的提交在进程内消耗预取的令牌，不再访问Redis；
+   预取的令牌已从Redis中扣减，不会超过限流，过期未用的令牌作废。
+被拒绝的请求返回429及Retry-After。
+"""
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from redis.asyncio import Redis as AsyncRedis
+
+from celery_app.utils.broker_queues import BrokerQueueCache, broker_queue_cache
+from config.settings import settings
+
+# 令牌桶脚本
+# KEYS: 各令牌桶键
+# ARGV: 每个桶依次为 每秒补充的令牌数, 桶容量, 本次消耗的令牌数, 最多预取的令牌数
+# 返回 {1, 各桶预取的令牌数...} 表示通过（预取数不超过扣除本次消耗后的剩余令牌）；
+# {0, 需等待的秒数, 不足的桶序号} 表示拒绝，等待秒数为-1表示消耗超过桶容量
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local tokens = {}
+local wait, limited = 0, 0
+for index, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[index * 4 - 3])
+    local burst = tonumber(ARGV[index * 4 - 2])
+    local cost = tonumber(ARGV[index * 4 - 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or burst
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(burst, available + elapsed * rate)
+    tokens[index] = available
+    if cost > burst then
+        return {0, '-1', index}
+    end
+    if available < cost and (cost - available) / rate > wait then
+        wait, limited = (cost - available) / rate, index
+    end
+end
+if limited > 0 then
+    return {0, tostring(wait), limited}
+end
+local reply = {1}
+for index, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[index * 4 - 3])
+    local burst = tonumber(ARGV[index * 4 - 2])
+    local remaining = tokens[index] - tonumber(ARGV[index * 4 - 1])
+    local lease = math.max(0, math.min(tonumber(ARGV[index * 4]), math.floor(remaining)))
+    reply[index + 1] = lease
+    redis.call('HSET', key, 'tokens', remaining - lease, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return reply
+"""
+
+# 预取令牌数不超过桶容量的该比例（避免单个进程占用容量较小的桶）
+LEASE_MAX_BURST_FRACTION = 0.1
+# 进程内预取记录超过该数量时清理已过期的记录
+MAX_LEASES = 10000
+
+
+class AdmissionRejected(Exception):
+    """提交被拒绝（限流或队列积压）"""
+    def __init__(self, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """响应头（可重试时包含Retry-After，向上取整到秒）"""
+        if self.retry_after is None:
+            return {}
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class AdmissionController:
+    """任务提交准入控制器"""
+    # 所有令牌桶键使用同一个hash tag，Redis集群模式下可在一个脚本中操作
+    key_prefix = "{rate_limit}:"
+
+    def __init__(self, queue_cache: BrokerQueueCache = broker_queue_cache):
+        self.queue_cache = queue_cache
+        self.rate_limit_enabled = settings.RATE_LIMIT_ENABLED
+        self.task_type_limit = (settings.RATE_LIMIT_TASK_TYPE_RATE, settings.RATE_LIMIT_TASK_TYPE_BURST)
+        self.task_type_overrides = {
+            task_type: (float(rate), float(burst))
+            for task_type, (rate, burst) in settings.RATE_LIMIT_TASK_TYPE_OVERRIDES.items()
+        }
+        self.client_limit = (settings.RATE_LIMIT_CLIENT_RATE, settings.RATE_LIMIT_CLIENT_BURST)
+        self.client_header = settings.RATE_LIMIT_CLIENT_HEADER
+        self.lease_size = settings.RATE_LIMIT_LEASE_SIZE
+        self.lease_ttl = settings.RATE_LIMIT_LEASE_TTL
+        # 进程内预取的令牌：令牌桶键 -> [剩余令牌数, 过期时间(单调时钟)]
+        self._leases: Dict[str, List[float]] = {}
+        self.backlog_limit = settings.QUEUE_BACKLOG_LIMIT
+        self.backlog_limits = settings.QUEUE_BACKLOG_LIMITS
+        self.backlog_retry_after = settings.QUEUE_BACKLOG_RETRY_AFTER
+
+    def _get_task_type_key(self, task_type: str) -> str:
+        """获取任务类型令牌桶键"""
+        return f"{self.key_prefix}task_type:{task_type}"
+
+    def _get_client_key(self, client_id: str) -> str:
+        """获取客户端令牌桶键"""
+        return f"{self.key_prefix}client:{client_id}"
+
+    def _get_lease_size(self, burst: float) -> int:
+        """每次访问Redis时为令牌桶预取的令牌数"""
+        return min(self.lease_size, int(burst * LEASE_MAX_BURST_FRACTION))
+
+    def _leased_tokens(self, key: str, now: float) -> float:
+        """令牌桶在进程内未过期的预取令牌数"""
+        lease = self._leases.get(key)
+        if lease is None or lease[1] <= now:
+            return 0.0
+        return lease[0]
+
+    def _refund(self, buckets: List[Tuple[str, str, Tuple[float, float], int]]) -> None:
+        """退回已在进程内占用的预取令牌"""
+        for _, key, _, cost in buckets:
+            lease = self._leases.get(key)
+            if lease is not None:
+                lease[0] += cost
+
+    def get_backlog_limit(self, queue: str) -> int:
+        """获取队列的积压阈值，0表示不限制"""
+        return self.backlog_limits.get(queue, self.backlog_limit)
+
+    async def check_backlog(self, broker_redis: Any, queues: Iterable[str]) -> None:
+        """目标队列积压超过阈值时拒绝"""
+        queues = [queue for queue in dict.fromkeys(queues) if self.get_backlog_limit(queue) > 0]
+        if not queues:
+            return
+        depths = await self.queue_cache.get_depths(broker_redis, queues)
+        for queue in queues:
+            limit = self.get_backlog_limit(queue)
+            if depths.get(queue, 0) >= limit:
+                raise AdmissionRejected(
+                    f"Queue '{queue}' backlog {depths[queue]} exceeds limit {limit}",
+                    self.backlog_retry_after
+                )
+
+    async def acquire(self, redis: AsyncRedis, client_id: str, task_types: Dict[str, int]) -> None:
+        """按任务类型（每种类型消耗其任务数个令牌）与客户端（消耗任务总数个令牌）扣减令牌，不足时拒绝"""
+        if not self.rate_limit_enabled or not task_types:
+            return
+        buckets: List[Tuple[str, str, Tuple[float, float], int]] = [
+            (
+                f"task type '{task_type}'",
+                self._get_task_type_key(task_type),
+                self.task_type_overrides.get(task_type, self.task_type_limit),
+                count
+            )
+            for task_type, count in task_types.items()
+        ]
+        buckets.append((
+            f"client '{client_id}'",
+            self._get_client_key(client_id),
+            self.client_limit,
+            sum(task_types.values())
+        ))
+        # 预取令牌足够的桶在进程内扣减（在访问Redis前占用，拒绝时退回），其余桶访问Redis
+        now = time.monotonic()
+        local, remote = [], []
+        for bucket in buckets:
+            (local if self._leased_tokens(bucket[1], now) >= bucket[3] else remote).append(bucket)
+        for _, key, _, cost in local:
+            self._leases[key][0] -= cost
+        if not remote:
+            return
+        args: List[Any] = []
+        for _, _, (rate, burst), cost in remote:
+            args.extend([rate, burst, cost, self._get_lease_size(burst)])
+        try:
+            # 注册脚本只计算摘要，执行时为单次EVALSHA往返
+            script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+            reply = await script(keys=[key for _, key, _, _ in remote], args=args)
+        except BaseException:
+            self._refund(local)
+            raise
+        if int(reply[0]) != 1:
+            self._refund(local)
+            wait, name = float(reply[1]), remote[int(reply[2]) - 1][0]
+            if wait < 0:
+                raise AdmissionRejected(f"Request exceeds the burst limit of {name}")
+            raise AdmissionRejected(f"Rate limit exceeded for {name}", wait)
+        now = time.monotonic()
+        if len(self._leases) > MAX_LEASES:
+            self._leases = {key: lease for key, lease in self._leases.items() if lease[1] > now}
+        for (_, key, _, _), lease in zip(remote, reply[1:]):
+            self._leases[key] = [self._leased_tokens(key, now) + float(lease), now + self.lease_ttl]
+
+    async def admit(
+        self,
+        redis: AsyncRedis,
+        broker_redis: Any,
+        client_id: str,
+        task_types: Dict[str, int],
+        queues: Iterable[str]
+    ) -> None:
+        """检查队列积压并扣减令牌，拒绝时抛出AdmissionRejected"""
+        await self.check_backlog(broker_redis, queues)
+        await self.acquire(redis, client_id, task_types)
+
+
+# 全局准入控制器实例
+admission_controller = AdmissionController()
@@ -14,6 +14,7 @@ class Settings(BaseSettings):
     project_name: str = Field(default="PowerCapFastAPI", env="PROJECT_NAME")
     debug: bool = Field(default=False, env="DEBUG")
     port: int = Field(default=8000, env="PORT")
+    task_batch_max_size: int = Field(default=10000, env="TASK_BATCH_MAX_SIZE")  # 单次批量提交的最大任务数
     
     # Redis配置
     redis_host: str = Field(default="localhost", env="REDIS_HOST")
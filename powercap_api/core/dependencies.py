@@ -1 +1,71 @@
- 
\ No newline at end of file
+"""
+FastAPI依赖注入模块
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from fastapi import Depends, FastAPI
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from celery_app.utils.payload_store import AsyncPayloadStore
+from celery_app.utils.redis_conn import AsyncRedisClient, RedisClient
+from celery_app.utils.task_utils import (AsyncTaskStateManager,
+                                        TaskStateManager, task_state_manager)
+from powercap_api.core.task_events import task_event_hub
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    应用生命周期
+    
+    启动时创建共享的异步Redis连接池，关闭时停止任务事件分发并释放连接池。
+    由 powercap_api.main.create_app 注册到应用。
+    """
+    AsyncRedisClient.get_instance()
+    try:
+        yield
+    finally:
+        await task_event_hub.close()
+        await AsyncRedisClient.close()
+
+
+def get_redis_client() -> Redis:
+    """获取同步Redis客户端"""
+    return RedisClient.get_instance()
+
+
+def get_async_redis_client() -> AsyncRedis:
+    """获取共享连接池上的异步Redis客户端"""
+    return AsyncRedisClient.get_instance()
+
+
+def get_async_binary_redis_client() -> AsyncRedis:
+    """获取不解码响应的异步Redis客户端（用于读取二进制任务结果）"""
+    return AsyncRedisClient.get_binary_instance()
+
+
+def get_async_broker_redis_client() -> Any:
+    """获取Celery broker的异步Redis客户端（单机或集群，用于读取队列长度）"""
+    return AsyncRedisClient.get_broker_instance()
+
+
+def get_task_manager() -> TaskStateManager:
+    """获取同步任务状态管理器"""
+    return task_state_manager
+
+
+def get_async_task_manager(
+    redis: AsyncRedis = Depends(get_async_redis_client),
+    binary_redis: AsyncRedis = Depends(get_async_binary_redis_client)
+) -> AsyncTaskStateManager:
+    """获取异步任务状态管理器"""
+    return AsyncTaskStateManager(redis, binary_redis)
+
+
+def get_async_payload_store(
+    binary_redis: AsyncRedis = Depends(get_async_binary_redis_client)
+) -> AsyncPayloadStore:
+    """获取异步参数存储"""
+    return AsyncPayloadStore(binary_redis)
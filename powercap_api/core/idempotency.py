@@ -0,0 +1,118 @@
+"""
+任务提交幂等模块
+
+客户端超时重试会重复提交同一任务（重量级ETL任务因此重复执行）。提交时按以下键去重：
+1. 请求头中的幂等键（Idempotency-Key），按客户端隔离；
+2. 未提供幂等键时，对配置的任务类型按 task_type + params 的内容摘要去重（有效期较短）。
+首次提交通过 SET NX 原子地将键映射到预先生成的任务ID，重复提交直接返回首次提交的响应，不再发布任务；
+首次提交被拒绝或发布失败时释放该键，客户端可重试。
+发布中的键只保留较短的有效期（IDEMPOTENCY_CLAIM_TTL），任务发布后再延长为完整有效期：
+API进程在占用与发布之间退出时，键很快失效，不会在完整有效期内指向一个从未发布的任务。
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from celery.utils import uuid
+from redis.asyncio import Redis as AsyncRedis
+
+from config.settings import settings
+
+# 幂等键的最大长度
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """幂等键已用于内容不同的请求"""
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class IdempotencyStore:
+    """任务提交幂等键存储"""
+    key_prefix = "idempotency:"
+
+    def __init__(self):
+        self.header = settings.IDEMPOTENCY_HEADER
+        self.key_ttl = settings.IDEMPOTENCY_KEY_TTL
+        self.content_hash_task_types = set(settings.IDEMPOTENCY_CONTENT_HASH_TASK_TYPES)
+        self.content_hash_ttl = settings.IDEMPOTENCY_CONTENT_HASH_TTL
+        self.claim_ttl = settings.IDEMPOTENCY_CLAIM_TTL
+
+    @staticmethod
+    def fingerprint(task_type: str, params: Dict[str, Any]) -> str:
+        """请求内容摘要（参数按键排序后编码，与参数顺序无关）"""
+        content = json.dumps(
+            {"task_type": task_type, "params": params},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get_key(
+        self,
+        client_id: str,
+        idempotency_key: Optional[str],
+        task_type: str,
+        params: Dict[str, Any]
+    ) -> Optional[Tuple[str, int, str]]:
+        """获取去重键、有效期（秒）与请求内容摘要，不去重时为None"""
+        if idempotency_key:
+            if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                raise ValueError(
+                    f"{self.header} exceeds {MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+                )
+            key = f"{self.key_prefix}key:{client_id}:{idempotency_key}"
+            return key, self.key_ttl, self.fingerprint(task_type, params)
+        if task_type in self.content_hash_task_types:
+            fingerprint = self.fingerprint(task_type, params)
+            return f"{self.key_prefix}content:{client_id}:{fingerprint}", self.content_hash_ttl, fingerprint
+        return None
+
+    async def claim(
+        self,
+        redis: AsyncRedis,
+        key: str,
+        fingerprint: str
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        占用去重键（有效期为claim_ttl，发布后由complete延长）
+
+        返回 (True, 新记录) 表示首次提交，应使用记录中的任务ID发布任务；
+        返回 (False, 已有记录) 表示重复提交，记录中包含首次提交的任务ID及其响应（首次提交仍在发布时无响应）。
+        """
+        record = {"task_id": uuid(), "fingerprint": fingerprint}
+        while True:
+            if await redis.set(key, json.dumps(record), nx=True, ex=self.claim_ttl):
+                return True, record
+            existing = await redis.get(key)
+            # 读取前键恰好过期时重新占用
+            if existing is None:
+                continue
+            existing = json.loads(existing)
+            if existing["fingerprint"] != fingerprint:
+                raise IdempotencyConflict(
+                    f"{self.header} was already used for a different request"
+                )
+            return False, existing
+
+    async def complete(
+        self,
+        redis: AsyncRedis,
+        key: str,
+        ttl: int,
+        record: Dict[str, Any],
+        response: Dict[str, Any]
+    ) -> None:
+        """任务发布后保存首次提交的响应，并将有效期延长为ttl（幂等键或内容摘要去重的有效期）"""
+        await redis.set(key, json.dumps({**record, "response": response}), xx=True, ex=ttl)
+
+    async def release(self, redis: AsyncRedis, key: str) -> None:
+        """首次提交未发布任务时释放去重键"""
+        await redis.delete(key)
+
+
+# 全局幂等键存储实例
+idempotency_store = IdempotencyStore()
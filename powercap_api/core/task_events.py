@@ -0,0 +1,125 @@
+"""
+任务事件分发模块
+
+每个API进程只维护一条Redis订阅连接（模式订阅全部任务事件频道），
+再按任务ID分发给本进程内的SSE/WebSocket订阅者，连接数与客户端数量无关。
+"""
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from celery_app.utils.task_utils import BaseTaskStateManager
+
+
+class TaskEventSubscription:
+    """任务事件订阅（可动态增减订阅的任务ID）"""
+    def __init__(self, hub: "TaskEventHub"):
+        self._hub = hub
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self.task_ids: Set[str] = set()
+
+    def add(self, task_ids: Iterable[str]) -> None:
+        """订阅任务"""
+        for task_id in task_ids:
+            self.task_ids.add(task_id)
+            self._hub._subscribers[task_id].add(self.queue)
+
+    def remove(self, task_ids: Iterable[str]) -> None:
+        """取消订阅任务"""
+        for task_id in task_ids:
+            self.task_ids.discard(task_id)
+            queues = self._hub._subscribers.get(task_id)
+            if queues is not None:
+                queues.discard(self.queue)
+                if not queues:
+                    del self._hub._subscribers[task_id]
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """获取下一个事件，超时返回None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TaskEventHub:
+    """任务事件分发中心"""
+    # 订阅连接断开后的重连间隔（秒）
+    reconnect_delay: float = 1.0
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set["asyncio.Queue[Dict[str, Any]]"]] = defaultdict(set)
+        self._reader: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._pattern = f"{BaseTaskStateManager.task_event_channel_prefix}*"
+
+    async def _read_events(self, redis: AsyncRedis) -> None:
+        """读取Redis事件并分发给本地订阅者"""
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.psubscribe(self._pattern)
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    event = json.loads(message["data"])
+                    for queue in list(self._subscribers.get(event["task_id"], ())):
+                        queue.put_nowait(event)
+            except RedisConnectionError:
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                await pubsub.aclose()
+
+    async def _ensure_started(self, redis: AsyncRedis) -> None:
+        """按需启动事件读取任务，并等待订阅就绪"""
+        if self._reader is None or self._reader.done():
+            self._ready = asyncio.Event()
+            self._reader = asyncio.create_task(self._read_events(redis))
+        if self._ready.is_set():
+            return
+
+        ready = asyncio.ensure_future(self._ready.wait())
+        await asyncio.wait({ready, self._reader}, return_when=asyncio.FIRST_COMPLETED)
+        if not self._ready.is_set():
+            # 读取任务在订阅就绪前异常退出，将异常抛给调用方
+            ready.cancel()
+            self._reader.result()
+
+    @asynccontextmanager
+    async def subscribe(
+        self,
+        redis: AsyncRedis,
+        task_ids: Iterable[str] = ()
+    ) -> AsyncIterator[TaskEventSubscription]:
+        """
+        创建订阅
+
+        返回前Redis订阅已就绪，此后再读取的任务当前状态不会与事件流之间产生遗漏。
+        """
+        await self._ensure_started(redis)
+        subscription = TaskEventSubscription(self)
+        subscription.add(task_ids)
+        try:
+            yield subscription
+        finally:
+            subscription.remove(list(subscription.task_ids))
+
+    async def close(self) -> None:
+        """停止事件读取任务"""
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+
+
+# 全局任务事件分发中心实例
+task_event_hub = TaskEventHub()
@@ -0,0 +1,31 @@
+"""
+FastAPI应用入口模块
+"""
+from typing import Dict
+
+from fastapi import FastAPI
+
+from powercap_api.api.v1 import status_api, task_api
+from powercap_api.core.config import settings
+from powercap_api.core.dependencies import lifespan
+
+
+def create_app() -> FastAPI:
+    """创建FastAPI应用（生命周期内共享异步Redis连接池，关闭时释放）"""
+    application = FastAPI(
+        title=settings.project_name,
+        debug=settings.debug,
+        lifespan=lifespan
+    )
+    application.include_router(task_api.router, prefix=settings.api_v1_prefix, tags=["tasks"])
+    application.include_router(status_api.router, prefix=settings.api_v1_prefix, tags=["status"])
+
+    @application.get("/")
+    async def root() -> Dict[str, str]:
+        """根路由"""
+        return {"message": f"{settings.project_name} is running"}
+
+    return application
+
+
+app = create_app()
@@ -4,7 +4,7 @@
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 from celery_app.utils.task_utils import TaskStatus
 
@@ -17,11 +17,46 @@ class TaskBase(BaseModel):
 
 class TaskCreate(TaskBase):
     """任务创建模型"""
-    queue: Optional[str] = Field(default="default", description="任务队列")
+    queue: Optional[str] = Field(default=None, description="任务队列，默认按路由表选择")
+    priority: Optional[int] = Field(default=None, ge=0, le=9, description="任务优先级(0最高, 9最低)，默认按路由表选择")
     countdown: Optional[int] = Field(default=None, description="任务延迟执行时间（秒）")
     eta: Optional[datetime] = Field(default=None, description="任务计划执行时间")
 
 
+class TaskBatchCreate(BaseModel):
+    """批量任务创建模型（tasks 与 task_type + params_list 二选一）"""
+    tasks: List[TaskCreate] = Field(default_factory=list, description="任务列表")
+    task_type: Optional[str] = Field(default=None, description="任务类型，与params_list配合使用")
+    params_list: List[Dict[str, Any]] = Field(default_factory=list, description="同一任务类型的多组任务参数")
+    queue: Optional[str] = Field(default=None, description="params_list模式下的任务队列，默认按路由表选择")
+    priority: Optional[int] = Field(default=None, ge=0, le=9, description="params_list模式下的任务优先级，默认按路由表选择")
+    countdown: Optional[int] = Field(default=None, description="params_list模式下的任务延迟执行时间（秒）")
+    eta: Optional[datetime] = Field(default=None, description="params_list模式下的任务计划执行时间")
+
+    @model_validator(mode="after")
+    def check_mode(self) -> "TaskBatchCreate":
+        """校验只使用一种批量方式"""
+        if bool(self.tasks) == bool(self.task_type):
+            raise ValueError("Provide either 'tasks' or 'task_type' with 'params_list'")
+        return self
+
+    def expand(self) -> List[TaskCreate]:
+        """展开为任务创建模型列表"""
+        if self.tasks:
+            return self.tasks
+        return [
+            TaskCreate(
+                task_type=self.task_type,
+                params=params,
+                queue=self.queue,
+                priority=self.priority,
+                countdown=self.countdown,
+                eta=self.eta
+            )
+            for params in self.params_list
+        ]
+
+
 class TaskResponse(TaskBase):
     """任务响应模型"""
     task_id: str = Field(..., description="任务ID")
@@ -34,14 +69,31 @@ class TaskResponse(TaskBase):
     runtime: Optional[float] = Field(default=None, description="运行时间（秒）")
 
 
+class TaskBatchResponse(BaseModel):
+    """批量任务创建响应模型"""
+    task_ids: List[str] = Field(..., description="任务ID列表（与提交顺序一致）")
+    count: int = Field(..., description="已提交的任务数")
+
+
 class TaskStatusResponse(BaseModel):
-    """任务状态响应模型"""
+    """任务状态响应模型（结果本身通过 GET /tasks/{task_id}/result 获取）"""
     task_id: str = Field(..., description="任务ID")
     status: TaskStatus = Field(..., description="任务状态")
-    result: Optional[Any] = Field(default=None, description="任务结果")
+    result_size: Optional[int] = Field(default=None, description="任务结果编码后的字节数")
     error: Optional[str] = Field(default=None, description="错误信息")
 
 
+class TaskStatusBatchRequest(BaseModel):
+    """批量任务状态查询请求模型"""
+    task_ids: List[str] = Field(..., description="任务ID列表")
+
+
+class TaskStatusBatchResponse(BaseModel):
+    """批量任务状态查询响应模型"""
+    tasks: List[TaskStatusResponse] = Field(..., description="已找到的任务状态（按请求顺序）")
+    not_found: List[str] = Field(default_factory=list, description="未找到的任务ID")
+
+
 class ScheduledTaskInfo(BaseModel):
     """定时任务信息模型"""
     name: str = Field(..., description="任务名称")
@@ -53,4 +105,11 @@ class ScheduledTaskInfo(BaseModel):
 
 class ScheduledTaskList(BaseModel):
     """定时任务列表模型"""
-    tasks: List[ScheduledTaskInfo] = Field(..., description="定时任务列表") 
\ No newline at end of file
+    tasks: List[ScheduledTaskInfo] = Field(..., description="定时任务列表")
+
+
+class PayloadResponse(BaseModel):
+    """参数上传响应模型"""
+    payload: Dict[str, Any] = Field(..., description="参数引用，可直接作为任务参数的值")
+    rows: int = Field(..., description="记录数")
+    size: int = Field(..., description="编码后的字节数")
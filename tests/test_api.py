@@ -1,14 +1,30 @@
 """
 API测试模块
 """
+import json
+import os
+import time
+import uuid
 from typing import Any, Dict, Generator
 
 import pytest
 from fastapi.testclient import TestClient
 from redis import Redis
+from redis.exceptions import RedisError
 
+from celery_app.event_consumer import LatencyEventConsumer
 from celery_app.task_registry import app as celery_app
-from celery_app.utils.redis_conn import RedisClient
+from celery_app.tasks.core_tasks import TransformTask
+from celery_app.utils.broker_queues import BrokerQueueCache, broker_queue_cache
+from celery_app.utils.payload_store import PayloadStore
+from celery_app.utils.redis_conn import AsyncRedisClient, RedisClient
+from celery_app.utils.step_cache import step_cache
+from celery_app.utils.task_timing import SENT_AT_HEADER
+from celery_app.utils.task_utils import TaskStatus, task_state_manager
+from celery_app.utils.worker_registry import WorkerRegistry
+from config.settings import settings
+from powercap_api.core.admission import admission_controller
+from powercap_api.core.idempotency import idempotency_store
 from powercap_api.main import app
 
 
@@ -47,6 +63,13 @@ def test_root(client: TestClient) -> None:
     assert "message" in response.json()
 
 
+def test_lifespan_manages_redis_pool() -> None:
+    """测试应用启动时创建共享的异步Redis连接池，关闭时释放"""
+    with TestClient(app):
+        assert AsyncRedisClient._instance is not None
+    assert AsyncRedisClient._instance is None
+
+
 def test_health_check(
     client: TestClient,
     redis_client: Redis,
@@ -162,4 +185,461 @@ def test_cancel_task(
     assert response.status_code == 200
     data = response.json()
     assert "message" in data
-    assert task_id in data["message"] 
\ No newline at end of file
+    assert task_id in data["message"] 
+
+def test_get_task_statuses_batch(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试批量获取任务状态接口"""
+    task_data = {
+        "task_type": "data_process_task",
+        "params": {
+            "data": [{"id": 1, "value": "test"}]
+        }
+    }
+    task_id = client.post("/api/v1/tasks/run", json=task_data).json()["task_id"]
+    
+    response = client.post(
+        "/api/v1/tasks/status:batch",
+        json={"task_ids": [task_id, "missing-task-id"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [task["task_id"] for task in data["tasks"]] == [task_id]
+    assert data["not_found"] == ["missing-task-id"]
+
+
+def test_stream_task_events(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试任务事件SSE接口"""
+    task_id = "test-sse-task-id"
+    task_state_manager.update_task_status(task_id, TaskStatus.STARTED)
+    task_state_manager.update_task_status(task_id, TaskStatus.SUCCESS, result="done")
+    
+    # 任务已处于终态，推送当前状态后立即关闭事件流
+    with client.stream("GET", f"/api/v1/tasks/{task_id}/events") as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line[len("data: "):])
+            for line in response.iter_lines()
+            if line.startswith("data: ")
+        ]
+    
+    assert len(events) == 1
+    assert events[0]["task_id"] == task_id
+    assert events[0]["status"] == "SUCCESS"
+
+
+def test_task_events_websocket(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试任务事件WebSocket接口"""
+    task_id = "test-ws-task-id"
+    task_state_manager.update_task_status(task_id, TaskStatus.STARTED)
+    
+    with client.websocket_connect("/api/v1/tasks/events/ws") as websocket:
+        websocket.send_json({"subscribe": [task_id]})
+        assert websocket.receive_json()["status"] == "STARTED"
+        
+        task_state_manager.update_task_status(task_id, TaskStatus.SUCCESS, result="done")
+        event = websocket.receive_json()
+        assert event["task_id"] == task_id
+        assert event["status"] == "SUCCESS"
+        assert "runtime" in event
+
+
+def test_get_task_result(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试任务结果下载接口"""
+    task_id = "test-result-task-id"
+    result = {"items": [{"id": i, "value": f"value{i}"} for i in range(100)]}
+    task_state_manager.update_task_status(task_id, TaskStatus.SUCCESS, result=result)
+    
+    status = client.get(f"/api/v1/tasks/{task_id}").json()
+    assert status["result_size"] > 0
+    assert "result" not in status
+    
+    response = client.get(f"/api/v1/tasks/{task_id}/result", params={"format": "json"})
+    assert response.status_code == 200
+    assert response.json() == result
+    
+    response = client.get(f"/api/v1/tasks/{task_id}/result")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.msgpack"
+    assert int(response.headers["content-length"]) == status["result_size"]
+    
+    response = client.get("/api/v1/tasks/missing-task-id/result")
+    assert response.status_code == 404
+    
+    # 分块结果流式返回，不预先声明Content-Length；分块已过期时在发送响应头前返回404
+    result = [{"id": i, "value": os.urandom(16).hex()} for i in range(20000)]
+    task_state_manager.update_task_status(task_id, TaskStatus.SUCCESS, result=result)
+    response = client.get(f"/api/v1/tasks/{task_id}/result")
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    assert response.num_bytes_downloaded == client.get(f"/api/v1/tasks/{task_id}").json()["result_size"]
+    assert client.get(f"/api/v1/tasks/{task_id}/result", params={"format": "json"}).json() == result
+    
+    redis_client.delete(task_state_manager._get_task_result_key(task_id))
+    response = client.get(f"/api/v1/tasks/{task_id}/result")
+    assert response.status_code == 404
+    task_state_manager.clean_task_data(task_id)
+    
+    # hash tag上线前写入的旧键回退读取
+    task_key, meta_key, result_key = task_state_manager._get_legacy_task_keys(task_id)
+    redis_client.hset(task_key, "status", "SUCCESS")
+    redis_client.hset(meta_key, mapping={"result_encoding": "msgpack", "result_size": 1, "result_chunks": 1})
+    task_state_manager.binary_redis.rpush(result_key, b"\x07")
+    assert client.get(f"/api/v1/tasks/{task_id}").json()["status"] == "SUCCESS"
+    assert client.get(f"/api/v1/tasks/{task_id}/result", params={"format": "json"}).json() == 7
+    task_state_manager.clean_task_data(task_id)
+
+
+def test_run_tasks_batch(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试批量运行任务接口"""
+    batch_data = {
+        "task_type": "data_validation_task",
+        "params_list": [
+            {"data": [{"id": i, "value": f"test{i}"}]}
+            for i in range(3)
+        ]
+    }
+    
+    response = client.post("/api/v1/tasks/run:batch", json=batch_data)
+    assert response.status_code == 202
+    data = response.json()
+    assert data["count"] == 3
+    assert len(set(data["task_ids"])) == 3
+    
+    response = client.post(
+        "/api/v1/tasks/run:batch",
+        json={"tasks": [{"task_type": "missing_task"}]}
+    )
+    assert response.status_code == 404
+
+
+def test_upload_payload(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any,
+    monkeypatch: Any
+) -> None:
+    """测试NDJSON上传参数并以引用运行任务"""
+    # 切分为多个数据块，worker按多个LRANGE窗口读取
+    monkeypatch.setattr(settings, "PAYLOAD_UPLOAD_CHUNK_ROWS", 5)
+    monkeypatch.setattr(PayloadStore, "read_window_chunks", 4)
+    lines = [json.dumps({"id": i, "value": f"value{i}"}) for i in range(25)]
+    lines.insert(3, "")
+    lines.append(json.dumps({"id": 25}))
+    response = client.post(
+        "/api/v1/payloads",
+        content="\n".join(lines).encode(),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["rows"] == 26
+    assert data["payload"]["__payload__"]["chunks"] == 6
+    assert data["size"] > 0
+    
+    response = client.post("/api/v1/tasks/run", json={
+        "task_type": "data_validation_task",
+        "params": {"data": data["payload"]}
+    })
+    assert response.status_code == 202
+    task_id = response.json()["task_id"]
+    result = client.get(f"/api/v1/tasks/{task_id}/result", params={"format": "json"}).json()
+    assert result["valid_count"] == 25
+    assert result["invalid_count"] == 1
+    
+    # 只接受本部署写入的引用：伪造的ID与未写入的ID均返回400
+    forged = {"__payload__": {**data["payload"]["__payload__"], "id": "../../etc/passwd"}}
+    unknown = {"__payload__": {**data["payload"]["__payload__"], "id": uuid.uuid4().hex}}
+    for ref in (forged, unknown):
+        response = client.post("/api/v1/tasks/run", json={
+            "task_type": "data_validation_task",
+            "params": {"data": ref}
+        })
+        assert response.status_code == 400
+    
+    response = client.post("/api/v1/payloads", content=b'{"id": 1}\n[1, 2]\n')
+    assert response.status_code == 400
+    
+    # 单行超过长度上限（包括没有换行符的行）时返回413
+    monkeypatch.setattr(settings, "PAYLOAD_UPLOAD_MAX_LINE_BYTES", 64)
+    response = client.post("/api/v1/payloads", content=b'{"id": 1}\n{"value": "' + b"x" * 100)
+    assert response.status_code == 413
+
+
+def test_stats_from_worker_registry(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试健康检查与统计信息读取worker心跳注册表"""
+    registry = WorkerRegistry()
+    registry.heartbeat("celery@test-worker", {"hostname": "celery@test-worker", "active": 2})
+    
+    stats = client.get("/api/v1/stats").json()
+    assert stats["total_workers"] == 1
+    assert stats["active_tasks"] == 2
+    assert client.get("/api/v1/health").json()["celery"] == "ok"
+    
+    registry.remove("celery@test-worker")
+    assert client.get("/api/v1/health").json()["celery"] == "no_workers"
+
+
+def test_latency_metrics(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试事件流延迟统计与Prometheus导出"""
+    consumer = LatencyEventConsumer(celery_app)
+    now = time.time()
+    for i in range(100):
+        task_id = f"latency-task-{i}"
+        consumer.on_task_sent({
+            "uuid": task_id, "name": "data_process_task", "queue": "celery", "timestamp": now
+        })
+        consumer.on_task_received({"uuid": task_id, "name": "data_process_task", "timestamp": now + 0.5})
+        consumer.on_task_started({"uuid": task_id, "timestamp": now + 1.0})
+        consumer.on_task_finished({"uuid": task_id, "runtime": (i + 1) / 100, "timestamp": now + 2.0})
+    
+    stats = client.get("/api/v1/stats/latency", params={"window": 5}).json()
+    series = {item["metric"]: item for item in stats["series"] if item["task"] == "data_process_task"}
+    assert series["queue_wait"]["count"] == 100
+    assert series["queue_wait"]["queue"] == "celery"
+    assert series["queue_wait"]["p50"] == pytest.approx(1.0, rel=0.025)
+    assert series["run_time"]["p99"] == pytest.approx(0.99, rel=0.025)
+    assert series["end_to_end"]["p95"] == pytest.approx(2.0, rel=0.025)
+    
+    response = client.get("/api/v1/metrics")
+    assert response.status_code == 200
+    assert "# TYPE powercap_task_run_seconds histogram" in response.text
+    labels = 'task="data_process_task",queue="celery"'
+    lines = dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+    # 直方图桶边界与Prometheus桶上界不对齐，累计数允许相对误差范围内的偏差
+    assert 47 <= int(lines[f'powercap_task_run_seconds_bucket{{{labels},le="0.5"}}']) <= 50
+    assert f'powercap_task_run_seconds_count{{{labels}}} 100' in response.text
+
+
+def test_step_cache_stats(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试工作流步骤缓存统计接口"""
+    step_cache.clear()
+    task = TransformTask()
+    kwargs = {"data": [{"id": 1, "value": "cached"}]}
+    key, _ = step_cache.lookup(task, (), kwargs)
+    step_cache.store(key, [{"id": 1, "value": "cached", "value_upper": "CACHED"}], 1.5)
+    step_cache.lookup(task, (), kwargs)
+    
+    stats = client.get("/api/v1/stats/step-cache").json()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["saved_seconds"] == pytest.approx(1.5)
+    assert stats["steps"]["transform_task"]["hits"] == 1
+    assert stats["bytes"] > 0
+    
+    metrics = client.get("/api/v1/metrics").text
+    assert 'powercap_step_cache_hits_total{step="transform_task"} 1' in metrics
+    
+    step_cache.clear()
+
+
+def test_run_task_admission_control(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试超过客户端限流或目标队列积压时拒绝提交（429 + Retry-After）"""
+    client_limit, queue_cache = admission_controller.client_limit, admission_controller.queue_cache
+    backlog_limits = admission_controller.backlog_limits
+    admission_controller.client_limit = (0.01, 1)
+    admission_controller.queue_cache = BrokerQueueCache(ttl=0)
+    try:
+        task = {"task_type": "data_validation_task", "params": {"data": []}}
+        headers = {"X-Client-ID": "test-admission-client"}
+        assert client.post("/api/v1/tasks/run", json=task, headers=headers).status_code == 202
+        
+        response = client.post("/api/v1/tasks/run", json=task, headers=headers)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert "client 'test-admission-client'" in response.json()["detail"]
+        
+        # 超过桶容量的批量提交无法通过，不返回Retry-After
+        response = client.post(
+            "/api/v1/tasks/run:batch",
+            json={"task_type": "data_validation_task", "params_list": [{"data": []}] * 2},
+            headers={"X-Client-ID": "test-admission-batch"}
+        )
+        assert response.status_code == 429
+        assert "Retry-After" not in response.headers
+        
+        # 目标队列（按路由表为interactive，含各优先级列表）积压达到阈值
+        admission_controller.backlog_limits = {"interactive": 2}
+        redis_client.rpush("interactive", "message")
+        redis_client.rpush("interactive:6", "message")
+        response = client.post("/api/v1/tasks/run", json=task, headers={"X-Client-ID": "test-backlog"})
+        assert response.status_code == 429
+        assert "Queue 'interactive' backlog 2" in response.json()["detail"]
+        assert response.headers["Retry-After"] == str(admission_controller.backlog_retry_after)
+    finally:
+        admission_controller.client_limit = client_limit
+        admission_controller.queue_cache = queue_cache
+        admission_controller.backlog_limits = backlog_limits
+
+
+def test_rate_limit_token_lease(client: TestClient, redis_client: Redis, celery_app_fixture: Any) -> None:
+    """测试令牌预取：访问Redis时额外预取令牌，之后的提交在进程内消耗，不再访问Redis"""
+    task = {"task_type": "data_validation_task", "params": {"data": []}}
+    headers = {"X-Client-ID": "test-lease-client"}
+    key = admission_controller._get_client_key("test-lease-client")
+    burst = admission_controller.client_limit[1]
+    lease_size = admission_controller._get_lease_size(burst)
+    assert lease_size > 0
+    
+    assert client.post("/api/v1/tasks/run", json=task, headers=headers).status_code == 202
+    tokens = float(redis_client.hget(key, "tokens"))
+    assert tokens <= burst - 1 - lease_size
+    
+    assert client.post("/api/v1/tasks/run", json=task, headers=headers).status_code == 202
+    assert float(redis_client.hget(key, "tokens")) == tokens
+
+
+
+def test_get_queues(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any,
+    monkeypatch: Any
+) -> None:
+    """测试队列积压查询（各优先级消息数与最早消息的等待时间）"""
+    ttl = broker_queue_cache.ttl
+    broker_queue_cache.ttl = 0
+    try:
+        now = time.time()
+        # broker从列表头部写入，尾部为最早的消息
+        for key, sent_at in [("etl", now - 30), ("etl:6", now - 120), ("etl:6", now - 5)]:
+            redis_client.lpush(key, json.dumps({"body": "", "headers": {SENT_AT_HEADER: sent_at}}))
+        redis_client.lpush("etl:9", "message")
+        
+        response = client.get("/api/v1/queues")
+        assert response.status_code == 200
+        queues = response.json()["queues"]
+        assert queues["etl"]["messages"] == 4
+        assert queues["etl"]["messages_by_priority"] == {"0": 1, "6": 2, "9": 1}
+        assert 120 <= queues["etl"]["oldest_message_age"] < 130
+        assert queues["reporting"] == {
+            "messages": 0, "messages_by_priority": {}, "oldest_message_age": None
+        }
+        
+        metrics = client.get("/api/v1/metrics").text
+        assert 'powercap_queue_messages{queue="etl"} 4' in metrics
+        
+        # broker不可用时省略队列积压，其余指标照常返回
+        async def broker_down(*args: Any, **kwargs: Any) -> Any:
+            raise RedisError("broker unavailable")
+        
+        monkeypatch.setattr(broker_queue_cache, "get_stats", broker_down)
+        response = client.get("/api/v1/metrics")
+        assert response.status_code == 200
+        assert "powercap_step_cache_bytes" in response.text
+        assert "powercap_queue_messages" not in response.text
+    finally:
+        broker_queue_cache.ttl = ttl
+
+
+def test_run_task_idempotency(
+    client: TestClient,
+    redis_client: Redis,
+    celery_app_fixture: Any
+) -> None:
+    """测试相同幂等键或相同内容重复提交时只发布一次任务"""
+    celery_task = celery_app.tasks["data_validation_task"]
+    published = []
+    apply_async = celery_task.apply_async
+    
+    def record_apply_async(*args: Any, **kwargs: Any) -> Any:
+        published.append(kwargs["task_id"])
+        return apply_async(*args, **kwargs)
+    
+    celery_task.apply_async = record_apply_async
+    content_hash_task_types = idempotency_store.content_hash_task_types
+    try:
+        task = {"task_type": "data_validation_task", "params": {"data": [{"id": 1, "value": "a"}]}}
+        headers = {"X-Client-ID": "test-idempotency", "Idempotency-Key": "order-1"}
+        first = client.post("/api/v1/tasks/run", json=task, headers=headers)
+        assert first.status_code == 202
+        assert "Idempotent-Replayed" not in first.headers
+        
+        retry = client.post("/api/v1/tasks/run", json=task, headers=headers)
+        assert retry.status_code == 202
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert retry.json() == first.json()
+        assert published == [first.json()["task_id"]]
+        # 发布后去重键延长为完整有效期
+        key = "idempotency:key:test-idempotency:order-1"
+        assert redis_client.ttl(key) > idempotency_store.claim_ttl
+        
+        # 占用后未完成（API进程在发布后退出）时去重键只保留较短的有效期
+        complete = idempotency_store.complete
+        
+        async def skip_complete(*args: Any, **kwargs: Any) -> None:
+            return None
+        
+        idempotency_store.complete = skip_complete
+        try:
+            client.post("/api/v1/tasks/run", json=task, headers={**headers, "Idempotency-Key": "order-2"})
+        finally:
+            del idempotency_store.complete
+        assert idempotency_store.complete == complete
+        assert 0 < redis_client.ttl("idempotency:key:test-idempotency:order-2") <= idempotency_store.claim_ttl
+        
+        # 未知任务类型返回404（不占用去重键）
+        missing = client.post("/api/v1/tasks/run", json={**task, "task_type": "missing_task"}, headers=headers)
+        assert missing.status_code == 404
+        
+        # 幂等键按客户端隔离
+        other = client.post("/api/v1/tasks/run", json=task, headers={**headers, "X-Client-ID": "other-client"})
+        assert other.json()["task_id"] != first.json()["task_id"]
+        
+        # 同一幂等键用于内容不同的请求
+        changed = {**task, "params": {"data": []}}
+        assert client.post("/api/v1/tasks/run", json=changed, headers=headers).status_code == 422
+        
+        # 未提供幂等键时按内容去重（参数顺序无关）
+        idempotency_store.content_hash_task_types = {"data_validation_task"}
+        published.clear()
+        client_headers = {"X-Client-ID": "test-content-hash"}
+        params = {"data": [], "source": "a", "target": "b"}
+        first = client.post(
+            "/api/v1/tasks/run", json={**task, "params": params}, headers=client_headers
+        )
+        retry = client.post(
+            "/api/v1/tasks/run",
+            json={**task, "params": dict(reversed(list(params.items())))},
+            headers=client_headers
+        )
+        assert retry.json()["task_id"] == first.json()["task_id"]
+        assert len(published) == 1
+    finally:
+        del celery_task.apply_async
+        idempotency_store.content_hash_task_types = content_hash_task_types
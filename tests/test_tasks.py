@@ -2,15 +2,37 @@
 任务测试模块
 """
 import asyncio
-from typing import Any, Dict, Generator
+import os
+from datetime import datetime
+from typing import Any, Dict, Generator, List
 
 import pytest
+from celery import states
+from celery.exceptions import Retry
 from celery.result import AsyncResult
+from kombu.serialization import dumps, loads
 
 from celery_app.task_registry import app as celery_app
+from celery_app.tasks.base_task import BaseTask, CompositeTask, WorkflowTask
 from celery_app.tasks.core_tasks import (DataPipelineTask, DataProcessTask,
-                                       DataValidationTask, ETLWorkflowTask)
-from celery_app.utils.task_utils import TaskStateManager, task_state_manager
+                                       DataValidationTask,
+                                       DistributedETLWorkflowTask,
+                                       ETLWorkflowTask, LoadTask,
+                                       StreamingETLWorkflowTask, TransformTask)
+from celery_app.utils.async_runner import async_runner
+from celery_app.utils.columnar import ColumnBatch
+from celery_app.utils.payload_store import (PAYLOAD_REF_KEY,
+                                            InvalidPayloadRef, PayloadStore,
+                                            is_payload_ref, payload_store)
+from celery_app.utils.result_codec import encode_result
+from celery_app.utils.step_cache import MISS, step_cache
+from celery_app.utils.task_timing import CounterTimingSink, task_timer
+from celery_app.utils.task_utils import (TaskStateManager, TaskStatus,
+                                        task_state_manager)
+from celery_app.utils.workflow_checkpoint import workflow_checkpoints
+from config.celery import (PRIORITY_HIGH, PRIORITY_LOW, get_task_route,
+                           get_worker_settings)
+from config.settings import settings
 
 
 @pytest.fixture
@@ -101,12 +123,24 @@ async def test_data_pipeline_task(celery_app_fixture: Any) -> None:
 
 
 @pytest.mark.asyncio
-async def test_etl_workflow_task(celery_app_fixture: Any) -> None:
+async def test_etl_workflow_task(celery_app_fixture: Any, monkeypatch: Any) -> None:
     """测试ETL工作流任务"""
+    conversions = []
+    from_records = ColumnBatch.from_records.__func__
+    
+    def counting_from_records(cls: Any, records: Any) -> ColumnBatch:
+        conversions.append(len(records))
+        return from_records(cls, records)
+    
+    monkeypatch.setattr(ColumnBatch, "from_records", classmethod(counting_from_records))
+    
     # 创建并执行任务
     task = ETLWorkflowTask()
     results = await task.run(source="test_source", target="test_target")
     
+    # 提取的记录列表只在传入转换步骤时转换一次，下游步骤按列处理
+    assert conversions == [3]
+    
     # 验证工作流步骤
     assert "extract" in results
     assert "transform" in results
@@ -133,6 +167,9 @@ async def test_etl_workflow_task(celery_app_fixture: Any) -> None:
     validation_result = results["validate"]
     assert validation_result["valid_count"] == len(transformed_data)
     assert validation_result["invalid_count"] == 0
+    
+    # 命中步骤缓存时结果格式不变
+    assert (await task.run(source="test_source", target="test_target"))["transform"] == transformed_data
 
 
 @pytest.mark.asyncio
@@ -163,9 +200,673 @@ async def test_task_state_management(
     final_status = task_manager.get_task_status(task_id)
     assert final_status is not None
     assert final_status.status == "SUCCESS"
-    assert final_status.result == str(result)
+    assert final_status.result_size is not None
+    assert task_manager.get_task_result(task_id) == result
+    assert final_status.runtime is not None
+    assert final_status.runtime >= 0.1
     
     # 清理任务数据
     task_manager.clean_task_data(task_id)
     cleaned_status = task_manager.get_task_status(task_id)
-    assert cleaned_status is None 
\ No newline at end of file
+    assert cleaned_status is None 
+
+class SleepTask(BaseTask):
+    """测试用延时任务"""
+    name = "test_sleep_task"
+    
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+    
+    async def run(self, **kwargs: Any) -> float:
+        await asyncio.sleep(self.delay)
+        return asyncio.get_running_loop().time()
+
+
+class FanOutWorkflowTask(WorkflowTask):
+    """测试用扇出工作流"""
+    name = "test_fan_out_workflow_task"
+
+
+@pytest.mark.asyncio
+async def test_workflow_runs_independent_steps_concurrently(celery_app_fixture: Any) -> None:
+    """测试工作流并发执行互不依赖的步骤"""
+    workflow = FanOutWorkflowTask()
+    workflow.add_step("root", SleepTask(0.1))
+    for i in range(5):
+        workflow.add_step(f"branch_{i}", SleepTask(0.2), depends_on=["root"])
+    workflow.add_step("join", SleepTask(0.1), depends_on=[f"branch_{i}" for i in range(5)])
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await workflow.run()
+    elapsed = loop.time() - started
+    
+    # 耗时应接近关键路径(0.4s)，而不是所有步骤之和(1.2s)
+    assert elapsed < 0.8
+    assert list(results) == workflow.topological_order
+    assert all(results["join"] >= results[f"branch_{i}"] for i in range(5))
+
+
+def test_workflow_rejects_unknown_dependency() -> None:
+    """测试添加依赖未知步骤时报错"""
+    workflow = ETLWorkflowTask()
+    with pytest.raises(ValueError):
+        workflow.add_step("report", SleepTask(0), depends_on=["missing"])
+    with pytest.raises(ValueError):
+        workflow.add_step("extract", SleepTask(0))
+
+
+class FailingTask(BaseTask):
+    """测试用失败任务"""
+    name = "test_failing_task"
+    
+    async def run(self, **kwargs: Any) -> None:
+        raise RuntimeError("boom")
+
+
+class ParallelCompositeTask(CompositeTask):
+    """测试用并发组合任务"""
+    name = "test_parallel_composite_task"
+    parallel = True
+
+
+@pytest.mark.asyncio
+async def test_composite_task_parallel_keeps_order(celery_app_fixture: Any) -> None:
+    """测试并发组合任务按添加顺序返回结果"""
+    task = ParallelCompositeTask()
+    for delay in (0.3, 0.1, 0.2):
+        task.add_subtask(SleepTask(delay))
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await task.run()
+    
+    assert loop.time() - started < 0.5
+    assert len(results) == 3
+    assert results[1] < results[2] < results[0]
+
+
+@pytest.mark.asyncio
+async def test_composite_task_collect_all(celery_app_fixture: Any) -> None:
+    """测试组合任务的fail-fast与collect-all模式"""
+    task = ParallelCompositeTask()
+    task.add_subtask(FailingTask())
+    task.add_subtask(SleepTask(0.01))
+    
+    with pytest.raises(RuntimeError):
+        await task.run()
+    
+    task.fail_fast = False
+    results = await task.run()
+    assert results[0] == {"error": "RuntimeError", "message": "boom"}
+    assert isinstance(results[1], float)
+    # 结果可按配置的序列化方式存储
+    content_type, encoding, payload = dumps(results, serializer=celery_app_fixture.conf.result_serializer)
+    assert loads(payload, content_type, encoding) == results
+    
+    task.parallel = False
+    assert (await task.run())[0] == {"error": "RuntimeError", "message": "boom"}
+
+
+def test_get_task_statuses(task_manager: TaskStateManager) -> None:
+    """测试批量获取任务状态"""
+    task_ids = [f"test-batch-task-{i}" for i in range(3)]
+    for task_id in task_ids:
+        task_manager.update_task_status(task_id, TaskStatus.STARTED)
+    
+    statuses = task_manager.get_task_statuses([*task_ids, "test-batch-missing"])
+    assert list(statuses) == [*task_ids, "test-batch-missing"]
+    assert all(statuses[task_id].status == TaskStatus.STARTED for task_id in task_ids)
+    assert statuses["test-batch-missing"] is None
+    
+    for task_id in task_ids:
+        task_manager.clean_task_data(task_id)
+
+
+def test_terminal_status_sets_retention_ttl(task_manager: TaskStateManager) -> None:
+    """测试终态任务按保留策略设置过期时间"""
+    task_id = "test-retention-task"
+    # 同一任务的键使用相同的hash tag，集群模式下可在一个脚本中操作
+    assert all("{test-retention-task}" in key for key in task_manager._get_task_keys(task_id))
+    task_manager.update_task_status(task_id, TaskStatus.STARTED)
+    assert task_manager.redis.ttl(task_manager._get_task_key(task_id)) == -1
+    
+    task_manager.update_task_status(task_id, TaskStatus.SUCCESS, result="done")
+    expected_ttl = task_manager.get_retention_ttl(TaskStatus.SUCCESS)
+    for key in (task_manager._get_task_key(task_id), task_manager._get_task_meta_key(task_id)):
+        assert 0 < task_manager.redis.ttl(key) <= expected_ttl
+    
+    task_manager.clean_task_data(task_id)
+
+
+def test_purge_task_data(task_manager: TaskStateManager) -> None:
+    """测试增量清理无过期时间的任务状态"""
+    expired_id, recent_id = "test-purge-expired", "test-purge-recent"
+    for task_id in (expired_id, recent_id):
+        task_manager.redis.hset(task_manager._get_task_key(task_id), "status", "SUCCESS")
+    task_manager.redis.hset(
+        task_manager._get_task_meta_key(expired_id),
+        mapping={"status": "SUCCESS", "update_time": "2000-01-01T00:00:00"}
+    )
+    task_manager.redis.hset(
+        task_manager._get_task_meta_key(recent_id),
+        mapping={"status": "SUCCESS", "update_time": datetime.utcnow().isoformat()}
+    )
+    # 未使用hash tag的旧键同样按其自身的键名清理
+    legacy_keys = ["task:test-purge-legacy", "task_meta:test-purge-legacy"]
+    task_manager.redis.hset(legacy_keys[0], "status", "SUCCESS")
+    task_manager.redis.hset(legacy_keys[1], mapping={"status": "SUCCESS", "update_time": "2000-01-01T00:00:00"})
+    
+    stats = task_manager.purge_task_data(scan_count=1, batch_pause=0)
+    
+    assert stats["deleted_keys"] >= 2
+    assert task_manager.get_task_status(expired_id) is None
+    assert task_manager.redis.exists(*legacy_keys) == 0
+    assert task_manager.get_task_status(recent_id) is not None
+    assert task_manager.redis.ttl(task_manager._get_task_key(recent_id)) > 0
+    
+    task_manager.clean_task_data(recent_id)
+
+
+def test_legacy_task_keys_fallback(task_manager: TaskStateManager) -> None:
+    """测试hash tag上线前写入的旧键仍可读取状态与结果，并随任务数据一起清理"""
+    task_id = "test-legacy-keys"
+    task_key, meta_key, result_key = task_manager._get_legacy_task_keys(task_id)
+    assert task_key == "task:test-legacy-keys"
+    data, encoding = encode_result({"count": 2})
+    task_manager.redis.hset(task_key, "status", "SUCCESS")
+    task_manager.redis.hset(
+        meta_key,
+        mapping={"status": "SUCCESS", "result_encoding": encoding, "result_size": len(data), "result_chunks": 1}
+    )
+    task_manager.binary_redis.rpush(result_key, data)
+    
+    status = task_manager.get_task_status(task_id)
+    assert status is not None and status.status == TaskStatus.SUCCESS
+    assert status.result_size == len(data)
+    assert task_manager.get_task_result(task_id) == {"count": 2}
+    
+    task_manager.clean_task_data(task_id)
+    assert task_manager.redis.exists(task_key, meta_key, result_key) == 0
+
+
+class TwoPrimaryCluster:
+    """将单机Redis包装为有两个主节点的集群客户端（第二个节点没有键），记录SCAN的目标节点"""
+    def __init__(self, redis: Any):
+        self._redis = redis
+        self.scanned_nodes: List[str] = []
+    
+    def get_primaries(self) -> List[str]:
+        return ["primary-1", "primary-2"]
+    
+    def scan_iter(self, target_nodes: str, **kwargs: Any) -> Any:
+        self.scanned_nodes.append(target_nodes)
+        return self._redis.scan_iter(**kwargs) if target_nodes == "primary-1" else iter(())
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._redis, name)
+
+
+def test_purge_task_data_scans_cluster_primaries(task_manager: TaskStateManager, monkeypatch: Any) -> None:
+    """测试集群模式下逐个主节点遍历任务键"""
+    task_id = "test-purge-cluster"
+    task_manager.redis.hset(task_manager._get_task_key(task_id), "status", "SUCCESS")
+    task_manager.redis.hset(
+        task_manager._get_task_meta_key(task_id),
+        mapping={"status": "SUCCESS", "update_time": "2000-01-01T00:00:00"}
+    )
+    cluster = TwoPrimaryCluster(task_manager.redis)
+    monkeypatch.setattr(task_manager, "redis", cluster)
+    
+    task_manager.purge_task_data(scan_count=10, batch_pause=0)
+    
+    assert cluster.scanned_nodes == ["primary-1", "primary-2"]
+    assert cluster.exists(task_manager._get_task_key(task_id)) == 0
+
+
+def test_large_result_chunked_storage(task_manager: TaskStateManager, monkeypatch: Any) -> None:
+    """测试大结果分块存储"""
+    # 每批只写入一个分块，覆盖多批写入
+    monkeypatch.setattr(task_manager, "result_batch_chunks", 1)
+    task_id = "test-large-result-task"
+    result = [{"id": i, "value": os.urandom(16).hex()} for i in range(20000)]
+    task_manager.update_task_status(task_id, TaskStatus.SUCCESS, result=result)
+    
+    status = task_manager.get_task_status(task_id)
+    assert status is not None
+    assert status.result_size is not None
+    chunks = task_manager.redis.llen(task_manager._get_task_result_key(task_id))
+    assert chunks == -(-status.result_size // settings.RESULT_CHUNK_SIZE)
+    assert chunks > 1
+    assert task_manager.get_task_result(task_id) == result
+    assert not task_manager.redis.exists(task_manager._get_task_result_staging_key(task_id))
+    
+    # 小结果内联保存在元数据中，不使用结果键
+    task_manager.update_task_status(task_id, TaskStatus.SUCCESS, result={"count": 1})
+    assert not task_manager.redis.exists(task_manager._get_task_result_key(task_id))
+    assert task_manager.get_task_result(task_id) == {"count": 1}
+    
+    task_manager.clean_task_data(task_id)
+
+
+def test_payload_store_round_trip(celery_app_fixture: Any, tmp_path: Any) -> None:
+    """测试外置参数的写入、按引用读取与任务执行时的引用解析"""
+    records = [{"id": i, "value": f"data{i}" * 20} for i in range(20000)]
+    store = PayloadStore(file_dir=str(tmp_path))
+    ref = store.put(records)
+    assert is_payload_ref(ref)
+    info = ref[PAYLOAD_REF_KEY]
+    assert info["chunks"] == -(-info["size"] // settings.RESULT_CHUNK_SIZE)
+    
+    # 同主机通过内存映射文件读取，文件不存在时从Redis分块读取
+    assert store.get(ref) == records
+    os.remove(os.path.join(str(tmp_path), f"{info['id']}.bin"))
+    assert store.get(ref) == records
+    
+    # 引用中不包含路径，ID不是uuid4十六进制串时拒绝读取
+    assert "path" not in info and "host" not in info
+    with pytest.raises(InvalidPayloadRef):
+        store.get({PAYLOAD_REF_KEY: {**info, "id": "../" + info["id"]}})
+    
+    task = celery_app_fixture.tasks[DataValidationTask.name]
+    result = task.apply(kwargs={"data": payload_store.put(records[:10])})
+    assert result.get()["valid_count"] == 10
+    
+    store.delete(ref)
+    with pytest.raises(LookupError):
+        store.get(ref)
+    task_state_manager.clean_task_data(result.id)
+
+
+def test_task_call_runs_on_worker_event_loop(celery_app_fixture: Any) -> None:
+    """测试同步调用任务时在常驻事件循环中执行协程"""
+    task = celery_app_fixture.tasks[DataValidationTask.name]
+    result = task(data=[{"id": 1, "value": "call"}])
+    assert result["valid_count"] == 1
+    
+    first_loop = async_runner._loop
+    task(data=[])
+    # 事件循环在任务之间复用
+    assert async_runner._loop is first_loop
+    assert async_runner.running
+
+
+def test_task_phase_timings(celery_app_fixture: Any, monkeypatch: Any) -> None:
+    """测试采样任务的阶段耗时统计"""
+    sink = CounterTimingSink()
+    monkeypatch.setattr(task_timer, "sample_rate", 1.0)
+    monkeypatch.setattr(task_timer, "sinks", [sink])
+    
+    task = celery_app_fixture.tasks[DataValidationTask.name]
+    result = task.apply(kwargs={"data": [{"id": 1, "value": "timed"}]})
+    assert result.get()["valid_count"] == 1
+    
+    phases = sink.snapshot()[DataValidationTask.name]
+    assert phases["deserialization"]["count"] == 1
+    assert phases["run"]["count"] == 1
+    # 开始与成功各写入一次状态，合并记录为一次采样
+    assert phases["state_write"]["count"] == 1
+    assert phases["result_serialization"]["total"] > 0
+    assert task_state_manager.get_task_status(result.id).status == TaskStatus.SUCCESS
+    
+    task_state_manager.clean_task_data(result.id)
+
+
+@pytest.mark.asyncio
+async def test_columnar_task_data(celery_app_fixture: Any) -> None:
+    """测试列式数据的处理、转换与验证"""
+    columns = {
+        "columns": {"id": [1, 2, 3], "value": ["a", "b", None]},
+        "num_rows": 3
+    }
+    
+    processed, transformed, validation = await asyncio.gather(
+        DataProcessTask().run(data=columns),
+        TransformTask().run(data=ColumnBatch.from_dict(columns)),
+        DataValidationTask().run(data=columns)
+    )
+    
+    # 列式字典输入返回列式字典
+    assert processed["num_rows"] == 3
+    assert processed["columns"]["processed"] == [True, True, True]
+    assert processed["columns"]["value"] == ["a", "b", None]
+    
+    # ColumnBatch输入返回ColumnBatch，原有列不复制
+    assert isinstance(transformed, ColumnBatch)
+    assert transformed.column("value_upper") == ["A", "B", None]
+    assert transformed.column("id") is columns["columns"]["id"]
+    
+    assert validation["valid_count"] == 2
+    assert validation["invalid_count"] == 1
+    assert validation["errors"] == ["Missing required fields in item: {'id': 3}"]
+    
+    # 记录列表输入（兼容格式）按列处理后转换回记录列表，结果与列式一致
+    records = await TransformTask().run(data=ColumnBatch.from_dict(columns).to_records()[:2])
+    assert records == [
+        {"id": 1, "value": "a", "transformed": True, "value_upper": "A"},
+        {"id": 2, "value": "b", "transformed": True, "value_upper": "B"}
+    ]
+    
+    # 必填字段为None与缺失相同，均视为无效（列式数据不区分两者）
+    validation = await DataValidationTask().run(data=[{"id": 1, "value": None}, {"id": 2}, {"id": 3, "value": "c"}])
+    assert validation["valid_count"] == 1
+    assert validation["invalid_count"] == 2
+
+
+class ColumnarWorkflowTask(WorkflowTask):
+    """转换后并行加载与验证的工作流"""
+    name = "columnar_workflow_task"
+    
+    def __init__(self):
+        super().__init__()
+        self.add_step("transform", TransformTask())
+        self.add_step("load", LoadTask(), inputs={"data": "transform"})
+        self.add_step("validate", DataValidationTask(), inputs={"data": "transform"})
+
+
+@pytest.mark.asyncio
+async def test_columnar_data_converted_once(celery_app_fixture: Any, monkeypatch: Any) -> None:
+    """测试组合任务与工作流只在入口与出口转换列式数据（包括记录列表）"""
+    conversions = []
+    from_dict = ColumnBatch.from_dict.__func__
+    from_records = ColumnBatch.from_records.__func__
+    to_dict = ColumnBatch.to_dict
+    
+    def counting_from_dict(cls: Any, payload: Dict[str, Any]) -> ColumnBatch:
+        conversions.append("from_dict")
+        return from_dict(cls, payload)
+    
+    def counting_from_records(cls: Any, records: Any) -> ColumnBatch:
+        conversions.append("from_records")
+        return from_records(cls, records)
+    
+    def counting_to_dict(self: ColumnBatch) -> Dict[str, Any]:
+        conversions.append("to_dict")
+        return to_dict(self)
+    
+    monkeypatch.setattr(ColumnBatch, "from_dict", classmethod(counting_from_dict))
+    monkeypatch.setattr(ColumnBatch, "from_records", classmethod(counting_from_records))
+    monkeypatch.setattr(ColumnBatch, "to_dict", counting_to_dict)
+    columns = {"columns": {"id": [1, 2], "value": ["a", None]}, "num_rows": 2}
+    
+    # 工作流入口转换一次，步骤之间传递ColumnBatch，出口转换回列式字典
+    results = await ColumnarWorkflowTask().run(data=columns)
+    assert results["transform"]["columns"]["value_upper"] == ["A", None]
+    assert results["load"]["loaded_count"] == 2
+    assert results["validate"]["invalid_count"] == 1
+    assert conversions == ["from_dict", "to_dict"]
+    
+    # 组合任务的子任务共享入口转换的结果
+    conversions.clear()
+    processed, validation = await DataPipelineTask().run(data=columns)
+    assert processed["columns"]["processed"] == [True, True]
+    assert validation["valid_count"] == 1
+    assert conversions == ["from_dict", "to_dict"]
+    
+    # 记录列表在入口转换一次，出口转换回记录列表
+    conversions.clear()
+    processed, validation = await DataPipelineTask().run(data=[{"id": 1, "value": "a"}])
+    assert processed[0]["processed"] is True
+    assert validation["valid_count"] == 1
+    assert conversions == ["from_records"]
+
+
+@pytest.mark.asyncio
+async def test_streaming_etl_workflow_task(celery_app_fixture: Any) -> None:
+    """测试流式ETL工作流"""
+    task = StreamingETLWorkflowTask()
+    results = await task.run(source="test_source", num_records=2500, chunk_size=100)
+    
+    assert results["extract"] == {"chunks": 25, "rows": 2500}
+    assert results["transform"] == {"chunks": 25, "rows": 2500}
+    assert results["load"]["loaded_count"] == 2500
+    assert results["validate"]["valid_count"] == 2500
+    assert results["validate"]["invalid_count"] == 0
+
+
+class CountingProducerTask(BaseTask):
+    """记录已产生数据块数的生产者"""
+    name = "counting_producer_task"
+    
+    def __init__(self):
+        super().__init__()
+        self.produced = 0
+    
+    async def run(self, **kwargs: Any) -> None:
+        pass
+    
+    async def stream(self, **kwargs: Any) -> Any:
+        for i in range(50):
+            self.produced += 1
+            yield ColumnBatch({"id": [i]})
+
+
+class SlowConsumerTask(BaseTask):
+    """逐块消费并记录最大积压数的消费者"""
+    name = "slow_consumer_task"
+    
+    def __init__(self, producer: CountingProducerTask):
+        super().__init__()
+        self.producer = producer
+        self.max_backlog = 0
+    
+    async def run(self, data: Any, **kwargs: Any) -> int:
+        consumed = 0
+        async for _ in data:
+            consumed += 1
+            self.max_backlog = max(self.max_backlog, self.producer.produced - consumed)
+            await asyncio.sleep(0.001)
+        return consumed
+
+
+class BackpressureWorkflowTask(WorkflowTask):
+    """单生产者单消费者流式工作流"""
+    name = "backpressure_workflow_task"
+    streaming = True
+    stream_buffer = 2
+    
+    def __init__(self):
+        super().__init__()
+        self.producer = CountingProducerTask()
+        self.consumer = SlowConsumerTask(self.producer)
+        self.add_step("produce", self.producer)
+        self.add_step("consume", self.consumer, inputs={"data": "produce"})
+
+
+@pytest.mark.asyncio
+async def test_streaming_workflow_backpressure() -> None:
+    """测试流式工作流的背压：生产者领先消费者的数据块数受通道容量限制"""
+    task = BackpressureWorkflowTask()
+    results = await task.run()
+    
+    assert results["consume"] == 50
+    assert results["produce"] == {"chunks": 50, "rows": 50}
+    # 通道容量 + 生产者手中待写入的一块 + 消费者刚取出的一块
+    assert task.consumer.max_backlog <= task.stream_buffer + 2
+
+
+def test_streaming_workflow_rejects_blocking_dependency() -> None:
+    """测试流式消费者依赖其他步骤完成时拒绝执行"""
+    task = StreamingETLWorkflowTask()
+    task.add_step("report", DataValidationTask(), depends_on=["load"], inputs={"data": "transform"})
+    with pytest.raises(ValueError):
+        asyncio.run(task.run(source="test_source"))
+
+
+@pytest.mark.asyncio
+async def test_streaming_workflow_concurrency_limit() -> None:
+    """测试并发上限不足以同时运行生产者与消费者时拒绝执行，而不是在通道写满后挂起"""
+    task = BackpressureWorkflowTask()
+    task.max_concurrency = 1
+    with pytest.raises(ValueError, match="max_concurrency"):
+        await asyncio.wait_for(task.run(), timeout=5)
+    
+    task = BackpressureWorkflowTask()
+    task.max_concurrency = 2
+    results = await asyncio.wait_for(task.run(), timeout=5)
+    assert results["consume"] == 50
+
+
+class CountingDoubleTask(BaseTask):
+    """测试用计数任务（结果只取决于输入）"""
+    name = "test_counting_double_task"
+    
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+    
+    async def run(self, value: int, **kwargs: Any) -> int:
+        self.calls += 1
+        return value * 2
+
+
+class MemoizedWorkflowTask(WorkflowTask):
+    """测试用缓存步骤结果的工作流"""
+    name = "test_memoized_workflow_task"
+    
+    def __init__(self):
+        super().__init__()
+        self.first = CountingDoubleTask()
+        self.second = CountingDoubleTask()
+        self.add_step("first", self.first, cache=True)
+        self.add_step("second", self.second, inputs={"value": "first"}, cache=True)
+
+
+@pytest.mark.asyncio
+async def test_workflow_step_cache(monkeypatch: Any) -> None:
+    """测试工作流步骤结果缓存：输入不变时跳过步骤，输入变化时重新执行，超出容量时淘汰"""
+    monkeypatch.setattr(step_cache, "enabled", True)
+    step_cache.clear()
+    workflow = MemoizedWorkflowTask()
+    
+    assert await workflow.run(value=3) == {"first": 6, "second": 12}
+    assert await workflow.run(value=3) == {"first": 6, "second": 12}
+    assert (workflow.first.calls, workflow.second.calls) == (1, 1)
+    
+    assert await workflow.run(value=4) == {"first": 8, "second": 16}
+    assert (workflow.first.calls, workflow.second.calls) == (2, 2)
+    
+    stats = step_cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 4, 4)
+    assert stats["steps"][CountingDoubleTask.name]["hits"] == 2
+    
+    # 总字节数上限只够保存一项时，较早的缓存项被淘汰
+    monkeypatch.setattr(step_cache, "max_bytes", 1)
+    key = step_cache.make_key(workflow.first, (), {"value": 5})
+    step_cache.store(key, 10, 0.1)
+    stats = step_cache.get_stats()
+    assert stats["entries"] == 1
+    assert stats["evictions"] == 4
+    assert step_cache.lookup(workflow.first, (), {"value": 3})[1] is MISS
+    assert step_cache.lookup(workflow.first, (), {"value": 5})[1] == 10
+    
+    step_cache.clear()
+
+
+class FlakyDoubleTask(CountingDoubleTask):
+    """测试用前若干次执行失败的任务"""
+    name = "test_flaky_double_task"
+    
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+    
+    async def run(self, value: int, **kwargs: Any) -> int:
+        result = await super().run(value)
+        if self.calls <= self.failures:
+            raise RuntimeError("step failed")
+        return result
+
+
+class CheckpointedWorkflowTask(WorkflowTask):
+    """测试用失败后自动重试的工作流"""
+    name = "test_checkpointed_workflow_task"
+    autoretry_for = (RuntimeError,)
+    
+    def __init__(self):
+        super().__init__()
+        self.first = CountingDoubleTask()
+        self.flaky = FlakyDoubleTask(failures=2)
+        self.last = CountingDoubleTask()
+        self.add_step("first", self.first)
+        self.add_step("flaky", self.flaky, inputs={"value": "first"})
+        self.add_step("last", self.last, inputs={"value": "flaky"})
+
+
+def test_workflow_resumes_from_checkpoint(celery_app_fixture: Any) -> None:
+    """测试工作流重试时跳过已完成的步骤，从失败的步骤继续执行"""
+    workflow = celery_app_fixture.register_task(CheckpointedWorkflowTask())
+    task_id = "test-checkpointed-workflow"
+    checkpoint_id = f"{task_id}:{workflow.name}"
+    
+    # 前两次执行在flaky步骤失败并触发重试，按同一任务ID重新执行（与broker重新投递重试消息相同）
+    for attempt in range(2):
+        with pytest.raises(Retry):
+            workflow.apply(kwargs={"value": 3}, task_id=task_id, retries=attempt)
+        assert set(workflow_checkpoints.get_steps(checkpoint_id)) == {"first"}
+        assert workflow_checkpoints.load(checkpoint_id, ["first"]) == {"first": 6}
+    assert (workflow.first.calls, workflow.flaky.calls, workflow.last.calls) == (1, 2, 0)
+    
+    result = workflow.apply(kwargs={"value": 3}, task_id=task_id, retries=2)
+    
+    assert result.get() == {"first": 6, "flaky": 12, "last": 24}
+    # 已完成的步骤从检查点读取，不再执行
+    assert (workflow.first.calls, workflow.flaky.calls, workflow.last.calls) == (1, 3, 1)
+    # 成功结束后删除检查点
+    assert workflow_checkpoints.get_steps(checkpoint_id) == {}
+    
+    task_state_manager.clean_task_data(result.id)
+
+
+class DistributedWorkflowTask(WorkflowTask):
+    """测试用分布式执行的工作流"""
+    name = "test_distributed_workflow_task"
+    distributed = True
+    
+    def __init__(self):
+        super().__init__()
+        self.add_step("first", CountingDoubleTask())
+        self.add_step("left", CountingDoubleTask(), inputs={"value": "first"}, queue="left")
+        self.add_step("right", CountingDoubleTask(), inputs={"value": "first"})
+        self.add_step("last", CountingDoubleTask(), inputs={"value": "left"}, depends_on=["right"])
+
+
+def test_distributed_workflow_task(celery_app_fixture: Any, task_manager: TaskStateManager) -> None:
+    """测试分布式模式下工作流按拓扑层编译为canvas，步骤结果按引用传递，父任务状态由汇总任务写入"""
+    workflow = celery_app_fixture.register_task(DistributedWorkflowTask())
+    assert workflow._distributed_layers() == [["first"], ["left", "right"], ["last"]]
+    assert workflow._step_queue("left") == "left"
+    
+    result = workflow.apply(kwargs={"value": 3}, task_id="test-distributed-workflow")
+    
+    # 父任务发布canvas后即结束，状态与汇总结果由workflow_finalize_task写入
+    assert result.state == states.IGNORED
+    assert task_manager.get_task_status(result.id).status == TaskStatus.SUCCESS
+    assert task_manager.get_task_result(result.id) == {"first": 6, "left": 12, "right": 12, "last": 24}
+    assert all(step.calls == 1 for step in workflow.steps.values())
+    
+    task_manager.clean_task_data(result.id)
+
+
+def test_task_routing(celery_app_fixture: Any) -> None:
+    """测试按路由表选择队列与优先级，提交时显式指定的队列与优先级优先"""
+    router = celery_app_fixture.amqp.router
+    
+    route = router.route({}, "data_process_task")
+    assert (route["queue"].name, route["priority"]) == ("interactive", PRIORITY_HIGH)
+    # 未指定（None）的选项不覆盖路由表
+    route = router.route({"queue": None, "priority": None}, "etl_workflow_task")
+    assert (route["queue"].name, route["priority"]) == ("etl", PRIORITY_LOW)
+    route = router.route({"queue": "default", "priority": 1}, "etl_workflow_task")
+    assert (route["queue"].name, route["priority"]) == ("default", 1)
+    assert router.route({}, "unknown_task")["queue"].name == settings.CELERY_DEFAULT_QUEUE
+    
+    assert get_worker_settings(["interactive"])["worker_pool"] == "threads"
+    assert get_worker_settings([])["worker_pool"] == settings.CELERY_WORKER_POOL
+    
+    # 分布式步骤优先按工作流指定的队列路由，优先级沿用父任务
+    workflow = DistributedETLWorkflowTask()
+    assert workflow._step_options("validate", PRIORITY_LOW) == {"queue": "etl", "priority": PRIORITY_LOW}
+    assert get_task_route("data_validation_task")["queue"] == "interactive"
+